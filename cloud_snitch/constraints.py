@@ -11,10 +11,12 @@ logger = logging.getLogger(__name__)
 
 _models = [
     models.AptPackageEntity,
+    models.BlobEntity,
     models.ConfigfileEntity,
     models.ConfiguredInterfaceEntity,
     models.DeviceEntity,
     models.EnvironmentEntity,
+    models.EnvironmentDigestEntity,
     models.EnvironmentLockEntity,
     models.GitRemoteEntity,
     models.GitRepoEntity,
@@ -43,6 +45,7 @@ def main():
         auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD)
     )
     template = 'CREATE CONSTRAINT ON (n:{label}) ASSERT n.{prop} IS UNIQUE'
+    index_template = 'CREATE INDEX ON :{label}({prop})'
     with driver.session() as session:
         with session.begin_transaction() as tx:
             for _model in _models:
@@ -50,6 +53,14 @@ def main():
                     label=_model.label,
                     prop=_model.identity_property)
                 )
+
+            # Index blob keys on states so unused blobs can be found.
+            for _model in _models:
+                for prop in getattr(_model, 'blob_properties', []):
+                    tx.run(index_template.format(
+                        label=_model.state_label,
+                        prop=models.BlobEntity.stored_property(prop)
+                    ))
     driver.close()
 
 
@@ -0,0 +1,239 @@
+"""Indexed, seekable container format for collection runs.
+
+Layout of a container::
+
+    header   MAGIC
+    record   <I name length><Q payload length> name payload
+    ...
+    index    JSON document describing every record
+    trailer  <Q index offset><Q index length> MAGIC
+
+Each payload is a zlib compressed member, optionally encrypted in the
+framed AES-GCM layout of cloud_snitch.crypt. Payloads in the legacy
+length prefixed AES-CBC layout are still read.
+The index lists the name, payload offset, payload length and sha256 of
+the plaintext of every member so any member can be read without
+touching the others.
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import struct
+import zlib
+
+from cloud_snitch import crypt
+from cloud_snitch.exc import InvalidKeyError
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CSNITCH1'
+
+VERSION = 1
+
+EXTENSION = '.csrun'
+
+_RECORD = struct.Struct('<IQ')
+
+_TRAILER = struct.Struct('<QQ{}s'.format(len(MAGIC)))
+
+
+def is_container(path):
+    """Check if a file starts with the container magic.
+
+    :param path: Path to the file
+    :type path: str
+    :returns: True if the file is a container, False otherwise
+    :rtype: bool
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except IOError:
+        return False
+
+
+def read_index(buf):
+    """Read the index from the trailer of a container.
+
+    :param buf: Contents of the container
+    :type buf: mmap.mmap|bytes
+    :returns: Loaded index
+    :rtype: dict
+    """
+    if len(buf) < len(MAGIC) + _TRAILER.size or \
+            buf[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a run container.')
+    offset, length, magic = _TRAILER.unpack_from(buf, len(buf) - _TRAILER.size)
+    if magic != MAGIC or offset + length > len(buf) - _TRAILER.size:
+        raise ValueError('Run container has no index.')
+    index = json.loads(buf[offset:offset + length].decode('utf-8'))
+    if index.get('version') != VERSION:
+        raise ValueError(
+            'Unsupported run container version {}.'
+            .format(index.get('version'))
+        )
+    return index
+
+
+class MmapReader(io.RawIOBase):
+    """Readable stream over one record payload of a mapped container.
+
+    Slices are copied out of the map rather than exported as views so the
+    map can always be closed, even with readers left unfinished.
+    """
+
+    def __init__(self, buf, offset, size):
+        """Init the reader.
+
+        :param buf: Mapped container
+        :type buf: mmap.mmap
+        :param offset: Offset of the payload
+        :type offset: int
+        :param size: Size of the payload
+        :type size: int
+        """
+        self.buf = buf
+        self.position = offset
+        self.end = offset + size
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        size = min(len(b), self.end - self.position)
+        if size <= 0:
+            return 0
+        b[:size] = self.buf[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+class InflateReader(io.RawIOBase):
+    """Readable stream of decompressed bytes from a zlib stream."""
+
+    def __init__(self, stream, chunk_size=64 * 1024):
+        """Init the reader.
+
+        :param stream: Binary stream of compressed bytes
+        :type stream: io.RawIOBase
+        :param chunk_size: Compressed bytes to read at a time
+        :type chunk_size: int
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.inflater = zlib.decompressobj()
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        try:
+            while not self.buffer and not self.inflater.eof:
+                chunk = self.stream.read(self.chunk_size)
+                if not chunk:
+                    raise ValueError('Compressed member is truncated.')
+                self.buffer = self.inflater.decompress(chunk)
+        except zlib.error as e:
+            raise ValueError(str(e))
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+class ContainerWriter:
+    """Class for writing run containers one member at a time.
+
+    Members are appended as they are added. The index and trailer are
+    only written on close so an unclosed container is never mistaken for
+    a complete one.
+    """
+
+    def __init__(self, path, key=None, level=6):
+        """Init the writer.
+
+        :param path: Path of the container to create
+        :type path: str
+        :param key: Base64 encoded AES 256 key
+        :type key: str
+        :param level: zlib compression level
+        :type level: int
+        """
+        self.path = path
+        self.key = key
+        if self.key is not None:
+            try:
+                self.key = base64.b64decode(self.key)
+            except Exception:
+                raise InvalidKeyError()
+        self.level = level
+        self.members = []
+        self._names = set()
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._offset = len(MAGIC)
+
+    def add(self, name, data):
+        """Append a member.
+
+        :param name: Name of the member
+        :type name: str
+        :param data: Plaintext of the member
+        :type data: bytes
+        """
+        if name in self._names:
+            raise ValueError('Duplicate member {}.'.format(name))
+        payload = zlib.compress(data, self.level)
+        if self.key:
+            payload = crypt.encrypt(payload, self.key)
+        encoded_name = name.encode('utf-8')
+        self._file.write(_RECORD.pack(len(encoded_name), len(payload)))
+        self._file.write(encoded_name)
+        self._file.write(payload)
+        self._offset += _RECORD.size + len(encoded_name)
+        self.members.append({
+            'name': name,
+            'offset': self._offset,
+            'length': len(payload),
+            'digest': hashlib.sha256(data).hexdigest()
+        })
+        self._names.add(name)
+        self._offset += len(payload)
+
+    def add_json(self, name, obj):
+        """Append a member serialized as json.
+
+        :param name: Name of the member
+        :type name: str
+        :param obj: Object to serialize
+        :type obj: object
+        """
+        self.add(name, json.dumps(obj).encode('utf-8'))
+
+    def close(self):
+        """Write the index and trailer and close the container."""
+        if self._file is None:
+            return
+        index = json.dumps({
+            'version': VERSION,
+            'compression': 'zlib',
+            'encrypted': bool(self.key),
+            'members': self.members
+        }).encode('utf-8')
+        self._file.write(index)
+        self._file.write(_TRAILER.pack(self._offset, len(index), MAGIC))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._file is not None:
+            self._file.close()
+            self._file = None
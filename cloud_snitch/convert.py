@@ -0,0 +1,96 @@
+"""Convert .tar.gz collection runs into indexed run containers."""
+import logging
+import os
+
+from cloud_snitch import container
+from cloud_snitch.cli_common import base_parser
+from cloud_snitch.runs import RunArchive
+
+logger = logging.getLogger(__name__)
+
+parser = base_parser(
+    description="Convert .tar.gz collection runs into run containers."
+)
+
+parser.add_argument(
+    'paths',
+    nargs='+',
+    metavar='path',
+    help='.tar.gz archives to convert.'
+)
+
+parser.add_argument(
+    '--output',
+    help='Directory to write containers to. Defaults to beside each input.'
+)
+
+parser.add_argument(
+    '--key',
+    help='Base64 encoded 256 bit AES key. For testing/debug only.'
+)
+
+
+def container_path(path, output=None):
+    """Compute the container path for an archive.
+
+    :param path: Path to the archive
+    :type path: str
+    :param output: Optional output directory
+    :type output: str|None
+    :returns: Path of the container
+    :rtype: str
+    """
+    head, tail = os.path.split(path)
+    if tail.endswith('.tar.gz'):
+        tail = tail[:-len('.tar.gz')]
+    return os.path.join(output or head, tail + container.EXTENSION)
+
+
+def convert(path, dest, key=None):
+    """Convert a .tar.gz archive into a run container.
+
+    Members are decrypted and re-encrypted with the same key. The
+    container is written beside its destination and renamed into place
+    once complete.
+
+    :param path: Path to the archive
+    :type path: str
+    :param dest: Path of the container to create
+    :type dest: str
+    :param key: Base64 encoded AES 256 key
+    :type key: str
+    :returns: Number of members converted
+    :rtype: int
+    """
+    archive = RunArchive(path, key=key)
+    partial = dest + '.part'
+    try:
+        with container.ContainerWriter(partial, key=key) as writer:
+            for name in archive.index:
+                _, tail = os.path.split(name)
+                writer.add(name, archive.open(tail).read())
+        os.rename(partial, dest)
+    except Exception:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        archive.close()
+    return len(writer.members)
+
+
+def main():
+    """Entry point for the console script."""
+    args = parser.parse_args()
+    for path in args.paths:
+        dest = container_path(path, output=args.output)
+        count = convert(path, dest, key=args.key)
+        logger.info("Converted {} members of {} to {}".format(
+            count,
+            path,
+            dest
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Framed authenticated encryption of run members.
+
+Layout of a framed member::
+
+    header  MAGIC <I chunk size>
+    frame   <I ciphertext length><B final> nonce tag ciphertext
+    ...
+
+Plaintext is split into chunks of the chunk size and each chunk is
+sealed with AES-GCM under its own random nonce. The associated data of
+a chunk is its index and final flag, so frames can not be reordered,
+dropped or truncated without failing authentication. Chunks are
+independent and may be decrypted lazily or in parallel.
+
+Members written before framing use a length prefixed AES-CBC layout.
+Framed members are told apart by their magic, which as a CBC length
+prefix would describe a member of several exabytes.
+"""
+import collections
+import io
+import logging
+import os
+import struct
+
+from Crypto.Cipher import AES
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CSGCM\x00\x00\x01'
+
+CHUNK_SIZE = 64 * 1024
+
+NONCE_SIZE = 12
+
+TAG_SIZE = 16
+
+_HEADER = struct.Struct('<{}sI'.format(len(MAGIC)))
+
+_FRAME = struct.Struct('<IB')
+
+_AAD = struct.Struct('<QB')
+
+
+def is_framed(head):
+    """Check if the first bytes of a member are a framed header.
+
+    :param head: At least the first len(MAGIC) bytes of a member
+    :type head: bytes
+    :returns: True if the member is framed, False otherwise
+    :rtype: bool
+    """
+    return head[:len(MAGIC)] == MAGIC
+
+
+def seal(key, index, final, chunk):
+    """Encrypt and authenticate one chunk.
+
+    :param key: Decoded AES 256 key
+    :type key: bytes
+    :param index: Index of the chunk
+    :type index: int
+    :param final: Whether or not this is the last chunk
+    :type final: bool
+    :param chunk: Plaintext chunk
+    :type chunk: bytes
+    :returns: Framed chunk
+    :rtype: bytes
+    """
+    nonce = os.urandom(NONCE_SIZE)
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce, mac_len=TAG_SIZE)
+    cipher.update(_AAD.pack(index, final))
+    ciphertext, tag = cipher.encrypt_and_digest(chunk)
+    return _FRAME.pack(len(ciphertext), final) + nonce + tag + ciphertext
+
+
+def unseal(key, index, final, nonce, tag, ciphertext):
+    """Decrypt and verify one chunk.
+
+    :param key: Decoded AES 256 key
+    :type key: bytes
+    :param index: Index of the chunk
+    :type index: int
+    :param final: Whether or not this is the last chunk
+    :type final: bool
+    :param nonce: Nonce of the chunk
+    :type nonce: bytes
+    :param tag: Authentication tag of the chunk
+    :type tag: bytes
+    :param ciphertext: Encrypted chunk
+    :type ciphertext: bytes
+    :returns: Plaintext chunk
+    :rtype: bytes
+    """
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce, mac_len=TAG_SIZE)
+    cipher.update(_AAD.pack(index, final))
+    return cipher.decrypt_and_verify(ciphertext, tag)
+
+
+def encrypt(data, key, chunk_size=CHUNK_SIZE):
+    """Encrypt bytes in the framed layout.
+
+    :param data: Plain bytes
+    :type data: bytes
+    :param key: Decoded AES 256 key
+    :type key: bytes
+    :param chunk_size: Plaintext bytes per chunk
+    :type chunk_size: int
+    :returns: Framed member
+    :rtype: bytes
+    """
+    parts = [_HEADER.pack(MAGIC, chunk_size)]
+    offsets = range(0, len(data), chunk_size) or [0]
+    last = len(offsets) - 1
+    for index, offset in enumerate(offsets):
+        chunk = data[offset:offset + chunk_size]
+        parts.append(seal(key, index, index == last, chunk))
+    return b''.join(parts)
+
+
+class FramedDecryptReader(io.RawIOBase):
+    """Readable stream of plaintext from a framed member.
+
+    Frames are read ahead into a bounded window. Without an executor each
+    chunk is decrypted when it is needed. With an executor the chunks in
+    the window are decrypted in parallel. Memory use is bounded by the
+    window and chunk size rather than the member size.
+    """
+
+    def __init__(self, stream, key, executor=None, window=None):
+        """Init the reader.
+
+        :param stream: Binary stream of the framed member
+        :type stream: io.RawIOBase
+        :param key: Decoded AES 256 key
+        :type key: bytes
+        :param executor: Optional executor to decrypt chunks with
+        :type executor: concurrent.futures.Executor|None
+        :param window: Number of chunks to read ahead. Defaults to
+            twice the executor workers
+        :type window: int|None
+        """
+        self.stream = stream
+        self.key = key
+        self.executor = executor
+        if window is None:
+            window = 1
+            if executor is not None:
+                window = 2 * getattr(executor, '_max_workers', 1)
+        self.window = max(window, 1)
+
+        header = self._read_exactly(_HEADER.size)
+        magic, self.chunk_size = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('Member is not framed.')
+
+        self.index = 0
+        self.final_read = False
+        self.pending = collections.deque()
+        self.buffer = b''
+
+    def _read_exactly(self, size):
+        parts = []
+        remaining = size
+        while remaining > 0:
+            part = self.stream.read(remaining)
+            if not part:
+                raise ValueError('Encrypted member is truncated.')
+            parts.append(part)
+            remaining -= len(part)
+        return b''.join(parts)
+
+    def _read_frame(self):
+        """Read the next frame.
+
+        :returns: Arguments for unseal
+        :rtype: tuple
+        """
+        length, final = _FRAME.unpack(self._read_exactly(_FRAME.size))
+        if length > self.chunk_size:
+            raise ValueError('Encrypted chunk is too large.')
+        nonce = self._read_exactly(NONCE_SIZE)
+        tag = self._read_exactly(TAG_SIZE)
+        ciphertext = self._read_exactly(length)
+        args = (self.key, self.index, bool(final), nonce, tag, ciphertext)
+        self.index += 1
+        self.final_read = bool(final)
+        return args
+
+    def _fill(self):
+        """Read frames ahead up to the window."""
+        while len(self.pending) < self.window and not self.final_read:
+            args = self._read_frame()
+            if self.executor is not None:
+                self.pending.append(self.executor.submit(unseal, *args))
+            else:
+                self.pending.append(args)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer:
+            self._fill()
+            if not self.pending:
+                return 0
+            item = self.pending.popleft()
+            if self.executor is not None:
+                self.buffer = item.result()
+            else:
+                self.buffer = unseal(*item)
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
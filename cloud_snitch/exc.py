@@ -168,3 +168,20 @@ class PropertyNotFoundError(Exception):
             .format(property_name, model_name)
         )
         super(PropertyNotFoundError, self).__init__(msg)
+
+
+class SnitcherDependencyError(Exception):
+    """Error for snitcher prerequisites that cannot be scheduled."""
+    def __init__(self, snitcher, reason):
+        """Init the error.
+
+        :param snitcher: Name of the snitcher class
+        :type snitcher: str
+        :param reason: Description of the problem
+        :type reason: str
+        """
+        msg = 'Unable to schedule snitcher \'{}\': {}'.format(
+            snitcher,
+            reason
+        )
+        super(SnitcherDependencyError, self).__init__(msg)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityMap(object):
+    """Run scoped memo of found and upserted versioned entities.
+
+    Entities are keyed by (label, identity). Finds that return an entity
+    are remembered for the rest of the run; misses are never cached since
+    another snitcher may create the entity later. Upserts remember a
+    fingerprint of the entity properties so that an identical entity is
+    only written once per run no matter how many hosts share it.
+
+    Safe to share between snitcher and host worker threads.
+    """
+
+    def __init__(self):
+        """Init the identity map."""
+        self._lock = threading.Lock()
+        self._found = {}
+        self._upserted = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, cls, identity):
+        """Build the map key for an entity.
+
+        :param cls: Versioned entity class
+        :type cls: class
+        :param identity: Identity of the entity
+        :type identity: str
+        :returns: Map key
+        :rtype: tuple
+        """
+        return (cls.label, identity)
+
+    def _fingerprint(self, entity):
+        """Compute a digest of the static and state properties of an entity.
+
+        :param entity: Versioned entity instance
+        :type entity: VersionedEntity
+        :returns: Hex digest
+        :rtype: str
+        """
+        props = {}
+        for prop in entity.static_properties + entity.state_properties:
+            props[prop] = getattr(entity, prop, None)
+        raw = json.dumps(props, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _stub(self, cls, entity):
+        """Create the instance a find would return for an upserted entity.
+
+        Only identity and static properties live on the identity node.
+
+        :param cls: Versioned entity class
+        :type cls: class
+        :param entity: Upserted entity
+        :type entity: VersionedEntity
+        :returns: Entity with identity and static properties
+        :rtype: VersionedEntity
+        """
+        kwargs = {p: getattr(entity, p, None) for p in cls.static_properties}
+        kwargs[cls.identity_property] = entity.identity
+        return cls(**kwargs)
+
+    def find(self, cls, session, identity):
+        """Find an entity, using the map before the database.
+
+        :param cls: Versioned entity class
+        :type cls: class
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param identity: Identity to find
+        :type identity: str
+        :returns: Instance of versioned entity or None
+        :rtype: VersionedEntity|None
+        """
+        key = self._key(cls, identity)
+        with self._lock:
+            entity = self._found.get(key)
+            if entity is not None:
+                self.hits += 1
+                return entity
+            self.misses += 1
+
+        entity = cls.find(session, identity)
+        if entity is not None:
+            with self._lock:
+                self._found.setdefault(key, entity)
+        return entity
+
+    def update_many(self, cls, session, entities, time_in_ms):
+        """Upsert entities that have not been upserted unchanged this run.
+
+        :param cls: Versioned entity class
+        :type cls: class
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param entities: List of entities of cls
+        :type entities: list
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        todo = []
+        with self._lock:
+            for entity in entities:
+                key = self._key(cls, entity.identity)
+                fingerprint = self._fingerprint(entity)
+                if self._upserted.get(key) == fingerprint:
+                    self.hits += 1
+                else:
+                    todo.append((key, fingerprint, entity))
+
+        if not todo:
+            return
+        logger.debug("Upserting {} of {} {} entities.".format(
+            len(todo),
+            len(entities),
+            cls.label
+        ))
+        cls.update_many(session, [e for _, _, e in todo], time_in_ms)
+
+        # Record only after the upsert succeeded so concurrent writers
+        # never skip an entity that is not yet in the graph.
+        with self._lock:
+            for key, fingerprint, entity in todo:
+                self._upserted[key] = fingerprint
+                self._found[key] = self._stub(cls, entity)
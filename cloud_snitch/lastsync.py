@@ -0,0 +1,129 @@
+"""Verify or repair the last sync time of environments.
+
+The last sync time is read from the current environment state during a
+sync. This compares it against the last update time found by walking
+the full environment subgraph. Syncs that find no changes only move the
+last sync time, so it may be ahead of the last update but never behind.
+"""
+import logging
+
+from cloud_snitch import settings
+from cloud_snitch.cli_common import base_parser
+from cloud_snitch.cli_common import find_environment
+from cloud_snitch.models import EnvironmentEntity
+from neo4j.v1 import GraphDatabase
+
+logger = logging.getLogger(__name__)
+
+parser = base_parser(
+    description=(
+        "Verify the last sync time of environments against a full walk of "
+        "each environment subgraph."
+    )
+)
+
+parser.add_argument(
+    'uuid',
+    type=str,
+    nargs='?',
+    help='UUID of environment to verify. Defaults to all environments.'
+)
+
+parser.add_argument(
+    '--fix',
+    action='store_true',
+    help='Move last sync times that are behind forward.'
+)
+
+
+def all_environments(session):
+    """List all environments.
+
+    :param session: Neo4j driver session.
+    :type session: neo4j.v1.session.BoltSession
+    :returns: List of environment entities
+    :rtype: list
+    """
+    cypher = 'MATCH (e:{}) RETURN e.{} AS uuid'.format(
+        EnvironmentEntity.label,
+        EnvironmentEntity.identity_property
+    )
+    with session.begin_transaction() as tx:
+        return [EnvironmentEntity(uuid=r['uuid']) for r in tx.run(cypher)]
+
+
+def verify(session, env, fix=False):
+    """Verify and optionally repair the last sync time of an environment.
+
+    :param session: Neo4j driver session.
+    :type session: neo4j.v1.session.BoltSession
+    :param env: Environment entity
+    :type env: EnvironmentEntity
+    :param fix: Whether or not to repair a mismatch
+    :type fix: bool
+    :returns: False if the last sync time is behind the last update
+    :rtype: bool
+    """
+    last_sync = env.last_sync_time(session)
+    last_update = env.last_update(session)
+
+    # Syncs without changes leave the subgraph alone, so a last sync time
+    # ahead of the last update is expected.
+    if last_update is None or \
+            (last_sync is not None and last_sync >= last_update):
+        logger.info("{} OK last sync {}".format(env.uuid, last_sync))
+        return True
+
+    logger.warning("{} MISMATCH last sync {} last update {}".format(
+        env.uuid,
+        last_sync,
+        last_update
+    ))
+    # Only ever move the last sync time forward.
+    if fix:
+        env.set_last_sync_time(session, last_update)
+        logger.info("{} repaired last sync to {}".format(
+            env.uuid,
+            last_update
+        ))
+    return False
+
+
+def lastsync(uuid=None, fix=False):
+    """Verify the last sync time of one or all environments.
+
+    :param uuid: Optional environment uuid
+    :type uuid: str|None
+    :param fix: Whether or not to repair mismatches
+    :type fix: bool
+    :returns: Number of mismatched environments
+    :rtype: int
+    """
+    driver = GraphDatabase.driver(
+        settings.NEO4J_URI,
+        auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD)
+    )
+    mismatched = 0
+    try:
+        with driver.session() as session:
+            if uuid is not None:
+                envs = [find_environment(session, uuid)]
+            else:
+                envs = all_environments(session)
+            for env in envs:
+                if not verify(session, env, fix=fix):
+                    mismatched += 1
+    finally:
+        driver.close()
+    logger.info("{} environments mismatched.".format(mismatched))
+    return mismatched
+
+
+def main():
+    """Entry point for the console script."""
+    args = parser.parse_args()
+    lastsync(uuid=args.uuid, fix=args.fix)
+
+
+if __name__ == '__main__':
+    main()
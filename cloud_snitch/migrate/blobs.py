@@ -0,0 +1,107 @@
+"""Move inline values of blob properties into blobs.
+
+States written before a property was stored as a blob keep the value
+inline. Syncs treat an inline value and a blob with the same content as
+equal, so this migration is optional and only reclaims space.
+"""
+import time
+
+from cloud_snitch.cli_common import base_parser
+from cloud_snitch.migrate.cli_uuid import get_neo4j
+from cloud_snitch.models import BlobEntity
+from cloud_snitch.models import registry
+
+
+def migrate_property(session, state_label, prop, limit=2000):
+    """Move inline values of one property into blobs in chunks.
+
+    :param session: Neo4j driver session
+    :type session: neo4j.v1.session.BoltSession
+    :param state_label: Label of the state nodes
+    :type state_label: str
+    :param prop: Name of the blob property
+    :type prop: str
+    :param limit: Number of states to migrate at a time
+    :type limit: int
+    :returns: Number of migrated states
+    :rtype: int
+    """
+    stored = BlobEntity.stored_property(prop)
+    match = """
+        MATCH (s:{label})
+        WHERE exists(s.{prop}) AND NOT exists(s.{stored})
+        RETURN id(s) AS id, s.{prop} AS value
+        LIMIT $limit
+    """
+    match = match.format(label=state_label, prop=prop, stored=stored)
+    update = """
+        UNWIND $rows AS row
+        MATCH (s:{label}) WHERE id(s) = row.id
+        SET s.{stored} = row.key
+        REMOVE s.{prop}
+    """
+    update = update.format(label=state_label, prop=prop, stored=stored)
+
+    total = 0
+    while True:
+        with session.begin_transaction() as tx:
+            rows = []
+            blobs = {}
+            for record in tx.run(match, limit=limit):
+                key = BlobEntity.key(record['value'])
+                blobs[key] = record['value']
+                rows.append({'id': record['id'], 'key': key})
+            if not rows:
+                return total
+            BlobEntity._merge_many(tx, blobs)
+            tx.run(update, rows=rows)
+        total += len(rows)
+
+
+def migrate(session, limit=2000):
+    """Migrate every blob property of every registered model.
+
+    :param session: Neo4j driver session
+    :type session: neo4j.v1.session.BoltSession
+    :param limit: Number of states to migrate at a time
+    :type limit: int
+    :returns: Mapping of 'label.property' to number of migrated states
+    :rtype: dict
+    """
+    counts = {}
+    for model_name, klass in sorted(registry.models.items()):
+        for prop in registry.blob_properties(model_name) or []:
+            start = time.time()
+            count = migrate_property(
+                session,
+                klass.state_label,
+                prop,
+                limit=limit
+            )
+            counts['{}.{}'.format(klass.state_label, prop)] = count
+            print("Migrated {} {}.{} values in {:.3f}s".format(
+                count,
+                klass.state_label,
+                prop,
+                time.time() - start
+            ))
+    return counts
+
+
+if __name__ == '__main__':
+    parser = base_parser(
+        description="Migration script to move inline values into blobs."
+    )
+
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=2000,
+        help="Number of states to migrate at a time."
+    )
+
+    args = parser.parse_args()
+    driver = get_neo4j()
+    with driver.session() as session:
+        migrate(session, limit=args.limit)
+    driver.close()
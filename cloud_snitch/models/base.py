@@ -1,12 +1,14 @@
 import json
 import logging
-import pprint
+from collections import OrderedDict
 from cloud_snitch import utils
 from cloud_snitch.decorators import transient_retry
 
 from cloud_snitch.exc import EntityDefinitionError
 from cloud_snitch.exc import PropertyAlreadyExistsError
 
+from .blob import BlobEntity
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,9 +35,9 @@ class VersionedEdgeSet(object):
         are current(the `to` field is set to end of time).
 
         Determine the edges that are no longer current and mark them with
-        a `to` set to the run completion time
+        a `to` set to the run completion time in a single statement.
 
-        Create the edges that need to be added.
+        Create the edges that need to be added in a single statement.
 
         :param tx: neo4j transaction context
         :type tx: neo4j.v1.api.Transaction
@@ -75,14 +77,15 @@ class VersionedEdgeSet(object):
 
         logger.debug("Current edges: {}".format(current_edges))
 
-        # Set `to` on edges that are no longer current
+        # Set `to` on all edges that are no longer current at once
         old_edges = current_edges - new_edges
         logger.debug("Old edges: {}".format(old_edges))
 
-        for old_identity in old_edges:
+        if old_edges:
             cypher = """
-                MATCH (s:{} {{ {}:$srcIdentity}})
-                MATCH (d:{} {{ {}:$destIdentity}})
+                UNWIND $old AS destIdentity
+                MATCH (s:{} {{ {}:$srcIdentity }})
+                MATCH (d:{} {{ {}:destIdentity }})
                 MATCH (s)-[r:{} {{ to: $eot }}]->(d)
                 SET r.to = $to
             """
@@ -93,25 +96,26 @@ class VersionedEdgeSet(object):
                 self.dest_type.identity_property,
                 self.name
             )
-            logger.debug("Marking {} --> {} as old".format(
-                self.source.identity,
-                old_identity)
+            logger.debug("Marking {} edges from {} as old".format(
+                len(old_edges),
+                self.source.identity)
             )
             logger.debug(cypher)
             tx.run(
                 cypher,
                 srcIdentity=self.source.identity,
-                destIdentity=old_identity,
+                old=sorted(old_edges),
                 eot=utils.EOT,
                 to=time_in_ms
             )
 
-        # Merge in new edges
+        # Merge in all new edges at once
         add_edges = new_edges - current_edges
-        for add_identity in add_edges:
+        if add_edges:
             cypher = """
+                UNWIND $new AS destIdentity
                 MATCH (s:{} {{ {}:$srcIdentity }})
-                MATCH (d:{} {{ {}:$destIdentity }})
+                MATCH (d:{} {{ {}:destIdentity }})
                 MERGE (s)-[r:{} {{ to: $to }}]->(d)
                 ON CREATE SET r.from = $frm
             """
@@ -122,15 +126,15 @@ class VersionedEdgeSet(object):
                 self.dest_type.identity_property,
                 self.name
             )
-            logger.debug("Creating edge {} --> {}:".format(
-                self.source.identity,
-                add_identity)
+            logger.debug("Creating {} edges from {}".format(
+                len(add_edges),
+                self.source.identity)
             )
             logger.debug(cypher)
             tx.run(
                 cypher,
                 srcIdentity=self.source.identity,
-                destIdentity=add_identity,
+                new=sorted(add_edges),
                 frm=time_in_ms,
                 to=utils.EOT
             )
@@ -158,7 +162,8 @@ class VersionedProperty(object):
         concat_properties=None,
         is_static=False,
         is_state=False,
-        is_identity=False
+        is_identity=False,
+        is_blob=False
     ):
         """Init the property.
 
@@ -174,6 +179,9 @@ class VersionedProperty(object):
         :type is_state: bool
         :param is_identity: Is this property an identity property
         :type is_identity: bool
+        :param is_blob: Is this state property stored as a content
+            addressed blob. Only the blob key is kept on the state node.
+        :type is_blob: bool
         """
         self.type = type
         self.concat_properties = concat_properties
@@ -181,11 +189,17 @@ class VersionedProperty(object):
         self.is_static = is_static
         self.is_state = is_state
         self.is_identity = is_identity
+        self.is_blob = is_blob
 
     def is_valid(self):
-        """Validate that the property is one of state, static, or identity"""
+        """Validate that the property is one of state, static, or identity
+
+        Only state properties may be blobs.
+        """
         tests = [self.is_static, self.is_state, self.is_identity]
         positives = [t for t in tests if t]
+        if self.is_blob and not self.is_state:
+            return False
         return (len(positives) == 1)
 
 
@@ -200,6 +214,7 @@ def versioned_properties(klass):
     identity_property = None
     static_properties = []
     state_properties = []
+    blob_properties = []
     concat_properties = {}
 
     for prop_name, prop in klass.properties.items():
@@ -224,6 +239,10 @@ def versioned_properties(klass):
         if prop.is_state:
             state_properties.append(prop_name)
 
+        # Collect blob properties
+        if prop.is_blob:
+            blob_properties.append(prop_name)
+
         # Collect static properties
         if prop.is_static:
             static_properties.append(prop_name)
@@ -242,6 +261,7 @@ def versioned_properties(klass):
     klass.identity_property = identity_property
     klass.static_properties = static_properties
     klass.state_properties = state_properties
+    klass.blob_properties = blob_properties
     klass.concat_properties = concat_properties
     return klass
 
@@ -277,6 +297,9 @@ class VersionedEntity(object):
     # Properties we do need to version
     state_properties = []
 
+    # State properties stored as content addressed blobs
+    blob_properties = []
+
     # Properties that are concatenations of other properties
     concat_properties = {}
 
@@ -401,6 +424,58 @@ class VersionedEntity(object):
         parts = ', '.join(parts)
         return parts, prop_map
 
+    @classmethod
+    def stored_state_properties(cls):
+        """List the properties as stored on state nodes.
+
+        Blob properties are stored as the key of their blob.
+
+        :returns: List of property names
+        :rtype: list
+        """
+        return [
+            BlobEntity.stored_property(p) if p in cls.blob_properties else p
+            for p in cls.state_properties
+        ]
+
+    @classmethod
+    def _inline_blobs_to_keys(cls, state):
+        """Replace inline values of blob properties with their keys.
+
+        States written before a property was stored as a blob keep the
+        value inline. Keying them the same way as new values keeps an
+        unchanged value from creating a new state.
+
+        :param state: Property map of a stored state
+        :type state: dict
+        :returns: The property map with blob keys
+        :rtype: dict
+        """
+        for prop in cls.blob_properties:
+            stored = BlobEntity.stored_property(prop)
+            if prop in state and stored not in state:
+                state[stored] = BlobEntity.key(state.pop(prop))
+        return state
+
+    def _stored_state(self, blobs=None):
+        """Get the state map as stored on the state node.
+
+        :param blobs: Optional mapping to collect key -> value of blobs in
+        :type blobs: dict|None
+        :returns: State property map
+        :rtype: dict
+        """
+        _, state_map = self._prop_clause(self.state_properties)
+        for prop in self.blob_properties:
+            if prop not in state_map:
+                continue
+            value = state_map.pop(prop)
+            key = BlobEntity.key(value)
+            state_map[BlobEntity.stored_property(prop)] = key
+            if blobs is not None:
+                blobs[key] = value
+        return state_map
+
     def _props_set_clause(self, node_variable, props):
         """Build clause for setting properties."""
 
@@ -423,81 +498,7 @@ class VersionedEntity(object):
         :param time_in_ms: Time in milliseconds
         :type time_in_ms: int
         """
-        if not self.state_properties:
-            return
-
-        parts, prop_map = self._prop_clause(self.state_properties)
-
-        # Match current state
-        cypher = """\
-            MATCH (a:{} {{ {}: $identity}})
-                -[r:HAS_STATE {{to: $state_rel_to}}]
-                ->(currentState:{})
-            RETURN currentState
-        """
-        cypher = cypher.format(
-            self.label,
-            self.identity_property,
-            self.state_label
-        )
-        resp = tx.run(cypher, state_rel_to=utils.EOT, identity=self.identity)
-        record = resp.single()
-        if record is None:
-            current_properties = {}
-        else:
-            current_properties = {k: v for k, v in record[0].items()}
-
-        # Determine if new state is different from current
-        dirty = False
-        for prop in self.state_properties:
-            if current_properties.get(prop) != prop_map.get(prop):
-                dirty = True
-
-        if dirty:
-            logger.debug("Data is dirty, making a new state.")
-
-            # Mark current state as old
-            cypher = """
-                MATCH (c:{} {{ {}:$identity }})
-                   -[r1:HAS_STATE {{to: $EOT}}]
-                   ->(currentState:{})
-                SET r1.to = $completed
-            """
-            cypher = cypher.format(
-                self.label,
-                self.identity_property,
-                self.state_label
-            )
-            tx.run(
-                cypher,
-                identity=self.identity,
-                completed=time_in_ms,
-                EOT=utils.EOT
-            )
-
-            # Create relationship
-            prop_map.update({
-                'EOT': utils.EOT,
-                'completed': time_in_ms,
-                'identity': self.identity
-            })
-            cyper = """
-                MATCH (s:{} {{ {}:$identity }})
-                CREATE (s)
-                    -[r2:HAS_STATE {{to: $EOT, from: $completed }}]
-                    ->(newState:{} {{ {} }})
-                RETURN newState
-            """
-            cypher = cyper.format(
-                self.label,
-                self.identity_property,
-                self.state_label,
-                parts
-            )
-            logger.debug('Update state cypher:')
-            logger.debug(cypher)
-            logger.debug("With params:\n{}".format(pprint.pformat(prop_map)))
-            resp = tx.run(cypher, **prop_map)
+        self._update_states(tx, [self], time_in_ms)
 
     def _update(self, tx, time_in_ms):
         """Update the entity in the graph.
@@ -559,6 +560,193 @@ class VersionedEntity(object):
         with session.begin_transaction() as tx:
             self._update(tx, time_in_ms)
 
+    @classmethod
+    def _unique(cls, entities):
+        """Map entities by identity.
+
+        When an identity occurs more than once, the last entity wins, which
+        matches the outcome of updating each entity in order.
+
+        :param entities: List of entities of this class
+        :type entities: list
+        :returns: Entities keyed by identity
+        :rtype: OrderedDict
+        """
+        unique = OrderedDict()
+        for entity in entities:
+            unique[entity.identity] = entity
+        return unique
+
+    @classmethod
+    def _update_many(cls, tx, entities, time_in_ms):
+        """Update many entities of this class with batched statements.
+
+        Identities and static properties are merged with a single
+        UNWIND statement before the states are reconciled in bulk.
+
+        :param tx: neo4j transaction context
+        :type tx: neo4j.v1.api.Transaction
+        :param entities: List of entities of this class
+        :type entities: list
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        unique = cls._unique(entities)
+        if not unique:
+            return
+
+        # Merge identities and static properties
+        rows = []
+        for identity, entity in unique.items():
+            _, static_map = entity._prop_clause(cls.static_properties)
+            rows.append({'identity': identity, 'static': static_map})
+
+        cypher = """
+            UNWIND $rows AS row
+            MERGE (n:{} {{ {}:row.identity }})
+            ON CREATE SET n.created_at = $completed
+            SET n += row.static
+        """
+        cypher = cypher.format(cls.label, cls.identity_property)
+        logger.debug("Updating {} identities:\n{}".format(len(rows), cypher))
+        tx.run(cypher, rows=rows, completed=time_in_ms)
+
+        cls._update_states(tx, list(unique.values()), time_in_ms)
+
+    @classmethod
+    def _update_states(cls, tx, entities, time_in_ms):
+        """Reconcile the states of many entities of this class.
+
+        All current states are read with one query keyed by identity.
+        Dirtiness is computed in Python and only the dirty states are
+        closed and created, each with one more statement.
+
+        :param tx: neo4j transaction context
+        :type tx: neo4j.v1.api.Transaction
+        :param entities: List of entities of this class
+        :type entities: list
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        if not cls.state_properties:
+            return
+        unique = cls._unique(entities)
+        if not unique:
+            return
+
+        # Match all current states
+        cypher = """
+            UNWIND $identities AS identity
+            MATCH (n:{} {{ {}:identity }})
+                -[r:HAS_STATE {{to: $EOT}}]
+                ->(currentState:{})
+            RETURN identity, currentState
+        """
+        cypher = cypher.format(
+            cls.label,
+            cls.identity_property,
+            cls.state_label
+        )
+        resp = tx.run(cypher, identities=list(unique.keys()), EOT=utils.EOT)
+        current = {}
+        for record in resp:
+            current[record['identity']] = cls._inline_blobs_to_keys(
+                {k: v for k, v in record['currentState'].items()}
+            )
+
+        # Determine which states differ from current
+        dirty = []
+        blobs = {}
+        stored_properties = cls.stored_state_properties()
+        for identity, entity in unique.items():
+            entity_blobs = {}
+            state_map = entity._stored_state(blobs=entity_blobs)
+            current_properties = current.get(identity, {})
+            for prop in stored_properties:
+                if current_properties.get(prop) != state_map.get(prop):
+                    dirty.append({'identity': identity, 'state': state_map})
+                    blobs.update(entity_blobs)
+                    break
+
+        if not dirty:
+            return
+        logger.debug("{} of {} {} states are dirty.".format(
+            len(dirty),
+            len(unique),
+            cls.label
+        ))
+
+        # Mark dirty current states as old
+        cypher = """
+            UNWIND $identities AS identity
+            MATCH (n:{} {{ {}:identity }})
+                -[r:HAS_STATE {{to: $EOT}}]
+                ->(currentState:{})
+            SET r.to = $completed
+        """
+        cypher = cypher.format(
+            cls.label,
+            cls.identity_property,
+            cls.state_label
+        )
+        tx.run(
+            cypher,
+            identities=[row['identity'] for row in dirty],
+            completed=time_in_ms,
+            EOT=utils.EOT
+        )
+
+        # Store blob values of the new states once by content
+        BlobEntity._merge_many(tx, blobs)
+
+        # Create the new states
+        cypher = """
+            UNWIND $rows AS row
+            MATCH (n:{} {{ {}:row.identity }})
+            CREATE (n)
+                -[r:HAS_STATE {{to: $EOT, from: $completed}}]
+                ->(newState:{})
+            SET newState = row.state
+        """
+        cypher = cypher.format(
+            cls.label,
+            cls.identity_property,
+            cls.state_label
+        )
+        tx.run(cypher, rows=dirty, completed=time_in_ms, EOT=utils.EOT)
+
+    @classmethod
+    @transient_retry
+    def update_states(cls, session, entities, time_in_ms):
+        """Reconcile the states of many entities in a single transaction.
+
+        Entities must already exist in the graph.
+
+        :param session: Neo4j driver session.
+        :type session: neo4j.v1.session.BoltSession
+        :param entities: List of entities of this class
+        :type entities: list
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        with session.begin_transaction() as tx:
+            cls._update_states(tx, entities, time_in_ms)
+
+    @classmethod
+    @transient_retry
+    def update_many(cls, session, entities, time_in_ms):
+        """Update many entities of this class in a single transaction.
+
+        :param session: Neo4j driver session.
+        :type session: neo4j.v1.session.BoltSession
+        :param entities: List of entities of this class
+        :type entities: list
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        with session.begin_transaction() as tx:
+            cls._update_many(tx, entities, time_in_ms)
+
     @classmethod
     def todict(cls, children=False):
         d = dict(
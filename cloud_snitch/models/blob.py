@@ -0,0 +1,106 @@
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BlobEntity(object):
+    """Model a content addressed value in the graph.
+
+    Large state property values are stored once as (:Blob {key, value})
+    nodes keyed by the sha256 of the value. State nodes keep only the key
+    in a <property>_blob property. Blobs are shared by every state with
+    the same value, so they are only deleted once no state refers to
+    them. The used property records when a sync last stored a state
+    referring to the blob.
+    """
+
+    label = 'Blob'
+    identity_property = 'key'
+
+    @staticmethod
+    def key(value):
+        """Compute the content address of a value.
+
+        :param value: Value to address
+        :type value: str
+        :returns: sha256 hex digest of the value
+        :rtype: str
+        """
+        if not isinstance(value, bytes):
+            value = str(value).encode('utf-8')
+        return hashlib.sha256(value).hexdigest()
+
+    @staticmethod
+    def stored_property(prop):
+        """Get the name of the state property holding the key of a blob.
+
+        :param prop: Name of the blob property
+        :type prop: str
+        :returns: Name of the key property
+        :rtype: str
+        """
+        return '{}_blob'.format(prop)
+
+    @classmethod
+    def _merge_many(cls, tx, blobs):
+        """Create blobs that do not exist yet.
+
+        :param tx: neo4j transaction context
+        :type tx: neo4j.v1.api.Transaction
+        :param blobs: Mapping of key -> value
+        :type blobs: dict
+        """
+        if not blobs:
+            return
+        cypher = """
+            UNWIND $blobs AS blob
+            MERGE (b:{} {{ {}:blob.key }})
+            ON CREATE SET b.value = blob.value
+            SET b.used = timestamp()
+        """
+        cypher = cypher.format(cls.label, cls.identity_property)
+        tx.run(
+            cypher,
+            blobs=[{'key': k, 'value': v} for k, v in blobs.items()]
+        )
+
+    @classmethod
+    def _fetch_many(cls, tx, keys):
+        """Resolve many blob keys in one query.
+
+        :param tx: neo4j transaction context
+        :type tx: neo4j.v1.api.Transaction
+        :param keys: Blob keys
+        :type keys: iterable
+        :returns: Mapping of key -> value
+        :rtype: dict
+        """
+        keys = list(set(k for k in keys if k is not None))
+        if not keys:
+            return {}
+        cypher = """
+            UNWIND $keys AS key
+            MATCH (b:{} {{ {}:key }})
+            RETURN b.{} AS key, b.value AS value
+        """
+        cypher = cypher.format(
+            cls.label,
+            cls.identity_property,
+            cls.identity_property
+        )
+        return {r['key']: r['value'] for r in tx.run(cypher, keys=keys)}
+
+    @classmethod
+    def fetch_many(cls, session, keys):
+        """Resolve many blob keys in one query.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param keys: Blob keys
+        :type keys: iterable
+        :returns: Mapping of key -> value
+        :rtype: dict
+        """
+        with session.begin_transaction() as tx:
+            return cls._fetch_many(tx, keys)
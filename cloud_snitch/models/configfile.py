@@ -22,6 +22,6 @@ class ConfigfileEntity(VersionedEntity):
         'host': VersionedProperty(is_static=True),
         'name': VersionedProperty(is_static=True),
         'md5': VersionedProperty(is_state=True),
-        'contents': VersionedProperty(is_state=True),
+        'contents': VersionedProperty(is_state=True, is_blob=True),
         'is_binary': VersionedProperty(is_state=True)
     }
@@ -3,6 +3,7 @@ import logging
 from .base import versioned_properties
 from .base import VersionedEntity
 from .base import VersionedProperty
+from cloud_snitch import utils
 from .host import HostEntity
 from .gitrepo import GitRepoEntity
 from .uservar import UservarEntity
@@ -87,3 +88,58 @@ class EnvironmentEntity(VersionedEntity):
             if record is None:
                 return None
             return record['t']
+
+    def last_sync_time(self, session):
+        """Get last_sync from the current state of the environment.
+
+        This is a single lookup, unlike last_update which walks every path
+        in the environment subgraph.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :returns: None or the timestamp of the last sync
+        :rtype: int|None
+        """
+        cypher = """
+            MATCH (e:{} {{ {}:$identity }})
+                -[:HAS_STATE {{to: $EOT}}]->(s:{})
+            RETURN s.last_sync AS t
+        """
+        cypher = cypher.format(
+            self.label,
+            self.identity_property,
+            self.state_label
+        )
+        with session.begin_transaction() as tx:
+            record = tx.run(
+                cypher,
+                identity=self.identity,
+                EOT=utils.EOT
+            ).single()
+            if record is None:
+                return None
+            return record['t']
+
+    def set_last_sync_time(self, session, t):
+        """Set last_sync on the current state of the environment.
+
+        Used after a successful sync and to repair environments. This
+        does not version the change.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param t: Timestamp in milliseconds
+        :type t: int
+        """
+        cypher = """
+            MATCH (e:{} {{ {}:$identity }})
+                -[:HAS_STATE {{to: $EOT}}]->(s:{})
+            SET s.last_sync = $t
+        """
+        cypher = cypher.format(
+            self.label,
+            self.identity_property,
+            self.state_label
+        )
+        with session.begin_transaction() as tx:
+            tx.run(cypher, identity=self.identity, EOT=utils.EOT, t=t)
@@ -0,0 +1,73 @@
+import json
+import logging
+
+from .base import versioned_properties
+from .base import VersionedEntity
+from .base import VersionedProperty
+from cloud_snitch import utils
+
+logger = logging.getLogger(__name__)
+
+
+@versioned_properties
+class EnvironmentDigestEntity(VersionedEntity):
+    """Model the document digest ledger of an environment in the graph.
+
+    The ledger maps each document filename of the last successful sync to
+    the sha256 digest of its plaintext. Like the environment lock, the
+    ledger node is not connected to the environment subgraph.
+    """
+
+    label = 'EnvironmentDigest'
+    state_label = 'EnvironmentDigestState'
+    properties = {
+        'uuid': VersionedProperty(is_identity=True),
+        'digests': VersionedProperty(is_static=True, type=dict)
+    }
+
+    @classmethod
+    def load(cls, session, uuid):
+        """Load the digests of the last successful sync.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param uuid: Environment uuid.
+        :type uuid: str
+        :returns: Mapping of filename -> digest
+        :rtype: dict
+        """
+        instance = cls.find(session, uuid)
+        if instance is None or not instance.digests:
+            return {}
+        try:
+            return json.loads(instance.digests)
+        except ValueError:
+            logger.warning('Ignoring invalid digest ledger for {}'.format(
+                uuid
+            ))
+            return {}
+
+    @classmethod
+    def save(cls, session, uuid, digests):
+        """Replace the digests of an environment.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param uuid: Environment uuid.
+        :type uuid: str
+        :param digests: Mapping of filename -> digest
+        :type digests: dict
+        """
+        instance = cls(uuid=uuid, digests=digests)
+        instance.update(session, utils.milliseconds_now())
+
+    @classmethod
+    def clear(cls, session, uuid):
+        """Forget all digests so the next sync processes every document.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param uuid: Environment uuid.
+        :type uuid: str
+        """
+        cls.save(session, uuid, {})
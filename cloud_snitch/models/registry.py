@@ -186,6 +186,19 @@ class Registry:
             return None
         return sorted(klass.static_properties)
 
+    def blob_properties(self, model):
+        """Return the state properties of a model stored as blobs
+
+        :param model: Model name
+        :type model: str
+        :returns: List of blob properties or None
+        :rtype: list|None
+        """
+        klass = self.models.get(model)
+        if klass is None:
+            return None
+        return sorted(klass.blob_properties)
+
     def is_shared(self, model):
         """Return whether or not the model is shared.
 
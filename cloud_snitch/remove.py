@@ -7,11 +7,16 @@ from cloud_snitch.cli_common import base_parser
 from cloud_snitch.cli_common import confirm_env_action
 from cloud_snitch.cli_common import find_environment
 from cloud_snitch.lock import lock_environment
+from cloud_snitch.models import BlobEntity
 from cloud_snitch.models import registry
 from neo4j.v1 import GraphDatabase
 
 logger = logging.getLogger(__name__)
 
+# Blobs used by a sync this recently are kept. A running sync may be
+# about to create a state referring to them.
+BLOB_GRACE = 60 * 60 * 1000
+
 parser = base_parser(description="Remove environment data.")
 
 parser.add_argument(
@@ -125,6 +130,43 @@ def prune(session, env, path, stats):
     return stats
 
 
+def prune_blobs(session, stats):
+    """Delete blobs that no state refers to.
+
+    :param session: Neo4j driver session
+    :type session: neo4j.v1.session.BoltSession
+    :param stats: Dictionary of deleted node counts.
+    :type stats: dict
+    :returns: Updated deleted node counts.
+    :rtype: dict
+    """
+    match = [
+        'MATCH (n:Blob)',
+        'WHERE coalesce(n.used, 0) < timestamp() - $grace'
+    ]
+    refs = [
+        (klass.state_label, BlobEntity.stored_property(prop))
+        for label, klass in sorted(registry.models.items())
+        for prop in registry.blob_properties(label) or []
+    ]
+    for i, (state_label, prop) in enumerate(refs):
+        match += [
+            'OPTIONAL MATCH (s{}:{} {{ {}:n.key }})'.format(
+                i,
+                state_label,
+                prop
+            ),
+            'WITH n, count(s{}) AS refs{}'.format(i, i),
+            'WHERE refs{} = 0'.format(i)
+        ]
+    stats['Blob'] = delete_until_zero(
+        session,
+        ' '.join(match),
+        params={'grace': BLOB_GRACE}
+    )
+    return stats
+
+
 def remove(uuid, skip=False):
     """Remove all data associated with an environment."""
     driver = GraphDatabase.driver(
@@ -160,6 +202,16 @@ def remove(uuid, skip=False):
             for path in reversed(paths):
                 prune(session, env, path, stats)
 
+            # The digest ledger is not connected to the environment.
+            stats['EnvironmentDigest'] = delete_until_zero(
+                session,
+                'MATCH (n:EnvironmentDigest) WHERE n.uuid = $uuid',
+                params={'uuid': env.uuid}
+            )
+
+            # Blobs are shared between environments.
+            prune_blobs(session, stats)
+
             logger.info(
                 "Deleted node counts by type:\n{}"
                 .format(pprint.pformat(stats))
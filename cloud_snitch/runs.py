@@ -1,11 +1,22 @@
 import base64
-import json
+import hashlib
+import io
+import ijson
 import logging
+import mmap
 import os
 import struct
 import tarfile
+import tempfile
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
+
+from cloud_snitch import container
+from cloud_snitch import crypt
+from cloud_snitch import settings
 from cloud_snitch import utils
+from cloud_snitch.identitymap import IdentityMap
 from cloud_snitch.exc import ArchiveObjectError
 from cloud_snitch.exc import InvalidKeyError
 from cloud_snitch.exc import RunAlreadySyncedError
@@ -20,15 +31,292 @@ logger = logging.getLogger(__name__)
 _CURRENT_RUN = None
 
 
+_CHUNK_SIZE = 64 * 1024
+
+
+def read_exactly(stream, size):
+    """Read exactly size bytes unless the stream ends first.
+
+    :param stream: Binary stream to read from
+    :type stream: io.RawIOBase
+    :param size: Number of bytes
+    :type size: int
+    :returns: Bytes read
+    :rtype: bytes
+    """
+    parts = []
+    while size > 0:
+        part = stream.read(size)
+        if not part:
+            break
+        parts.append(part)
+        size -= len(part)
+    return b''.join(parts)
+
+
+class SpoolReader(io.RawIOBase):
+    """Readable stream over one member slice of a spool file.
+
+    Uses positional reads so readers never share a file position.
+    """
+
+    def __init__(self, fd, offset, size):
+        """Init the reader.
+
+        :param fd: File descriptor of the spool
+        :type fd: int
+        :param offset: Offset of the member in the spool
+        :type offset: int
+        :param size: Size of the member
+        :type size: int
+        """
+        self.fd = fd
+        self.position = offset
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        size = min(len(b), self.remaining)
+        if size <= 0:
+            return 0
+        data = os.pread(self.fd, size, self.position)
+        b[:len(data)] = data
+        self.position += len(data)
+        self.remaining -= len(data)
+        return len(data)
+
+
+class CBCDecryptReader(io.RawIOBase):
+    """Readable stream of plaintext from an AES-CBC encrypted member.
+
+    The member is the original length as little endian unsigned long
+    long, the initialization vector and the NUL padded ciphertext.
+    Ciphertext is decrypted one chunk at a time so memory use is bounded
+    by the chunk size rather than the member size.
+    """
+
+    def __init__(self, stream, key, chunk_size=_CHUNK_SIZE):
+        """Init the reader.
+
+        :param stream: Binary stream of the encrypted member
+        :type stream: io.RawIOBase
+        :param key: Decoded AES 256 key
+        :type key: bytes
+        :param chunk_size: Ciphertext bytes to decrypt at a time. Must be
+            a multiple of the AES block size
+        :type chunk_size: int
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size - (chunk_size % AES.block_size)
+        header = read_exactly(
+            stream,
+            struct.calcsize('Q') + AES.block_size
+        )
+        if len(header) < struct.calcsize('Q') + AES.block_size:
+            raise ValueError('Encrypted member is truncated.')
+        self.remaining = struct.unpack('<Q', header[:struct.calcsize('Q')])[0]
+        iv = header[struct.calcsize('Q'):]
+        self.cipher = AES.new(key, AES.MODE_CBC, iv)
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer and self.remaining > 0:
+            chunk = read_exactly(self.stream, self.chunk_size)
+            if not chunk or len(chunk) % AES.block_size:
+                raise ValueError('Encrypted member is truncated.')
+            plain = self.cipher.decrypt(chunk)[:self.remaining]
+            self.remaining -= len(plain)
+            self.buffer = plain
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+class HashingReader(io.RawIOBase):
+    """Readable stream that computes a sha256 of everything read."""
+
+    def __init__(self, stream):
+        """Init the reader.
+
+        :param stream: Binary stream to read from
+        :type stream: io.RawIOBase
+        """
+        self.stream = stream
+        self.hash = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.stream.read(len(b))
+        if not data:
+            return 0
+        b[:len(data)] = data
+        self.hash.update(data)
+        return len(data)
+
+    def hexdigest(self):
+        """Drain the rest of the stream and get the digest.
+
+        :returns: Hex digest of the full stream
+        :rtype: str
+        """
+        while self.read(_CHUNK_SIZE):
+            pass
+        return self.hash.hexdigest()
+
+
+def load_json(stream):
+    """Incrementally parse a single JSON document from a binary stream.
+
+    :param stream: Binary stream
+    :type stream: io.RawIOBase
+    :returns: Parsed document
+    :rtype: object
+    """
+    for obj in ijson.items(stream, '', use_float=True):
+        return obj
+    raise ValueError('Empty JSON document.')
+
+
+def open_member(stream, key=None, executor=None):
+    """Get a plaintext stream for a raw member stream.
+
+    Encrypted members may be framed AES-GCM or legacy AES-CBC. The
+    layout is detected from the first bytes of the member.
+
+    :param stream: Binary stream of the raw member
+    :type stream: io.RawIOBase
+    :param key: Decoded AES 256 key or None for unencrypted members
+    :type key: bytes|None
+    :param executor: Optional executor to decrypt framed chunks with
+    :type executor: concurrent.futures.Executor|None
+    :returns: Plaintext stream
+    :rtype: io.RawIOBase
+    """
+    if key:
+        stream = io.BufferedReader(stream)
+        if crypt.is_framed(stream.peek(len(crypt.MAGIC))):
+            return crypt.FramedDecryptReader(stream, key, executor=executor)
+        return CBCDecryptReader(stream, key)
+    return stream
+
+
+def open_record(stream, key=None, encrypted=False, executor=None):
+    """Get a plaintext stream for a raw container record payload.
+
+    :param stream: Binary stream of the raw payload
+    :type stream: io.RawIOBase
+    :param key: Decoded AES 256 key or None
+    :type key: bytes|None
+    :param encrypted: Whether or not the container is encrypted
+    :type encrypted: bool
+    :param executor: Optional executor to decrypt framed chunks with
+    :type executor: concurrent.futures.Executor|None
+    :returns: Plaintext stream
+    :rtype: io.RawIOBase
+    """
+    if encrypted:
+        stream = open_member(stream, key=key, executor=executor)
+    return container.InflateReader(stream)
+
+
+def peek_run_data(path, key=None):
+    """Read only run_data.json from an archive.
+
+    Streams the archive and stops at run_data.json without spooling any
+    other member. Useful for planning many archives before syncing.
+
+    :param path: Path to the archive
+    :type path: str
+    :param key: Base64 encoded AES 256 key
+    :type key: str
+    :returns: Run data
+    :rtype: dict
+    """
+    try:
+        if key is not None:
+            key = base64.b64decode(key)
+    except Exception:
+        raise InvalidKeyError()
+
+    if container.is_container(path):
+        return _peek_container_run_data(path, key)
+
+    tf = None
+    try:
+        tf = tarfile.open(path, 'r|gz')
+        for member in tf:
+            _, tail = os.path.split(member.name)
+            if member.isfile() and tail == 'run_data.json':
+                stream = open_member(tf.extractfile(member), key=key)
+                return load_json(stream)
+    except (IOError, ValueError, ijson.JSONError, tarfile.TarError):
+        raise RunInvalidError(path)
+    finally:
+        if tf:
+            tf.close()
+    raise RunInvalidError(path)
+
+
+def _peek_container_run_data(path, key=None):
+    """Read only run_data.json from a run container.
+
+    :param path: Path to the container
+    :type path: str
+    :param key: Decoded AES 256 key
+    :type key: bytes|None
+    :returns: Run data
+    :rtype: dict
+    """
+    try:
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            index = container.read_index(buf)
+            for member in index['members']:
+                _, tail = os.path.split(member['name'])
+                if tail == 'run_data.json':
+                    stream = open_record(
+                        container.MmapReader(
+                            buf,
+                            member['offset'],
+                            member['length']
+                        ),
+                        key=key,
+                        encrypted=index.get('encrypted', False)
+                    )
+                    return load_json(stream)
+        finally:
+            buf.close()
+    except (IOError, ValueError, KeyError, ijson.JSONError):
+        raise RunInvalidError(path)
+    raise RunInvalidError(path)
+
+
 class RunArchive:
     """Class for reading optionally encrypted run data json files.
 
-    The archive must be .tar.gz
+    The archive may be a .tar.gz or a run container.
+
+    A .tar.gz is decompressed exactly once. Member bytes are spooled
+    to an anonymous temporary file and indexed by offset and size so that
+    later reads never have to decompress the stream again.
+
+    A run container is memory mapped and its footer index is used
+    directly. Members are read at random and the plaintext digests are
+    taken from the index without reading any member.
 
     """
-    encoding = 'utf-8'
+    chunk_size = 1024 * 1024
 
-    def __init__(self, filename, key=None, mode='r:gz'):
+    def __init__(self, filename, key=None, mode='r:gz', workers=None):
         """Initialize the file object.
 
         :param filename: Filename of archive
@@ -37,6 +325,9 @@ class RunArchive:
         :type key: str
         :param mode: Tarfile read mode (r:gz, r:*, etc)
         :type mode: string
+        :param workers: Number of threads decrypting framed chunks of a
+            member at once. Defaults to settings.DECRYPT_WORKERS
+        :type workers: int|None
         """
         self.filename = filename
 
@@ -50,57 +341,231 @@ class RunArchive:
 
         self.mode = mode
         self.filemap = {}
-
-        # Build the file map
+        self.index = {}
+        self.digests = {}
+        self.encrypted = False
+        self.workers = workers or settings.DECRYPT_WORKERS
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._spool = None
+        self._mmap = None
+
+        if container.is_container(self.filename):
+            self._load_container()
+        else:
+            self._build_index()
+
+    def _build_index(self):
+        """Spool every member in a single sequential pass over the archive.
+
+        Builds the file map of tail -> full name and the index of
+        full name -> (offset, size) within the spool.
+        """
         tf = None
+        spool = tempfile.TemporaryFile()
         try:
             tf = tarfile.open(self.filename, self.mode)
-            for name in tf.getnames():
-                _, tail = os.path.split(name)
-                self.filemap[tail] = name
+            offset = 0
+            for member in tf:
+                if not member.isfile():
+                    continue
+                f = tf.extractfile(member)
+                size = 0
+                while True:
+                    chunk = f.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    spool.write(chunk)
+                    size += len(chunk)
+                self.index[member.name] = (offset, size)
+                offset += size
+
+                _, tail = os.path.split(member.name)
+                self.filemap[tail] = member.name
+            spool.flush()
+        except Exception:
+            spool.close()
+            raise
         finally:
             if tf:
                 tf.close()
+        self._spool = spool
+
+    def _load_container(self):
+        """Map a run container and load its footer index.
+
+        Builds the same file map and index as a spooled .tar.gz and
+        seeds the digests from the index.
+        """
+        with open(self.filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            index = container.read_index(self._mmap)
+            self.encrypted = index.get('encrypted', False)
+            for member in index['members']:
+                name = member['name']
+                self.index[name] = (member['offset'], member['length'])
+                _, tail = os.path.split(name)
+                self.filemap[tail] = name
+                self.digests[tail] = member['digest']
+        except (ValueError, KeyError):
+            self.close()
+            raise ValueError('Invalid run container {}'.format(self.filename))
+
+    def _raw(self, membername):
+        """Get a stream of the raw, possibly encrypted, bytes of a member.
+
+        :param membername: Tail of the member name
+        :type membername: str
+        :returns: Raw member stream
+        :rtype: SpoolReader|container.MmapReader
+        """
+        fullname = self.filemap.get(membername, '')
+        if fullname not in self.index:
+            raise KeyError(membername)
+        offset, size = self.index[fullname]
+        if self._mmap is not None:
+            return container.MmapReader(self._mmap, offset, size)
+        return SpoolReader(self._spool.fileno(), offset, size)
+
+    def open(self, membername):
+        """Get a stream of the plaintext of a member.
+
+        :param membername: Tail of the member name
+        :type membername: str
+        :returns: Plaintext member stream
+        :rtype: io.RawIOBase
+        """
+        if self._mmap is not None:
+            return open_record(
+                self._raw(membername),
+                key=self.key,
+                encrypted=self.encrypted,
+                executor=self.executor
+            )
+        return open_member(
+            self._raw(membername),
+            key=self.key,
+            executor=self.executor
+        )
+
+    @property
+    def executor(self):
+        """Get the executor shared by decrypting readers of the archive.
+
+        :returns: Thread pool or None when decrypting serially
+        :rtype: concurrent.futures.ThreadPoolExecutor|None
+        """
+        with self._executor_lock:
+            if self._executor is None and self.key and self.workers > 1:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def digest(self, membername):
+        """Get the sha256 hex digest of the plaintext of a member.
+
+        Digests are remembered once computed.
+
+        :param membername: Tail of the member name
+        :type membername: str
+        :returns: Hex digest
+        :rtype: str
+        """
+        digest = self.digests.get(membername)
+        if digest is None:
+            try:
+                digest = HashingReader(self.open(membername)).hexdigest()
+            except ValueError:
+                raise ArchiveObjectError(membername)
+            self.digests[membername] = digest
+        return digest
 
     def read(self, membername):
         """Read data from a file.
 
-        Will decrypt if enabled.
-        Will return string.
+        Will decrypt if enabled. The plaintext is decrypted and parsed
+        incrementally and never held in memory as a whole.
 
         :returns: Unserialized json object
         :rtype: dict
         """
-        tf = None
         try:
-            fullname = self.filemap.get(membername, '')
-            tf = tarfile.open(self.filename, self.mode)
-            f = tf.extractfile(fullname)
-            if self.key:
-                # Read original bytes length first
-                length = struct.unpack('<Q', f.read(struct.calcsize('Q')))[0]
+            stream = HashingReader(self.open(membername))
+            obj = load_json(stream)
+            self.digests[membername] = stream.hexdigest()
+            return obj
 
-                # Read initialization vector next
-                iv = f.read(AES.block_size)
-                cipher = AES.new(self.key, AES.MODE_CBC, iv)
-
-                # Read and decrypt rest of string.
-                decrypted = cipher.decrypt(f.read())
+        except (ValueError, ijson.JSONError):
+            raise ArchiveObjectError(membername)
 
-                # Remove padding
-                data = decrypted[:length]
-            else:
-                data = f.read()
+    def _iterate(self, membername, parse):
+        """Open a member and lazily yield parse events from it.
 
-            # Return decoded string.
-            return json.loads(data.decode(self.encoding))
+        The member is opened before returning so that missing members
+        raise immediately. The digest is recorded once the member has
+        been iterated to the end.
 
-        except ValueError:
-            raise ArchiveObjectError(membername)
+        :param membername: Tail of the member name
+        :type membername: str
+        :param parse: Callable taking a stream and returning an iterator
+        :type parse: callable
+        :returns: Iterator of parsed objects
+        :rtype: generator
+        """
+        stream = HashingReader(self.open(membername))
 
-        finally:
-            if tf:
-                tf.close()
+        def generate():
+            try:
+                for obj in parse(stream):
+                    yield obj
+                self.digests[membername] = stream.hexdigest()
+            except (ValueError, ijson.JSONError):
+                raise ArchiveObjectError(membername)
+
+        return generate()
+
+    def iter_items(self, membername, prefix):
+        """Incrementally yield the objects under prefix in a member.
+
+        :param membername: Tail of the member name
+        :type membername: str
+        :param prefix: ijson prefix such as 'data.item'
+        :type prefix: str
+        :returns: Iterator of objects
+        :rtype: generator
+        """
+        return self._iterate(
+            membername,
+            lambda stream: ijson.items(stream, prefix, use_float=True)
+        )
+
+    def iter_kvitems(self, membername, prefix):
+        """Incrementally yield (key, value) pairs of the object at prefix.
+
+        :param membername: Tail of the member name
+        :type membername: str
+        :param prefix: ijson prefix such as 'data'
+        :type prefix: str
+        :returns: Iterator of (key, value) tuples
+        :rtype: generator
+        """
+        return self._iterate(
+            membername,
+            lambda stream: ijson.kvitems(stream, prefix, use_float=True)
+        )
+
+    def close(self):
+        """Remove the spooled member data or unmap the container."""
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
 
 
 class Run:
@@ -115,6 +580,14 @@ class Run:
         :type key: base64 encoded AES256 key.
         """
         self.path = path
+        self.entities = IdentityMap()
+
+        # Digests of documents from the last successful sync
+        self.previous_digests = {}
+
+        # Documents applied to the graph by this sync
+        self.applied = set()
+        self._applied_lock = threading.Lock()
         try:
             self.archive = RunArchive(self.path, key=key)
             self.run_data = self._read_data()
@@ -153,6 +626,83 @@ class Run:
         """
         return self.archive.read(filename)
 
+    def iter_object(self, filename, path='data.item'):
+        """Incrementally yield the objects at path in a file in the run.
+
+        The document is parsed as it is read and never fully built.
+
+        :param filename: Name of the file containing the objects.
+        :type filename: str
+        :param path: ijson prefix of the objects to yield
+        :type path: str
+        :returns: Iterator of objects
+        :rtype: generator
+        """
+        return self.archive.iter_items(filename, path)
+
+    def iter_kvitems(self, filename, path='data'):
+        """Incrementally yield (key, value) pairs of the object at path.
+
+        :param filename: Name of the file containing the object.
+        :type filename: str
+        :param path: ijson prefix of the object
+        :type path: str
+        :returns: Iterator of (key, value) tuples
+        :rtype: generator
+        """
+        return self.archive.iter_kvitems(filename, path)
+
+    def digest(self, filename):
+        """Get the digest of the plaintext of a file in the run.
+
+        :param filename: Name of the file
+        :type filename: str
+        :returns: sha256 hex digest
+        :rtype: str
+        """
+        return self.archive.digest(filename)
+
+    def mark_applied(self, filename):
+        """Record that a file in the run was applied to the graph.
+
+        :param filename: Name of the file
+        :type filename: str
+        """
+        with self._applied_lock:
+            self.applied.add(filename)
+
+    def digests(self):
+        """Get digests of every file applied by this sync.
+
+        Files that were skipped, for example because their parent was
+        not found, are left out so they are processed again next sync.
+
+        :returns: Mapping of filename -> digest
+        :rtype: dict
+        """
+        with self._applied_lock:
+            applied = list(self.applied)
+        return {f: self.digest(f) for f in applied}
+
+    def unchanged(self, filename):
+        """Check if a file is identical to the last successful sync.
+
+        An unchanged file was applied by that sync and counts as applied
+        by this one.
+
+        :param filename: Name of the file
+        :type filename: str
+        :returns: True if the file has not changed, False otherwise
+        :rtype: bool
+        """
+        previous = self.previous_digests.get(filename)
+        if previous is None:
+            return False
+        if previous != self.digest(filename):
+            return False
+        self.mark_applied(filename)
+        return True
+
     @property
     def completed(self):
         """Get completed datetime
@@ -237,6 +787,10 @@ class Run:
         """Execute hook for successful sync."""
         pass
 
+    def close(self):
+        """Release resources held by the run archive."""
+        self.archive.close()
+
     def error(self):
         """Execute hook for unsuccessful sync."""
         pass
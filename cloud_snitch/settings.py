@@ -64,3 +64,15 @@ NEO4J_URI = conf_data.get('neo4j', {}).get('uri')
 MAX_RETRIES = conf_data.get('neo4j', {}).get('max_retries', 5)
 
 DATA_DIR = conf_data.get('data_dir')
+
+# Number of snitchers allowed to run at once during a sync
+SNITCHER_WORKERS = conf_data.get('snitcher_workers', 1)
+
+# Number of hosts a host scoped snitcher may update at once
+HOST_WORKERS = conf_data.get('host_workers', 1)
+
+# Number of environments the sync command may sync at once
+SYNC_WORKERS = conf_data.get('sync_workers', 4)
+
+# Number of threads decrypting chunks of one archive member at once
+DECRYPT_WORKERS = conf_data.get('decrypt_workers', 2)
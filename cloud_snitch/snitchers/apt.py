@@ -1,6 +1,7 @@
 import logging
 
 from .base import BaseSnitcher
+from .host import HostSnitcher
 from cloud_snitch.models import AptPackageEntity
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.models import HostEntity
@@ -11,15 +12,15 @@ logger = logging.getLogger(__name__)
 class AptSnitcher(BaseSnitcher):
     """Models path host -> virtualenv -> python package path in graph."""
 
+    requires = (HostSnitcher,)
+
     file_pattern = '^dpkg_list_(?P<hostname>.*).json$'
 
-    def _update_apt_package(self, session, pkgdict):
-        """Updates apt package in graph.
+    def _apt_package(self, pkgdict):
+        """Create an apt package entity from a package dict.
 
-        Will only update the apt package if status = installed
+        Will only create the apt package if status = installed
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param pkgdict: apt package dict.
             should contain name and version and status.
         :type pkg: dict
@@ -29,40 +30,53 @@ class AptSnitcher(BaseSnitcher):
         if pkgdict.get('status') != 'installed':
             return None
 
-        aptpkg = AptPackageEntity(
+        return AptPackageEntity(
             name=pkgdict.get('name'),
             version=pkgdict.get('version')
         )
-        aptpkg.update(session, self.time_in_ms)
-        return aptpkg
 
-    def _snitch(self, session):
-        """Update the apt part of the graph..
+    def _update_host(self, session, hostname, filename):
+        """Update apt packages for a host.
 
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
+        :param hostname: Name of the host
+        :type hostname: str
+        :param filename: Name of file
+        :type filename: str
         """
         env = EnvironmentEntity(uuid=self.run.environment_uuid)
+        aptpkgs = []
+
+        # Find host in graph, return early if host not found.
+        host = HostEntity(hostname=hostname, environment=env.identity)
+        host = self.run.entities.find(HostEntity, session, host.identity)
+        if host is None:
+            logger.warning(
+                'Unable to locate host entity {}'.format(hostname)
+            )
+            return
 
-        for hostname, filename in self._find_host_tuples(self.file_pattern):
-            aptpkgs = []
-
-            # Find host in graph, continue if host not found.
-            host = HostEntity(hostname=hostname, environment=env.identity)
-            host = HostEntity.find(session, host.identity)
-            if host is None:
-                logger.warning(
-                    'Unable to locate host entity {}'.format(hostname)
-                )
-                continue
-
-            # Read data from file
-            aptdata = self.run.get_object(filename)
-            aptlist = aptdata.get('data', [])
-
-            # Iterate over package maps
-            for aptdict in aptlist:
-                aptpkg = self._update_apt_package(session, aptdict)
-                if aptpkg is not None:
-                    aptpkgs.append(aptpkg)
-            host.aptpackages.update(session, aptpkgs, self.time_in_ms)
+        # Stream package maps from file
+        for aptdict in self.run.iter_object(filename):
+            aptpkg = self._apt_package(aptdict)
+            if aptpkg is not None:
+                aptpkgs.append(aptpkg)
+
+        # Update packages in bulk and then the host -> package edges.
+        self.run.entities.update_many(
+            AptPackageEntity,
+            session,
+            aptpkgs,
+            self.time_in_ms
+        )
+        host.aptpackages.update(session, aptpkgs, self.time_in_ms)
+        self.run.mark_applied(filename)
+
+    def _snitch(self, session):
+        """Update the apt part of the graph..
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        """
+        self._snitch_hosts(session, self.file_pattern)
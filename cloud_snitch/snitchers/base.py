@@ -1,8 +1,12 @@
 import logging
 import os
 import re
+import threading
 import time
 
+from concurrent.futures import ThreadPoolExecutor
+
+from cloud_snitch import settings
 from cloud_snitch import utils
 
 logger = logging.getLogger(__name__)
@@ -11,6 +15,9 @@ logger = logging.getLogger(__name__)
 class BaseSnitcher(object):
     """Models path to update a subgraph for an environment."""
 
+    # Snitcher classes that must finish before this snitcher can start.
+    requires = ()
+
     def __init__(self, driver, run):
         """Init the snitcher with a driver instance.
 
@@ -49,6 +56,94 @@ class BaseSnitcher(object):
 
         return host_tuples
 
+    def _changed(self, host_tuples):
+        """Filter out host files identical to the last successful sync.
+
+        :param host_tuples: List of tuples of (hostname, filename)
+        :type host_tuples: list
+        :returns: List of tuples of (hostname, filename) that changed
+        :rtype: list
+        """
+        changed = [t for t in host_tuples if not self.run.unchanged(t[1])]
+        skipped = len(host_tuples) - len(changed)
+        if skipped:
+            logger.info("{} skipping {} unchanged host files.".format(
+                self.__class__.__name__,
+                skipped
+            ))
+        return changed
+
+    def _update_host(self, session, hostname, filename):
+        """Update the subgraph of a single host.
+
+        Host scoped snitchers implement this to use _snitch_hosts.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param hostname: Name of the host
+        :type hostname: str
+        :param filename: Name of file
+        :type filename: str
+        """
+        raise NotImplementedError('Update host method not implemented.')
+
+    def _snitch_hosts(self, session, pattern):
+        """Call _update_host for every host file matching pattern.
+
+        Host files that are unchanged since the last successful sync are
+        skipped. With more than one configured host worker, hosts are updated
+        concurrently and each worker thread uses its own session. A
+        failing host does not stop or replay the other hosts; the first
+        error is raised once every host has been attempted.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param pattern: Regex pattern with a hostname group
+        :type pattern: str
+        """
+        host_tuples = self._changed(self._find_host_tuples(pattern))
+        workers = min(settings.HOST_WORKERS, len(host_tuples))
+        if workers <= 1:
+            for hostname, filename in host_tuples:
+                self._update_host(session, hostname, filename)
+            return
+
+        local = threading.local()
+        sessions = []
+        sessions_lock = threading.Lock()
+
+        def update(host_tuple):
+            worker_session = getattr(local, 'session', None)
+            if worker_session is None:
+                worker_session = self.driver.session()
+                local.session = worker_session
+                with sessions_lock:
+                    sessions.append(worker_session)
+            self._update_host(worker_session, *host_tuple)
+
+        errors = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    (host_tuple[0], executor.submit(update, host_tuple))
+                    for host_tuple in host_tuples
+                ]
+                for hostname, future in futures:
+                    exc = future.exception()
+                    if exc is not None:
+                        logger.error("{} failed on host {}: {}".format(
+                            self.__class__.__name__,
+                            hostname,
+                            exc
+                        ))
+                        errors.append(exc)
+        finally:
+            for worker_session in sessions:
+                worker_session.close()
+
+        if errors:
+            raise errors[0]
+
     def _snitch(self, session):
         """All subclasses must implement this.
 
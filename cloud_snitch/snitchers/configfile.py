@@ -2,6 +2,7 @@ import logging
 import os
 
 from .base import BaseSnitcher
+from .host import HostSnitcher
 from cloud_snitch.models import ConfigfileEntity
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.models import HostEntity
@@ -12,6 +13,8 @@ logger = logging.getLogger(__name__)
 class ConfigfileSnitcher(BaseSnitcher):
     """Models path host -> configfile"""
 
+    requires = (HostSnitcher,)
+
     file_pattern = '^file_dict_(?P<hostname>.*).json$'
 
     def _update_host(self, session, hostname, filename):
@@ -24,36 +27,43 @@ class ConfigfileSnitcher(BaseSnitcher):
         :param filename: Name of file
         :type filename: str
         """
-        # Extract config and environment data.
+        # Extract environment data.
         env = EnvironmentEntity(uuid=self.run.environment_uuid)
-        configdata = self.run.get_object(filename).get('data', {})
 
         # Find parent host object - return early if not exists.
         host = HostEntity(hostname=hostname, environment=env.identity)
-        host = HostEntity.find(session, host.identity)
+        host = self.run.entities.find(HostEntity, session, host.identity)
         if host is None:
             logger.warning('Unable to locate host {}'.format(hostname))
             return
 
-        # Iterate over configration files in the host's directory
+        # Stream configuration files in the host's directory
         configfiles = []
-        for filename, metadata in configdata.items():
-            _, name = os.path.split(filename)
+        for path, metadata in self.run.iter_kvitems(filename):
+            _, name = os.path.split(path)
 
-            # Update configfile node
+            # Create configfile node
             configfile = ConfigfileEntity(
-                path=filename,
+                path=path,
                 host=host.identity,
                 md5=metadata.get('md5'),
                 contents=metadata.get('contents'),
                 is_binary=metadata.get('is_binary'),
                 name=name
             )
-            configfile.update(session, self.time_in_ms)
             configfiles.append(configfile)
 
+        # Update configfile nodes in bulk.
+        self.run.entities.update_many(
+            ConfigfileEntity,
+            session,
+            configfiles,
+            self.time_in_ms
+        )
+
         # Update host -> configfile relationships.
         host.configfiles.update(session, configfiles, self.time_in_ms)
+        self.run.mark_applied(filename)
 
     def _snitch(self, session):
         """Update the apt part of the graph..
@@ -61,5 +71,4 @@ class ConfigfileSnitcher(BaseSnitcher):
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
         """
-        for hostname, filename in self._find_host_tuples(self.file_pattern):
-            self._update_host(session, hostname, filename)
+        self._snitch_hosts(session, self.file_pattern)
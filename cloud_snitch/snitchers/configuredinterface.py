@@ -1,6 +1,7 @@
 import logging
 
 from .base import BaseSnitcher
+from .host import HostSnitcher
 from cloud_snitch.models import ConfiguredInterfaceEntity
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.models import HostEntity
@@ -11,6 +12,8 @@ logger = logging.getLogger(__name__)
 class ConfiguredInterfaceSnitcher(BaseSnitcher):
     """Models path host -> configuredinterface"""
 
+    requires = (HostSnitcher,)
+
     file_pattern = '^configuredinterface_(?P<hostname>.*).json$'
 
     def _update_host(self, session, hostname, filename):
@@ -23,20 +26,19 @@ class ConfiguredInterfaceSnitcher(BaseSnitcher):
         :param filename: Name of file
         :type filename: str
         """
-        # Extract config and environment data.
+        # Extract environment data.
         env = EnvironmentEntity(uuid=self.run.environment_uuid)
-        configdata = self.run.get_object(filename).get('data', {})
 
         # Find parent host object - return early if not exists.
         host = HostEntity(hostname=hostname, environment=env.identity)
-        host = HostEntity.find(session, host.identity)
+        host = self.run.entities.find(HostEntity, session, host.identity)
         if host is None:
             logger.warning('Unable to locate host {}'.format(hostname))
             return
 
-        # Iterate over configration files in the host's directory
+        # Stream configured interfaces of the host
         interfaces = []
-        for device, metadata in configdata.items():
+        for device, metadata in self.run.iter_kvitems(filename):
             interfacekwargs = {
                 'device': device,
                 'host': host.identity
@@ -49,10 +51,19 @@ class ConfiguredInterfaceSnitcher(BaseSnitcher):
                 interfacekwargs[key] = val
 
             interface = ConfiguredInterfaceEntity(**interfacekwargs)
-            interface.update(session, self.time_in_ms)
             interfaces.append(interface)
+
+        # Update configuredinterface nodes in bulk.
+        self.run.entities.update_many(
+            ConfiguredInterfaceEntity,
+            session,
+            interfaces,
+            self.time_in_ms
+        )
+
         # Update host -> configuredinterfaces relationships.
         host.configuredinterfaces.update(session, interfaces, self.time_in_ms)
+        self.run.mark_applied(filename)
 
     def _snitch(self, session):
         """Update the apt part of the graph..
@@ -60,5 +71,4 @@ class ConfiguredInterfaceSnitcher(BaseSnitcher):
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
         """
-        for hostname, filename in self._find_host_tuples(self.file_pattern):
-            self._update_host(session, hostname, filename)
+        self._snitch_hosts(session, self.file_pattern)
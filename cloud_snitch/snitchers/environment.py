@@ -19,15 +19,25 @@ class EnvironmentSnitcher(BaseSnitcher):
         :returns: Environment object
         :rtype: HostEntity
         """
+        # last_sync is set once the whole run has been synced. Keep the
+        # current value so it does not version the state on its own.
+        env = EnvironmentEntity(uuid=self.run.environment_uuid)
+        last_sync = env.last_sync_time(session)
+
         env = EnvironmentEntity(
             uuid=self.run.environment_uuid,
             account_number=self.run.environment_account_number,
             name=self.run.environment_name,
-            last_sync=self.time_in_ms,
+            last_sync=last_sync,
             status='na'
         )
         # TODO - Update status to something real in the future.
-        env.update(session, self.time_in_ms)
+        self.run.entities.update_many(
+            EnvironmentEntity,
+            session,
+            [env],
+            self.time_in_ms
+        )
         return env
 
     def _snitch(self, session):
@@ -2,6 +2,7 @@ import hashlib
 import logging
 
 from .base import BaseSnitcher
+from .environment import EnvironmentSnitcher
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.models import GitRepoEntity
 from cloud_snitch.models import GitRemoteEntity
@@ -14,61 +15,27 @@ logger = logging.getLogger(__name__)
 class GitSnitcher(BaseSnitcher):
     """Models the following path env -> gitrepo -> remotename -> url"""
 
-    def _update_untracked_file(self, session, path):
-        """Update a untracked file in a graph
+    requires = (EnvironmentSnitcher,)
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
-        :param path: Path local to the repo of the untracked file
-        :type path: str
-        :returns: Untracked file object
-        :rtype: GitUntrackedFileEntity
-        """
-        untracked = GitUntrackedFileEntity(path=path)
-        untracked.update(session, self.time_in_ms)
-        return untracked
-
-    def _update_url(self, session, urlstr):
-        """Update a git url in a graph.
-
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
-        :param urlstr: Url to update
-        :type urlstr: str
-        """
-        url = GitUrlEntity(url=urlstr)
-        url.update(session, self.time_in_ms)
-        return url
+    def _remote(self, repo, name, urllist):
+        """Create a git remote and its urls for a git repo.
 
-    def _update_remote(self, session, repo, name, urllist):
-        """Updates git remotes for a git repo.
-
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param repo: Source repo
         :type repo: GitRepoEntity
-        :param gitrepo: source git repo
-        :type gitrepo: GitRepoEntity
         :param name: Name of the remote (origin, upstream, etc)
         :type name: str
         :param urllist: List of urls
         :type urllist: list
+        :returns: GitRemote object and list of GitUrl objects
+        :rtype: tuple
         """
         remote = GitRemoteEntity(name=name, repo=repo.identity)
-        remote.update(session, self.time_in_ms)
+        urls = [GitUrlEntity(url=url) for url in urllist]
+        return remote, urls
 
-        urls = []
-        for url in urllist:
-            urls.append(self._update_url(session, url))
+    def _gitrepo(self, env, repodict):
+        """Create a gitrepo from a repo dict.
 
-        remote.urls.update(session, urls, self.time_in_ms)
-        return remote
-
-    def _update_gitrepo(self, session, env, repodict):
-        """Updates gitrepo information in graph.
-
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param env: Parent environment
         :type env: EnvironmentEntity
         :param repodict: git repo dict.
@@ -95,7 +62,7 @@ class GitSnitcher(BaseSnitcher):
             working_tree_diff_md5 = m.hexdigest()
 
         # Make instance of the git repo
-        gitrepo = GitRepoEntity(
+        return GitRepoEntity(
             environment=env.identity,
             active_branch_name=repodict.get('active_branch_name'),
             head_sha=repodict.get('head_sha'),
@@ -106,21 +73,6 @@ class GitSnitcher(BaseSnitcher):
             working_tree_dirty=repodict['working_tree']['is_dirty'],
             working_tree_diff_md5=working_tree_diff_md5
         )
-        gitrepo.update(session, self.time_in_ms)
-
-        # Update all remotes.
-        remotes = []
-        for name, urls in repodict.get('remotes', {}).items():
-            remotes.append(self._update_remote(session, gitrepo, name, urls))
-        gitrepo.remotes.update(session, remotes, self.time_in_ms)
-
-        # Update untracked files
-        untracked = []
-        for path in repodict['working_tree'].get('untracked_files', []):
-            untracked.append(self._update_untracked_file(session, path))
-
-        gitrepo.untrackedfiles.update(session, untracked, self.time_in_ms)
-        return gitrepo
 
     def _snitch(self, session):
         """Orchestrates the creation of the environment.
@@ -128,27 +80,85 @@ class GitSnitcher(BaseSnitcher):
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
         """
-        # Load saved git data
+        if self.run.unchanged('gitrepos.json'):
+            logger.info('Skipping unchanged git data.')
+            return
+
+        # Open saved git data for streaming
         try:
-            gitdata = self.run.get_object('gitrepos.json')
+            gitdata = self.run.iter_object('gitrepos.json')
         except IOError:
             logger.info('No data for git could be found.')
             return
 
         # Try to locate environment by identity
         uuid = self.run.environment_uuid
-        env = EnvironmentEntity.find(session, uuid)
+        env = self.run.entities.find(EnvironmentEntity, session, uuid)
         if env is None:
             logger.warning(
                 'Unable to locate environment {}.'.format(uuid)
             )
             return
 
-        # Iterate over each git repo
+        # Build each git repo with its remotes, urls and untracked files.
         gitrepos = []
-        for gitdict in gitdata.get('data', []):
-            gitrepo = self._update_gitrepo(session, env, gitdict)
+        repo_tuples = []
+        remote_tuples = []
+        urls = []
+        untracked = []
+        for gitdict in gitdata:
+            gitrepo = self._gitrepo(env, gitdict)
             gitrepos.append(gitrepo)
 
+            remotes = []
+            for name, urllist in gitdict.get('remotes', {}).items():
+                remote, remote_urls = self._remote(gitrepo, name, urllist)
+                remotes.append(remote)
+                remote_tuples.append((remote, remote_urls))
+                urls += remote_urls
+
+            repo_untracked = [
+                GitUntrackedFileEntity(path=path) for path in
+                gitdict['working_tree'].get('untracked_files', [])
+            ]
+            untracked += repo_untracked
+            repo_tuples.append((gitrepo, remotes, repo_untracked))
+
+        # Update entities in bulk
+        self.run.entities.update_many(
+            GitRepoEntity,
+            session,
+            gitrepos,
+            self.time_in_ms
+        )
+        self.run.entities.update_many(
+            GitRemoteEntity,
+            session,
+            [r for r, _ in remote_tuples],
+            self.time_in_ms
+        )
+        self.run.entities.update_many(
+            GitUrlEntity,
+            session,
+            urls,
+            self.time_in_ms
+        )
+        self.run.entities.update_many(
+            GitUntrackedFileEntity,
+            session,
+            untracked,
+            self.time_in_ms
+        )
+
         # Update edges
+        for remote, remote_urls in remote_tuples:
+            remote.urls.update(session, remote_urls, self.time_in_ms)
+        for gitrepo, remotes, repo_untracked in repo_tuples:
+            gitrepo.remotes.update(session, remotes, self.time_in_ms)
+            gitrepo.untrackedfiles.update(
+                session,
+                repo_untracked,
+                self.time_in_ms
+            )
         env.gitrepos.update(session, gitrepos, self.time_in_ms)
+        self.run.mark_applied('gitrepos.json')
@@ -1,6 +1,7 @@
 import logging
 
 from .base import BaseSnitcher
+from .environment import EnvironmentSnitcher
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.models import DeviceEntity
 from cloud_snitch.models import HostEntity
@@ -75,17 +76,19 @@ _INTERFACE_KEY_MAP = {
 class HostSnitcher(BaseSnitcher):
     """Models path to update graph entities for an environment."""
 
+    requires = (EnvironmentSnitcher,)
+
     file_pattern = '^facts_(?P<hostname>.*).json$'
 
-    def _update_interfaces(self, session, host, ansibledict):
-        """Update host interfaces in graph.
+    def _interfaces(self, host, ansibledict):
+        """Create host interfaces from ansible facts.
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param host: Host object
         :type host: HostEntity
         :param ansibledict: Ansible fact dict
         :type ansibledict: dict
+        :returns: List of interface objects
+        :rtype: list
         """
         interfaces = []
 
@@ -107,20 +110,18 @@ class HostSnitcher(BaseSnitcher):
                 if val is not None:
                     interfacekwargs[interface_key] = val
 
-            interface = InterfaceEntity(**interfacekwargs)
-            interface.update(session, self.time_in_ms)
-            interfaces.append(interface)
-        host.interfaces.update(session, interfaces, self.time_in_ms)
+            interfaces.append(InterfaceEntity(**interfacekwargs))
+        return interfaces
 
-    def _update_partitions(self, session, device, devicedict):
-        """Update partitions of a device
+    def _partitions(self, device, devicedict):
+        """Create partitions of a device
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param device: device object
         :type device: DeviceEntity
         :param devicedict: Ansible fact dict
         :type devicedict: dict
+        :returns: List of partition objects
+        :rtype: list
         """
         partitions = []
 
@@ -139,22 +140,18 @@ class HostSnitcher(BaseSnitcher):
                     partitionkwargs[partition_key] = val
 
             # Create the partition
-            partition = PartitionEntity(**partitionkwargs)
-            partition.update(session, self.time_in_ms)
-            partitions.append(partition)
-
-        # Update device -> partition edges.
-        device.partitions.update(session, partitions, self.time_in_ms)
+            partitions.append(PartitionEntity(**partitionkwargs))
+        return partitions
 
-    def _update_devices(self, session, host, ansibledict):
-        """Update devices for a host
+    def _devices(self, host, ansibledict):
+        """Create devices for a host
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param host: Host object
         :type host: HostEntity
         :param ansibledict: Ansible fact dict
         :type ansibledict: dict
+        :returns: List of (device object, list of partition objects)
+        :rtype: list
         """
         devices = []
 
@@ -173,24 +170,18 @@ class HostSnitcher(BaseSnitcher):
                     devicekwargs[device_key] = val
 
             device = DeviceEntity(**devicekwargs)
-            device.update(session, self.time_in_ms)
-
-            self._update_partitions(session, device, devicedict)
-
-            devices.append(device)
-
-        # Update host -> device edges
-        host.devices.update(session, devices, self.time_in_ms)
+            devices.append((device, self._partitions(device, devicedict)))
+        return devices
 
-    def _update_mounts(self, session, host, ansibledict):
-        """Update mounts for a host.
+    def _mounts(self, host, ansibledict):
+        """Create mounts for a host.
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param host: Host object
         :type host: HostEntity
         :param ansibledict: Ansible fact dict
         :type ansibledict: dict
+        :returns: List of mount objects
+        :rtype: list
         """
         mounts = []
 
@@ -205,61 +196,46 @@ class HostSnitcher(BaseSnitcher):
                 if val is not None:
                     mountkwargs[mount_key] = val
 
-            mount = MountEntity(**mountkwargs)
-            mount.update(session, self.time_in_ms)
-            mounts.append(mount)
-
-        # Update host -> mounts edges.
-        host.mounts.update(session, mounts, self.time_in_ms)
+            mounts.append(MountEntity(**mountkwargs))
+        return mounts
 
-    def _update_nameservers(self, session, host, ansibledict):
-        """Update nameservers for a host.
+    def _nameservers(self, host, ansibledict):
+        """Create nameservers for a host.
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param host: Host object
         :type host: HostEntity
         :param ansibledict: Ansible fact dict
         :type ansibledict: dict
+        :returns: List of nameserver objects or None if not reported
+        :rtype: list|None
         """
         nameserver_list = complex_get('ansible_dns:nameservers', ansibledict)
 
         # Return early if no nameservers.
         if nameserver_list is None:
-            return
+            return None
 
         # Iterate over each nameserver in the list
-        nameservers = []
-        for nameserver_item in nameserver_list:
-            nameserver = NameServerEntity(ip=nameserver_item)
-            nameserver.update(session, self.time_in_ms)
-            nameservers.append(nameserver)
-
-        # Update edges from host to nameservers.
-        host.nameservers.update(session, nameservers, self.time_in_ms)
+        return [NameServerEntity(ip=ip) for ip in nameserver_list]
 
-    def _host_from_tuple(self, session, env, host_tuple):
+    def _host_from_tuple(self, env, host_tuple):
         """Load hostdata from json file and create HostEntity instance.
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param env: Environment entity hosts belong to.
         :type env: EnvironmentEntity
         :param host_tuple: (hostname, filename)
         :type host_tuple: tuple
-        :returns: Host object
-        :rtype: HostEntity
+        :returns: Host object and its ansible fact dict
+        :rtype: tuple
         """
         hostname, filename = host_tuple
-        fulldict = self.run.get_object(filename)
-        fulldict = fulldict.get('data', {})
 
         # Start kwargs for making the host entity
         hostkwargs = {}
 
-        # Remove anything not prefixed with 'ansible_'
+        # Stream facts, keeping only those prefixed with 'ansible_'
         ansibledict = {}
-        for k, v in fulldict.items():
+        for k, v in self.run.iter_kvitems(filename):
             if k.startswith('ansible_'):
                 ansibledict[k] = v
 
@@ -280,27 +256,13 @@ class HostSnitcher(BaseSnitcher):
             environment=env.identity,
             **hostkwargs
         )
-        host.update(session, self.time_in_ms)
-
-        # Update nameservers subgraph
-        self._update_nameservers(session, host, ansibledict)
-
-        # Update mounts subgraph
-        self._update_mounts(session, host, ansibledict)
-
-        # Update devices
-        self._update_devices(session, host, ansibledict)
-
-        # Update interfaces
-        self._update_interfaces(session, host, ansibledict)
-
-        return host
+        return host, ansibledict
 
     def _snitch(self, session):
         """Orchestrates the updating of the hosts.
 
-        Will first create/update any host entities.
-        Will then version edges from environment to each host.
+        Will first create/update any host entities and their subgraphs
+        in bulk. Will then version edges from environment to each host.
 
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
@@ -308,15 +270,89 @@ class HostSnitcher(BaseSnitcher):
         env = EnvironmentEntity(uuid=self.run.environment_uuid)
 
         hosts = []
+        changed = []
+        host_tuples = []
+        filenames = []
 
-        # Update each host entity
+        # Create each host entity. Hosts with unchanged facts keep their
+        # subgraph and only take part in the environment -> host edges.
         for host_tuple in self._find_host_tuples(self.file_pattern):
-            host = self._host_from_tuple(session, env, host_tuple)
+            hostname, filename = host_tuple
+            if self.run.unchanged(filename):
+                hosts.append(
+                    HostEntity(hostname=hostname, environment=env.identity)
+                )
+                continue
+            host, ansibledict = self._host_from_tuple(env, host_tuple)
             hosts.append(host)
+            changed.append(host)
+            host_tuples.append((host, ansibledict))
+            filenames.append(filename)
 
         # Return early if no hosts found
         if not hosts:
             return
+        if len(changed) < len(hosts):
+            logger.info("Skipping {} hosts with unchanged facts.".format(
+                len(hosts) - len(changed)
+            ))
+
+        self.run.entities.update_many(
+            HostEntity,
+            session,
+            changed,
+            self.time_in_ms
+        )
+
+        # Create host subgraphs
+        nameserver_tuples = []
+        mount_tuples = []
+        device_tuples = []
+        partition_tuples = []
+        interface_tuples = []
+        for host, ansibledict in host_tuples:
+            nameservers = self._nameservers(host, ansibledict)
+            if nameservers is not None:
+                nameserver_tuples.append((host, nameservers))
+            mount_tuples.append((host, self._mounts(host, ansibledict)))
+            devices = self._devices(host, ansibledict)
+            device_tuples.append((host, [d for d, _ in devices]))
+            partition_tuples += devices
+            interface_tuples.append(
+                (host, self._interfaces(host, ansibledict))
+            )
+
+        # Update subgraph entities in bulk
+        for klass, tuples in [
+            (NameServerEntity, nameserver_tuples),
+            (MountEntity, mount_tuples),
+            (DeviceEntity, device_tuples),
+            (PartitionEntity, partition_tuples),
+            (InterfaceEntity, interface_tuples)
+        ]:
+            entities = []
+            for _, children in tuples:
+                entities += children
+            self.run.entities.update_many(
+                klass,
+                session,
+                entities,
+                self.time_in_ms
+            )
+
+        # Update edges from hosts and devices to their children.
+        for host, nameservers in nameserver_tuples:
+            host.nameservers.update(session, nameservers, self.time_in_ms)
+        for host, mounts in mount_tuples:
+            host.mounts.update(session, mounts, self.time_in_ms)
+        for device, partitions in partition_tuples:
+            device.partitions.update(session, partitions, self.time_in_ms)
+        for host, devices in device_tuples:
+            host.devices.update(session, devices, self.time_in_ms)
+        for host, interfaces in interface_tuples:
+            host.interfaces.update(session, interfaces, self.time_in_ms)
 
         # Update edges from environment to each host.
         env.hosts.update(session, hosts, self.time_in_ms)
+        for filename in filenames:
+            self.run.mark_applied(filename)
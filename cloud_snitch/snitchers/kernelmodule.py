@@ -1,6 +1,7 @@
 import logging
 
 from .base import BaseSnitcher
+from .host import HostSnitcher
 from cloud_snitch.models import KernelModuleEntity
 from cloud_snitch.models import KernelModuleParameterEntity
 from cloud_snitch.models import EnvironmentEntity
@@ -12,36 +13,80 @@ logger = logging.getLogger(__name__)
 class KernelModuleSnitcher(BaseSnitcher):
     """Models path host -> kernelmodule -> kernel_module_parameter."""
 
+    requires = (HostSnitcher,)
+
     file_pattern = '^kernelmodules_(?P<hostname>.*).json$'
 
-    def _update_kernel_module(self, session, host, km_name, km_dict):
-        """Updates kernelmodule -> parameter subgraph.
+    def _kernel_module(self, host, km_name, km_dict):
+        """Create a kernel module and its parameters.
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param host: Host object containing kernel modules
         :type host: HostEntity
         :param km_name: kernel module name
         :type km_name: str
         :param km_dict: kernel module properties
         :type km_dict: dict
-        :returns: KernelModule object or None for no action
-        :rtype: KernelModuleEntity|None
+        :returns: KernelModule object and list of parameter objects
+        :rtype: tuple
         """
         km = KernelModuleEntity(host=host.identity, name=km_name)
-        km.update(session, self.time_in_ms)
 
         params = []
         for param_name, param_value in km_dict.get('parameters', {}).items():
-            param = KernelModuleParameterEntity(
+            params.append(KernelModuleParameterEntity(
                 name=param_name,
                 value=param_value
+            ))
+        return km, params
+
+    def _update_host(self, session, hostname, filename):
+        """Update kernel modules for a host.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param hostname: Name of the host
+        :type hostname: str
+        :param filename: Name of file
+        :type filename: str
+        """
+        env = EnvironmentEntity(uuid=self.run.environment_uuid)
+        kms = []
+        km_tuples = []
+        params = []
+
+        # Find host in graph, return early if host not found.
+        host = HostEntity(hostname=hostname, environment=env.identity)
+        host = self.run.entities.find(HostEntity, session, host.identity)
+        if host is None:
+            logger.warning(
+                'Unable to locate host entity {}'.format(hostname)
             )
-            param.update(session, self.time_in_ms)
-            params.append(param)
+            return
 
-        km.parameters.update(session, params, self.time_in_ms)
-        return km
+        # Stream kernel module maps from file
+        for km_name, km_dict in self.run.iter_kvitems(filename):
+            km_tuple = self._kernel_module(host, km_name, km_dict)
+            kms.append(km_tuple[0])
+            km_tuples.append(km_tuple)
+            params += km_tuple[1]
+
+        # Update entities in bulk before updating edges between them.
+        self.run.entities.update_many(
+            KernelModuleEntity,
+            session,
+            kms,
+            self.time_in_ms
+        )
+        self.run.entities.update_many(
+            KernelModuleParameterEntity,
+            session,
+            params,
+            self.time_in_ms
+        )
+        for km, km_params in km_tuples:
+            km.parameters.update(session, km_params, self.time_in_ms)
+        host.kernelmodules.update(session, kms, self.time_in_ms)
+        self.run.mark_applied(filename)
 
     def _snitch(self, session):
         """Update the kernel modules subgraph.
@@ -49,31 +94,4 @@ class KernelModuleSnitcher(BaseSnitcher):
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
         """
-        env = EnvironmentEntity(uuid=self.run.environment_uuid)
-
-        for hostname, filename in self._find_host_tuples(self.file_pattern):
-            kms = []
-
-            # Find host in graph, continue if host not found.
-            host = HostEntity(hostname=hostname, environment=env.identity)
-            host = HostEntity.find(session, host.identity)
-            if host is None:
-                logger.warning(
-                    'Unable to locate host entity {}'.format(hostname)
-                )
-                continue
-
-            # Read data from file
-            km_data = self.run.get_object(filename).get('data', {})
-
-            # Iterate over package maps
-            for km_name, km_dict in km_data.items():
-                km = self._update_kernel_module(
-                    session,
-                    host,
-                    km_name,
-                    km_dict
-                )
-                if km is not None:
-                    kms.append(km)
-            host.kernelmodules.update(session, kms, self.time_in_ms)
+        self._snitch_hosts(session, self.file_pattern)
@@ -1,6 +1,7 @@
 import logging
 
 from .base import BaseSnitcher
+from .host import HostSnitcher
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.models import HostEntity
 from cloud_snitch.models import PythonPackageEntity
@@ -12,79 +13,85 @@ logger = logging.getLogger(__name__)
 class PipSnitcher(BaseSnitcher):
     """Models path host -> virtualenv -> python package path in graph."""
 
-    file_pattern = '^pip_list_(?P<hostname>.*).json$'
-
-    def _update_python_package(self, session, virtualenv, pkg):
-        """Updates python package in graph.
+    requires = (HostSnitcher,)
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
-        :param virtualenv: Parent Virtualenv object
-        :type virtualenv: VirtualenvEntity
-        :param pkg: Python package dict. should contain name and version.
-        :type pkg: dict
-        :returns: PythonPackage object
-        :rtype: PythonPackageEntity
-        """
-        pythonpkg = PythonPackageEntity(
-            name=pkg.get('name'),
-            version=pkg.get('version')
-        )
-        pythonpkg.update(session, self.time_in_ms)
-        return pythonpkg
+    file_pattern = '^pip_list_(?P<hostname>.*).json$'
 
-    def _update_virtualenv(self, session, host, path, pkglist):
-        """Update virtualenv and  update child pythonpackages
+    def _virtualenv(self, host, path, pkglist):
+        """Create a virtualenv and its child python packages.
 
-        :param session: neo4j driver session
-        :type session: neo4j.v1.session.BoltSession
         :param host: Parent host object
         :type host: HostEntity
         :param path: Path of virtualenv
         :type path: str
         :param pkglist: List of python package dicts
         :type pkglist: list
-        :returns: Virtualenv object
-        :rtype: VirtualenvEntity
+        :returns: Virtualenv object and list of PythonPackage objects
+        :rtype: tuple
         """
         virtualenv = VirtualenvEntity(host=host.identity, path=path)
         pkgs = []
-        virtualenv.update(session, self.time_in_ms)
         for pkgdict in pkglist:
-            pkgs.append(self._update_python_package(
-                session,
-                virtualenv,
-                pkgdict)
-            )
-        virtualenv.pythonpackages.update(session, pkgs, self.time_in_ms)
-        return virtualenv
+            pkgs.append(PythonPackageEntity(
+                name=pkgdict.get('name'),
+                version=pkgdict.get('version')
+            ))
+        return virtualenv, pkgs
 
-    def _snitch(self, session):
-        """Orchestrates the creation of the environment.
+    def _update_host(self, session, hostname, filename):
+        """Update virtualenvs and python packages for a host.
 
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
+        :param hostname: Name of the host
+        :type hostname: str
+        :param filename: Name of file
+        :type filename: str
         """
         env = EnvironmentEntity(uuid=self.run.environment_uuid)
+        host = HostEntity(hostname=hostname, environment=env.identity)
+        host = self.run.entities.find(HostEntity, session, host.identity)
+        if host is None:
+            logger.warning(
+                'Unable to locate host entity {}'.format(hostname)
+            )
+            return
+
+        virtualenvs = []
+        venv_tuples = []
+        pkgs = []
+        for path, pkglist in self.run.iter_kvitems(filename):
+            venv_tuple = self._virtualenv(host, path, pkglist)
+            virtualenvs.append(venv_tuple[0])
+            venv_tuples.append(venv_tuple)
+            pkgs += venv_tuple[1]
 
-        for hostname, filename in self._find_host_tuples(self.file_pattern):
-            virtualenvs = []
-            host = HostEntity(hostname=hostname, environment=env.identity)
-            host = HostEntity.find(session, host.identity)
-            if host is None:
-                logger.warning(
-                    'Unable to locate host entity {}'.format(hostname)
-                )
-                continue
+        # Update entities in bulk before updating edges between them.
+        self.run.entities.update_many(
+            VirtualenvEntity,
+            session,
+            virtualenvs,
+            self.time_in_ms
+        )
+        self.run.entities.update_many(
+            PythonPackageEntity,
+            session,
+            pkgs,
+            self.time_in_ms
+        )
+        for virtualenv, venv_pkgs in venv_tuples:
+            virtualenv.pythonpackages.update(
+                session,
+                venv_pkgs,
+                self.time_in_ms
+            )
+        host.virtualenvs.update(session, virtualenvs, self.time_in_ms)
+        self.run.mark_applied(filename)
 
-            pipdict = self.run.get_object(filename).get('data', {})
+    def _snitch(self, session):
+        """Orchestrates the creation of the environment.
 
-            for path, pkglist in pipdict.items():
-                virtualenv = self._update_virtualenv(
-                    session,
-                    host,
-                    path,
-                    pkglist
-                )
-                virtualenvs.append(virtualenv)
-            host.virtualenvs.update(session, virtualenvs, self.time_in_ms)
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        """
+        self._snitch_hosts(session, self.file_pattern)
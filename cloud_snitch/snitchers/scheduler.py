@@ -0,0 +1,183 @@
+import logging
+import time
+
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from cloud_snitch.exc import SnitcherDependencyError
+
+logger = logging.getLogger(__name__)
+
+
+class SnitcherScheduler(object):
+    """Runs snitchers concurrently while honoring their prerequisites.
+
+    Each snitcher declares the snitcher classes it requires. A snitcher
+    is submitted to the thread pool as soon as all of its requirements
+    have finished. Every snitcher opens its own driver session.
+    """
+
+    def __init__(self, snitchers, workers=1):
+        """Init the scheduler.
+
+        :param snitchers: Snitcher instances to run
+        :type snitchers: list
+        :param workers: Maximum number of snitchers to run at once
+        :type workers: int
+        """
+        self.snitchers = list(snitchers)
+        self.workers = max(1, int(workers or 1))
+        self.durations = {}
+        self.requirements = self._requirements()
+
+    def _requirements(self):
+        """Map each snitcher to the snitchers it requires.
+
+        Raises SnitcherDependencyError on missing requirements or cycles.
+
+        :returns: Mapping of snitcher -> list of required snitchers
+        :rtype: dict
+        """
+        by_class = {s.__class__: s for s in self.snitchers}
+        requirements = {}
+        for snitcher in self.snitchers:
+            reqs = []
+            for klass in snitcher.requires:
+                if klass not in by_class:
+                    raise SnitcherDependencyError(
+                        snitcher.__class__.__name__,
+                        'requires {} which is not scheduled'.format(
+                            klass.__name__
+                        )
+                    )
+                reqs.append(by_class[klass])
+            requirements[snitcher] = reqs
+
+        # Detect cycles by repeatedly removing snitchers without requirements
+        remaining = {s: set(reqs) for s, reqs in requirements.items()}
+        while remaining:
+            ready = [s for s, reqs in remaining.items() if not reqs]
+            if not ready:
+                names = sorted(s.__class__.__name__ for s in remaining)
+                raise SnitcherDependencyError(
+                    names[0],
+                    'circular requirements among {}'.format(', '.join(names))
+                )
+            for s in ready:
+                del remaining[s]
+            for reqs in remaining.values():
+                reqs.difference_update(ready)
+        return requirements
+
+    def _timed(self, snitcher):
+        """Run a snitcher and record its wall time.
+
+        :param snitcher: Snitcher to run
+        :type snitcher: cloud_snitch.snitchers.base.BaseSnitcher
+        """
+        start = time.time()
+        try:
+            snitcher.snitch()
+        finally:
+            self.durations[snitcher] = time.time() - start
+
+    def critical_path(self):
+        """Compute the longest chain of snitchers by measured wall time.
+
+        :returns: Snitchers on the critical path and its total duration
+        :rtype: tuple
+        """
+        finish = {}
+        previous = {}
+
+        def visit(snitcher):
+            if snitcher in finish:
+                return finish[snitcher]
+            start = 0.0
+            previous[snitcher] = None
+            for req in self.requirements[snitcher]:
+                req_finish = visit(req)
+                if req_finish > start:
+                    start = req_finish
+                    previous[snitcher] = req
+            finish[snitcher] = start + self.durations.get(snitcher, 0.0)
+            return finish[snitcher]
+
+        for snitcher in self.snitchers:
+            visit(snitcher)
+        if not finish:
+            return [], 0.0
+
+        last = max(self.snitchers, key=lambda s: finish[s])
+        total = finish[last]
+        path = []
+        while last is not None:
+            path.append(last)
+            last = previous[last]
+        path.reverse()
+        return path, total
+
+    def _log_timings(self, wall):
+        """Log per snitcher times and the critical path.
+
+        :param wall: Total wall time of the schedule
+        :type wall: float
+        """
+        for snitcher in self.snitchers:
+            if snitcher in self.durations:
+                logger.info("Snitcher {} took {:.3f}s.".format(
+                    snitcher.__class__.__name__,
+                    self.durations[snitcher]
+                ))
+        path, total = self.critical_path()
+        logger.info("Critical path {} took {:.3f}s of {:.3f}s wall.".format(
+            ' -> '.join(s.__class__.__name__ for s in path),
+            total,
+            wall
+        ))
+
+    def run(self):
+        """Run all snitchers.
+
+        Snitchers that are already running are allowed to finish when
+        another snitcher fails. No new snitchers are started after a
+        failure and the first error is raised.
+        """
+        start = time.time()
+        done = set()
+        pending = list(self.snitchers)
+        running = {}
+        error = None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                if error is None:
+                    ready = [
+                        s for s in pending
+                        if all(r in done for r in self.requirements[s])
+                    ]
+                    for snitcher in ready:
+                        pending.remove(snitcher)
+                        future = executor.submit(self._timed, snitcher)
+                        running[future] = snitcher
+                elif not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    snitcher = running.pop(future)
+                    exc = future.exception()
+                    if exc is not None:
+                        logger.error("Snitcher {} failed: {}".format(
+                            snitcher.__class__.__name__,
+                            exc
+                        ))
+                        if error is None:
+                            error = exc
+                    else:
+                        done.add(snitcher)
+
+        self._log_timings(time.time() - start)
+        if error is not None:
+            raise error
@@ -2,6 +2,7 @@ import json
 import logging
 
 from .base import BaseSnitcher
+from .environment import EnvironmentSnitcher
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.models import UservarEntity
 
@@ -11,15 +12,21 @@ logger = logging.getLogger(__name__)
 class UservarsSnitcher(BaseSnitcher):
     """Models the following path env -> uservar"""
 
+    requires = (EnvironmentSnitcher,)
+
     def _snitch(self, session):
         """Orchestrates the creation of the environment.
 
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
         """
-        # Load saved git data
+        if self.run.unchanged('uservars.json'):
+            logger.info('Skipping unchanged uservars data.')
+            return
+
+        # Open saved uservars data for streaming
         try:
-            uservars_dict = self.run.get_object('uservars.json')
+            uservars_items = self.run.iter_kvitems('uservars.json')
         except IOError:
             logger.info('No data for uservars could be found.')
             return
@@ -27,7 +34,7 @@ class UservarsSnitcher(BaseSnitcher):
         # Try to find the parent environment.
         env = EnvironmentEntity(uuid=self.run.environment_uuid)
         identity = env.identity
-        env = EnvironmentEntity.find(session, identity)
+        env = self.run.entities.find(EnvironmentEntity, session, identity)
         if env is None:
             logger.warning(
                 'Unable to locate environment {}.'.format(identity)
@@ -36,7 +43,7 @@ class UservarsSnitcher(BaseSnitcher):
 
         # Iterate over each uservariable
         uservars = []
-        for key, val in uservars_dict.get('data', {}).items():
+        for key, val in uservars_items:
 
             if isinstance(val, dict) or isinstance(val, list):
                 val = json.dumps(val, sort_keys=True)
@@ -46,8 +53,16 @@ class UservarsSnitcher(BaseSnitcher):
                 name=key,
                 value=val
             )
-            uservar.update(session, self.time_in_ms)
             uservars.append(uservar)
 
+        # Update uservars in bulk and then edges
+        self.run.entities.update_many(
+            UservarEntity,
+            session,
+            uservars,
+            self.time_in_ms
+        )
+
         # Update edges
         env.uservars.update(session, uservars, self.time_in_ms)
+        self.run.mark_applied('uservars.json')
@@ -3,9 +3,14 @@
 Expect this to change into something configured by yaml.
 Snitchers will also probably become python entry points.
 """
+import glob
 import logging
+import os
 import time
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 from cloud_snitch.snitchers.apt import AptSnitcher
 from cloud_snitch.snitchers.configfile import ConfigfileSnitcher
 from cloud_snitch.snitchers.environment import EnvironmentSnitcher
@@ -16,35 +21,59 @@ from cloud_snitch.snitchers.pip import PipSnitcher
 from cloud_snitch.snitchers.uservars import UservarsSnitcher
 from cloud_snitch.snitchers.configuredinterface import \
     ConfiguredInterfaceSnitcher
+from cloud_snitch.snitchers.scheduler import SnitcherScheduler
 
+from cloud_snitch import container
 from cloud_snitch import runs
+from cloud_snitch import settings
 from cloud_snitch import utils
 from cloud_snitch.cli_common import base_parser
 from cloud_snitch.driver import DriverContext
+from cloud_snitch.exc import RunAlreadySyncedError
 from cloud_snitch.exc import RunContainsOldDataError
+from cloud_snitch.models import EnvironmentDigestEntity
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.lock import lock_environment
 
 logger = logging.getLogger(__name__)
 
+ARCHIVE_EXTENSIONS = ('.tar.gz', container.EXTENSION)
+
 
 parser = base_parser(
     description="Ingest collected snitch data to neo4j."
 )
 parser.add_argument(
-    'path',
-    help='Path or archived collection run.'
+    'paths',
+    nargs='+',
+    metavar='path',
+    help=(
+        'Archived collection runs. May be files, directories containing '
+        '.tar.gz archives or run containers, or globs.'
+    )
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    help='Number of environments to sync at once.'
 )
 parser.add_argument(
     '--key',
     help='Base64 encoded 256 bit AES key. For testing/debug only.'
 )
+parser.add_argument(
+    '--full',
+    action='store_true',
+    help='Process every document even if unchanged since the last sync.'
+)
 
 
 def check_run_time(driver, run):
     """Prevent a run from updating an environment.
 
     Protects an environment with newer data from a run with older data.
+    Uses last_sync from the current environment state and only walks the
+    environment subgraph when it is missing.
 
     :param driver: Neo4J database driver instance
     :type driver: neo4j.v1.GraphDatabase.driver
@@ -57,7 +86,11 @@ def check_run_time(driver, run):
 
         # If the environment exists, check its last update
         if e is not None:
-            last_update = utils.utcdatetime(e.last_update(session) or 0)
+            last_update = e.last_sync_time(session)
+            if last_update is None:
+                logger.info("No last sync time, walking environment.")
+                last_update = e.last_update(session)
+            last_update = utils.utcdatetime(last_update or 0)
             logger.debug(
                 "Comparing {} to {}".format(run.completed, last_update)
             )
@@ -68,6 +101,10 @@ def check_run_time(driver, run):
 def consume(driver, run):
     """Consumes data in a run.
 
+    Snitchers run concurrently as their prerequisites finish.
+
+    :param driver: Neo4J database driver instance
+    :type driver: neo4j.v1.GraphDatabase.driver
     :param run: Run to consume
     :type run: runs.Run
     """
@@ -82,43 +119,337 @@ def consume(driver, run):
         UservarsSnitcher(driver, run),
         ConfiguredInterfaceSnitcher(driver, run)
     ]
-    for snitcher in snitchers:
-        snitcher.snitch()
+    scheduler = SnitcherScheduler(
+        snitchers,
+        workers=settings.SNITCHER_WORKERS
+    )
+    scheduler.run()
+
+
+def load_digests(driver, run, full=False):
+    """Load the digest ledger of the last successful sync into the run.
+
+    The ledger is cleared until this sync succeeds so that a failed sync
+    can never cause documents to be skipped later.
+
+    :param driver: Neo4J database driver instance
+    :type driver: neo4j.v1.GraphDatabase.driver
+    :param run: Run to sync
+    :type run: runs.Run
+    :param full: Ignore the ledger and process every document
+    :type full: bool
+    """
+    with driver.session() as session:
+        if not full:
+            run.previous_digests = EnvironmentDigestEntity.load(
+                session,
+                run.environment_uuid
+            )
+        EnvironmentDigestEntity.clear(session, run.environment_uuid)
+    logger.info("Loaded {} document digests.".format(
+        len(run.previous_digests)
+    ))
 
 
-def sync_run(driver, run):
+def save_digests(driver, run):
+    """Save digests of the documents applied by a successfully synced run.
+
+    :param driver: Neo4J database driver instance
+    :type driver: neo4j.v1.GraphDatabase.driver
+    :param run: Synced run
+    :type run: runs.Run
+    """
+    with driver.session() as session:
+        EnvironmentDigestEntity.save(
+            session,
+            run.environment_uuid,
+            run.digests()
+        )
+
+
+def save_last_sync(driver, run):
+    """Record the completion time of a successfully synced run.
+
+    :param driver: Neo4J database driver instance
+    :type driver: neo4j.v1.GraphDatabase.driver
+    :param run: Synced run
+    :type run: runs.Run
+    """
+    with driver.session() as session:
+        env = EnvironmentEntity(uuid=run.environment_uuid)
+        env.set_last_sync_time(session, utils.milliseconds(run.completed))
+
+
+def sync_run(driver, run, full=False):
     """Syncs an individuals run.
 
     :param run: Run to sync
     :type run: runs.Run
+    :param full: Process every document even if unchanged
+    :type full: bool
     """
     check_run_time(driver, run)
     run.start()
+    load_digests(driver, run, full=full)
     logger.info("Starting collection on {}".format(run.path))
     consume(driver, run)
+    save_last_sync(driver, run)
+    save_digests(driver, run)
+    logger.info("Identity map hits: {} misses: {}".format(
+        run.entities.hits,
+        run.entities.misses
+    ))
     logger.info("Run completion time: {}".format(
         utils.milliseconds(run.completed)
     ))
     run.finish()
 
 
-def sync_single(path, key=None):
+def sync_single(path, key=None, full=False):
     """Used to sync a single discrete set of run data.
 
     :param path: Path to run data
     :type path: str
     :param key: Encryption/Decryption base 64 encoded key
     :type key: str
+    :param full: Process every document even if unchanged
+    :type full: bool
     """
     with DriverContext() as driver:
         run = runs.Run(path, key=key)
-        env = EnvironmentEntity(
-            uuid=run.environment_uuid,
-            name=run.environment_name,
-            account_number=run.environment_account_number
-        )
+        try:
+            env = EnvironmentEntity(
+                uuid=run.environment_uuid,
+                name=run.environment_name,
+                account_number=run.environment_account_number
+            )
+            with lock_environment(driver, env):
+                sync_run(driver, run, full=full)
+        finally:
+            run.close()
+
+
+def find_archives(paths):
+    """Expand files, directories and globs into a list of archives.
+
+    :param paths: List of files, directories or globs
+    :type paths: list
+    :returns: Unique archive paths in the order found
+    :rtype: list
+    """
+    archives = OrderedDict()
+    for path in paths:
+        matches = glob.glob(path) or [path]
+        for match in sorted(matches):
+            if os.path.isdir(match):
+                for root, _, filenames in sorted(os.walk(match)):
+                    for filename in sorted(filenames):
+                        if filename.endswith(ARCHIVE_EXTENSIONS):
+                            archives[os.path.join(root, filename)] = True
+            else:
+                archives[match] = True
+    return list(archives.keys())
+
+
+def plan(archives, key=None):
+    """Group archives by environment in completed order.
+
+    Only run_data.json is read from each archive.
+
+    :param archives: List of archive paths
+    :type archives: list
+    :param key: Encryption/Decryption base 64 encoded key
+    :type key: str
+    :returns: Mapping of uuid -> (environment dict, paths), list of
+        duplicate paths and list of (path, error message) tuples for
+        unreadable archives
+    :rtype: tuple
+    """
+    found = {}
+    environments = {}
+    duplicates = []
+    failed = []
+    for path in archives:
+        try:
+            run_data = runs.peek_run_data(path, key=key)
+            environment = run_data['environment']
+            uuid = environment['uuid']
+            completed = utils.strtodatetime(run_data['completed'])
+        except Exception as e:
+            failed.append((path, str(e)))
+            continue
+        entries = found.setdefault(uuid, {})
+        if completed in entries:
+            duplicates.append(path)
+            continue
+        entries[completed] = path
+        environments[uuid] = environment
+
+    groups = OrderedDict()
+    for uuid in sorted(found):
+        entries = found[uuid]
+        paths = [entries[c] for c in sorted(entries)]
+        groups[uuid] = (environments[uuid], paths)
+    return groups, duplicates, failed
+
+
+def sync_environment(environment, paths, key=None, full=False):
+    """Sync runs of a single environment in order under one lock.
+
+    :param environment: Environment dict from run data
+    :type environment: dict
+    :param paths: Archive paths of one environment in completed order
+    :type paths: list
+    :param key: Encryption/Decryption base 64 encoded key
+    :type key: str
+    :param full: Process every document even if unchanged
+    :type full: bool
+    :returns: Result lists keyed by synced, old, duplicate and failed
+    :rtype: dict
+    """
+    result = {'synced': [], 'old': [], 'duplicate': [], 'failed': []}
+    env = EnvironmentEntity(
+        uuid=environment.get('uuid'),
+        name=environment.get('name'),
+        account_number=environment.get('account_number')
+    )
+    with DriverContext() as driver:
         with lock_environment(driver, env):
-            sync_run(driver, run)
+            for path in paths:
+                start = time.time()
+                try:
+                    run = runs.Run(path, key=key)
+                except Exception as e:
+                    result['failed'].append((path, str(e)))
+                    continue
+                try:
+                    sync_run(driver, run, full=full)
+                    result['synced'].append((path, time.time() - start))
+                except RunContainsOldDataError:
+                    result['old'].append(path)
+                except RunAlreadySyncedError:
+                    result['duplicate'].append(path)
+                except Exception as e:
+                    logger.exception('Could not sync {}.'.format(path))
+                    result['failed'].append((path, str(e)))
+                finally:
+                    run.close()
+    return result
+
+
+def _sync_environment(environment, paths, key=None, full=False):
+    """Sync an environment, counting every run as failed on error.
+
+    Errors outside of a single run, such as a locked environment or an
+    unreachable database, would otherwise lose the whole group.
+
+    :param environment: Environment dict from run data
+    :type environment: dict
+    :param paths: Archive paths of one environment in completed order
+    :type paths: list
+    :param key: Encryption/Decryption base 64 encoded key
+    :type key: str
+    :param full: Process every document even if unchanged
+    :type full: bool
+    :returns: Result lists keyed by synced, old, duplicate and failed
+    :rtype: dict
+    """
+    try:
+        return sync_environment(environment, paths, key=key, full=full)
+    except Exception as e:
+        logger.exception('Could not sync environment {}.'.format(
+            environment.get('uuid')
+        ))
+        return {
+            'synced': [],
+            'old': [],
+            'duplicate': [],
+            'failed': [(path, str(e)) for path in paths]
+        }
+
+
+def sync_many(paths, key=None, full=False, workers=None):
+    """Sync many archives, one process per environment at a time.
+
+    :param paths: List of files, directories or globs
+    :type paths: list
+    :param key: Encryption/Decryption base 64 encoded key
+    :type key: str
+    :param full: Process every document even if unchanged
+    :type full: bool
+    :param workers: Number of environments to sync at once
+    :type workers: int|None
+    :returns: Summary of the sync
+    :rtype: dict
+    """
+    start = time.time()
+    groups, duplicates, failed = plan(find_archives(paths), key=key)
+    summary = {
+        'synced': [],
+        'old': [],
+        'duplicate': list(duplicates),
+        'failed': list(failed)
+    }
+
+    workers = workers or settings.SYNC_WORKERS
+    workers = max(1, min(workers, len(groups)))
+    if workers == 1:
+        results = [
+            _sync_environment(environment, group, key=key, full=full)
+            for environment, group in groups.values()
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _sync_environment,
+                    environment,
+                    group,
+                    key=key,
+                    full=full
+                )
+                for environment, group in groups.values()
+            ]
+            results = [f.result() for f in futures]
+
+    for result in results:
+        for k, v in result.items():
+            summary[k] += v
+    summary['elapsed'] = time.time() - start
+    summary['environments'] = len(groups)
+    log_summary(summary)
+    return summary
+
+
+def log_summary(summary):
+    """Log a summary of a multi archive sync.
+
+    :param summary: Summary from sync_many
+    :type summary: dict
+    """
+    elapsed = summary['elapsed'] or 1e-9
+    synced_bytes = sum(os.path.getsize(p) for p, _ in summary['synced'])
+    logger.info(
+        "Synced {} runs of {} environments in {:.3f}s "
+        "({:.3f} runs/s, {:.3f} MB/s).".format(
+            len(summary['synced']),
+            summary['environments'],
+            summary['elapsed'],
+            len(summary['synced']) / elapsed,
+            synced_bytes / elapsed / 1024 / 1024
+        )
+    )
+    logger.info("Skipped {} old runs.".format(len(summary['old'])))
+    logger.info("Skipped {} duplicate runs.".format(
+        len(summary['duplicate'])
+    ))
+    logger.info("Failed {} runs.".format(len(summary['failed'])))
+    for path in summary['old']:
+        logger.info("Old: {}".format(path))
+    for path in summary['duplicate']:
+        logger.info("Duplicate: {}".format(path))
+    for path, msg in summary['failed']:
+        logger.warning("Failed: {} {}".format(path, msg))
 
 
 def main():
@@ -126,7 +457,12 @@ def main():
     args = parser.parse_args()
 
     try:
-        sync_single(args.path, key=args.key)
+        sync_many(
+            args.paths,
+            key=args.key,
+            full=args.full,
+            workers=args.workers
+        )
     except Exception:
         logger.exception('Could not sync.')
     finally:
@@ -8,6 +8,7 @@ from cloud_snitch.cli_common import base_parser
 from cloud_snitch.cli_common import confirm_env_action
 from cloud_snitch.cli_common import find_environment
 from cloud_snitch.lock import lock_environment
+from cloud_snitch.models import EnvironmentDigestEntity
 from neo4j.v1 import GraphDatabase
 
 logger = logging.getLogger(__name__)
@@ -123,6 +124,9 @@ def terminate(uuid, new_time, limit, skip=False):
             # And bulk update until 0 matches.
             changed = set_to_until_zero(session, env, new_time, limit=limit)
 
+            # A later sync must not skip documents of a terminated env.
+            EnvironmentDigestEntity.clear(session, env.uuid)
+
             logger.info(
                 "Terminated {} relationships at {}.".format(changed, new_time)
             )
@@ -61,3 +61,32 @@ class DefinitionTestCase(unittest.TestCase):
         for name, tup in self.children:
             self.assertEqual(self.entity.children[name], tup)
         self.assertEqual(len(self.entity.children), len(self.children))
+
+
+class FakeTransaction:
+    """Records queries and returns canned results in order."""
+
+    def __init__(self, results=None):
+        self.results = list(results or [])
+        self.queries = []
+
+    def run(self, cypher, **params):
+        self.queries.append((cypher, params))
+        if self.results:
+            return self.results.pop(0)
+        return []
+
+
+class FakeSession:
+
+    def __init__(self, tx):
+        self.tx = tx
+
+    def begin_transaction(self):
+        return self
+
+    def __enter__(self):
+        return self.tx
+
+    def __exit__(self, *args):
+        pass
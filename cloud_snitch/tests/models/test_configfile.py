@@ -28,3 +28,8 @@ class TestConfigfileEntity(DefinitionTestCase):
     def test_definition(self):
         """Test definition."""
         self.definition_test()
+        self.assertEqual(self.entity.blob_properties, ['contents'])
+        self.assertEqual(
+            self.entity.stored_state_properties(),
+            ['md5', 'contents_blob', 'is_binary']
+        )
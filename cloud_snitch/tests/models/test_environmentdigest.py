@@ -0,0 +1,42 @@
+import mock
+
+from .base import DefinitionTestCase
+from cloud_snitch.models import EnvironmentDigestEntity
+
+
+class TestEnvironmentDigestEntity(DefinitionTestCase):
+    """Test the environment digest entity definition."""
+    entity = EnvironmentDigestEntity
+    label = 'EnvironmentDigest'
+    state_label = 'EnvironmentDigestState'
+    identity_property = 'uuid'
+    static_properties = [
+        'digests'
+    ]
+
+    def test_definition(self):
+        """Test definition."""
+        self.definition_test()
+
+    @mock.patch.object(EnvironmentDigestEntity, 'find', return_value=None)
+    def test_load_missing(self, m_find):
+        """Test that a missing ledger loads as no digests."""
+        self.assertEqual(EnvironmentDigestEntity.load(None, 'uuid'), {})
+
+    @mock.patch.object(EnvironmentDigestEntity, 'find')
+    def test_load(self, m_find):
+        """Test that digests are decoded from json."""
+        m_find.return_value = EnvironmentDigestEntity(
+            uuid='uuid',
+            digests={'a.json': 'abc'}
+        )
+        self.assertEqual(
+            EnvironmentDigestEntity.load(None, 'uuid'),
+            {'a.json': 'abc'}
+        )
+
+        m_find.return_value = EnvironmentDigestEntity(
+            uuid='uuid',
+            digests='notjson'
+        )
+        self.assertEqual(EnvironmentDigestEntity.load(None, 'uuid'), {})
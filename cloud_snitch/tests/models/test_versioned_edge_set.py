@@ -0,0 +1,59 @@
+import unittest
+
+from cloud_snitch import utils
+from cloud_snitch.models import AptPackageEntity
+from cloud_snitch.models import HostEntity
+from cloud_snitch.models.base import VersionedEdgeSet
+
+from .base import FakeSession
+from .base import FakeTransaction
+
+
+class TestVersionedEdgeSetUpdate(unittest.TestCase):
+    """Test set based updates of versioned edges."""
+
+    def setUp(self):
+        self.host = HostEntity(hostname='somehost', environment='e')
+        self.edges = VersionedEdgeSet(
+            'HAS_APT_PACKAGE',
+            self.host,
+            AptPackageEntity
+        )
+
+    def _pkgs(self, *names):
+        return [AptPackageEntity(name=n, version='1') for n in names]
+
+    def test_no_changes(self):
+        """Test that only the match statement runs with no changes."""
+        current = [{'d.name_version': 'a-1'}, {'d.name_version': 'b-1'}]
+        tx = FakeTransaction(results=[current])
+        self.edges.update(FakeSession(tx), self._pkgs('a', 'b'), 10)
+        self.assertEqual(len(tx.queries), 1)
+
+    def test_batched_close_and_create(self):
+        """Test that stale and new edges are handled in one statement each."""
+        current = [
+            {'d.name_version': 'a-1'},
+            {'d.name_version': 'b-1'},
+            {'d.name_version': 'c-1'}
+        ]
+        tx = FakeTransaction(results=[current])
+        self.edges.update(
+            FakeSession(tx),
+            self._pkgs('a', 'd', 'e', 'f'),
+            10
+        )
+        self.assertEqual(len(tx.queries), 3)
+
+        cypher, params = tx.queries[1]
+        self.assertTrue('UNWIND $old AS destIdentity' in cypher)
+        self.assertEqual(params['old'], ['b-1', 'c-1'])
+        self.assertEqual(params['srcIdentity'], 'somehost-e')
+        self.assertEqual(params['eot'], utils.EOT)
+        self.assertEqual(params['to'], 10)
+
+        cypher, params = tx.queries[2]
+        self.assertTrue('UNWIND $new AS destIdentity' in cypher)
+        self.assertEqual(params['new'], ['d-1', 'e-1', 'f-1'])
+        self.assertEqual(params['frm'], 10)
+        self.assertEqual(params['to'], utils.EOT)
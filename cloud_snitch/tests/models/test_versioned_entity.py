@@ -0,0 +1,188 @@
+import unittest
+
+from cloud_snitch.models import AptPackageEntity
+from cloud_snitch.models import BlobEntity
+from cloud_snitch.models import ConfigfileEntity
+from cloud_snitch.models import UservarEntity
+
+from .base import FakeSession
+from .base import FakeTransaction
+
+
+class TestUpdateMany(unittest.TestCase):
+    """Test bulk updates of versioned entities."""
+
+    def test_empty(self):
+        """Test that no statements are run for an empty list."""
+        tx = FakeTransaction()
+        AptPackageEntity.update_many(FakeSession(tx), [], 10)
+        self.assertEqual(len(tx.queries), 0)
+
+    def test_no_state(self):
+        """Test entities without state properties use one statement."""
+        tx = FakeTransaction()
+        pkgs = [
+            AptPackageEntity(name='a', version='1'),
+            AptPackageEntity(name='b', version='2'),
+            AptPackageEntity(name='a', version='1')
+        ]
+        AptPackageEntity.update_many(FakeSession(tx), pkgs, 10)
+        self.assertEqual(len(tx.queries), 1)
+        cypher, params = tx.queries[0]
+        self.assertTrue('UNWIND $rows AS row' in cypher)
+        self.assertEqual(params['completed'], 10)
+        self.assertEqual(len(params['rows']), 2)
+        self.assertEqual(params['rows'][0], {
+            'identity': 'a-1',
+            'static': {'name': 'a', 'version': '1'}
+        })
+
+    def test_dirty_states(self):
+        """Test that only dirty states are closed and created."""
+        uservars = [
+            UservarEntity(environment='e', name='same', value='1'),
+            UservarEntity(environment='e', name='changed', value='2'),
+            UservarEntity(environment='e', name='new', value='3')
+        ]
+        current = [
+            {'identity': 'same-e', 'currentState': {'value': '1'}},
+            {'identity': 'changed-e', 'currentState': {'value': '1'}}
+        ]
+        tx = FakeTransaction(results=[[], current])
+        UservarEntity.update_many(FakeSession(tx), uservars, 10)
+
+        # Merge, match states, close states, create states
+        self.assertEqual(len(tx.queries), 4)
+
+        _, params = tx.queries[1]
+        self.assertEqual(
+            params['identities'],
+            ['same-e', 'changed-e', 'new-e']
+        )
+
+        _, params = tx.queries[2]
+        self.assertEqual(params['identities'], ['changed-e', 'new-e'])
+        self.assertEqual(params['completed'], 10)
+
+        _, params = tx.queries[3]
+        self.assertEqual(params['rows'], [
+            {'identity': 'changed-e', 'state': {'value': '2'}},
+            {'identity': 'new-e', 'state': {'value': '3'}}
+        ])
+
+    def test_clean_states(self):
+        """Test that no state statements are run when nothing changed."""
+        uservars = [UservarEntity(environment='e', name='same', value='1')]
+        current = [{'identity': 'same-e', 'currentState': {'value': '1'}}]
+        tx = FakeTransaction(results=[[], current])
+        UservarEntity.update_many(FakeSession(tx), uservars, 10)
+        self.assertEqual(len(tx.queries), 2)
+
+
+class TestUpdateStates(unittest.TestCase):
+    """Test bulk reconciliation of entity states."""
+
+    def test_no_state_properties(self):
+        """Test that entities without state properties run nothing."""
+        tx = FakeTransaction()
+        pkgs = [AptPackageEntity(name='a', version='1')]
+        AptPackageEntity.update_states(FakeSession(tx), pkgs, 10)
+        self.assertEqual(len(tx.queries), 0)
+
+    def test_update_states(self):
+        """Test that only dirty states are written without merging."""
+        uservars = [
+            UservarEntity(environment='e', name='same', value='1'),
+            UservarEntity(environment='e', name='changed', value='2')
+        ]
+        current = [
+            {'identity': 'same-e', 'currentState': {'value': '1'}},
+            {'identity': 'changed-e', 'currentState': {'value': '1'}}
+        ]
+        tx = FakeTransaction(results=[current])
+        UservarEntity.update_states(FakeSession(tx), uservars, 10)
+
+        # Match states, close states, create states
+        self.assertEqual(len(tx.queries), 3)
+        self.assertFalse('MERGE' in tx.queries[0][0])
+        _, params = tx.queries[2]
+        self.assertEqual(params['rows'], [
+            {'identity': 'changed-e', 'state': {'value': '2'}}
+        ])
+
+    def test_update_state_delegates(self):
+        """Test that the single entity path uses the bulk primitive."""
+        uservar = UservarEntity(environment='e', name='new', value='3')
+        tx = FakeTransaction(results=[[]])
+        uservar._update_state(tx, 10)
+        self.assertEqual(len(tx.queries), 3)
+        self.assertEqual(tx.queries[0][1]['identities'], ['new-e'])
+        self.assertEqual(tx.queries[2][1]['rows'], [
+            {'identity': 'new-e', 'state': {'value': '3'}}
+        ])
+
+
+class TestBlobStates(unittest.TestCase):
+    """Test that blob properties are stored once by content."""
+
+    def _configfile(self, contents):
+        return ConfigfileEntity(
+            path='/etc/a.conf',
+            host='h',
+            md5='m',
+            contents=contents,
+            is_binary=False
+        )
+
+    def test_stored_state(self):
+        """Test that the state keeps only the blob key."""
+        blobs = {}
+        state = self._configfile('x = 1')._stored_state(blobs=blobs)
+        key = BlobEntity.key('x = 1')
+        self.assertFalse('contents' in state)
+        self.assertEqual(state['contents_blob'], key)
+        self.assertEqual(blobs, {key: 'x = 1'})
+
+    def test_dirty_blob(self):
+        """Test that blobs are merged only for dirty states."""
+        same = self._configfile('x = 1')
+        current = [{
+            'identity': same.identity,
+            'currentState': same._stored_state()
+        }]
+        tx = FakeTransaction(results=[current])
+        ConfigfileEntity.update_states(FakeSession(tx), [same], 10)
+        self.assertEqual(len(tx.queries), 1)
+
+        changed = self._configfile('x = 2')
+        tx = FakeTransaction(results=[current])
+        ConfigfileEntity.update_states(FakeSession(tx), [changed], 10)
+
+        # Match states, close states, merge blobs, create states
+        self.assertEqual(len(tx.queries), 4)
+        cypher, params = tx.queries[2]
+        self.assertTrue('MERGE (b:Blob' in cypher)
+        self.assertEqual(params['blobs'], [
+            {'key': BlobEntity.key('x = 2'), 'value': 'x = 2'}
+        ])
+        _, params = tx.queries[3]
+        self.assertEqual(
+            params['rows'][0]['state']['contents_blob'],
+            BlobEntity.key('x = 2')
+        )
+
+    def test_inline_state(self):
+        """Test that states written before blobs compare by key."""
+        same = self._configfile('x = 1')
+        inline = same._stored_state()
+        inline.pop('contents_blob')
+        inline['contents'] = 'x = 1'
+        current = [{'identity': same.identity, 'currentState': inline}]
+        tx = FakeTransaction(results=[current])
+        ConfigfileEntity.update_states(FakeSession(tx), [same], 10)
+        self.assertEqual(len(tx.queries), 1)
+
+        changed = self._configfile('x = 2')
+        tx = FakeTransaction(results=[current])
+        ConfigfileEntity.update_states(FakeSession(tx), [changed], 10)
+        self.assertEqual(len(tx.queries), 4)
@@ -77,3 +77,13 @@ class TestVersionedProperty(unittest.TestCase):
         self.assertTrue(prop.is_identity)
         self.assertTrue(prop.is_state)
         self.assertFalse(prop.is_valid())
+
+    def test_blob(self):
+        """Test a blob property."""
+        prop = VersionedProperty(is_state=True, is_blob=True)
+        self.assertTrue(prop.is_blob)
+        self.assertTrue(prop.is_valid())
+
+        # Test that only state properties may be blobs
+        prop = VersionedProperty(is_static=True, is_blob=True)
+        self.assertFalse(prop.is_valid())
@@ -0,0 +1,155 @@
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloud_snitch import container
+from cloud_snitch.convert import container_path
+from cloud_snitch.convert import convert
+from cloud_snitch.exc import ArchiveObjectError
+from cloud_snitch.exc import RunInvalidError
+from cloud_snitch.runs import Run
+from cloud_snitch.runs import RunArchive
+from cloud_snitch.runs import peek_run_data
+from cloud_snitch.sync import find_archives
+
+from .test_sync import write_archive
+
+RUN_DATA = {
+    'environment': {'uuid': 'u1', 'name': 'n', 'account_number': 1},
+    'completed': '2018-01-01T00:00:00',
+    'status': 'finished'
+}
+
+
+class TestContainer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.key = base64.b64encode(('a' * 32).encode('utf-8'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _container(self, name, key=None):
+        path = os.path.join(self.tmpdir, name)
+        with container.ContainerWriter(path, key=key) as writer:
+            writer.add_json('run/run_data.json', RUN_DATA)
+            for i in range(5):
+                writer.add_json(
+                    'run/facts_host{}.json'.format(i),
+                    {'data': {'ansible_value': i}}
+                )
+        return path
+
+    def test_is_container(self):
+        """Test detecting containers by magic."""
+        path = self._container('a.csrun')
+        self.assertTrue(container.is_container(path))
+        tar = os.path.join(self.tmpdir, 'a.tar.gz')
+        write_archive(tar, RUN_DATA)
+        self.assertFalse(container.is_container(tar))
+        self.assertFalse(container.is_container('/not/a/file'))
+
+    def test_index(self):
+        """Test the footer index describes every record."""
+        path = self._container('a.csrun')
+        with open(path, 'rb') as f:
+            buf = f.read()
+        index = container.read_index(buf)
+        self.assertEqual(len(index['members']), 6)
+        self.assertFalse(index['encrypted'])
+        member = index['members'][0]
+        self.assertEqual(member['name'], 'run/run_data.json')
+        plain = json.dumps(RUN_DATA).encode('utf-8')
+        self.assertEqual(
+            member['digest'],
+            hashlib.sha256(plain).hexdigest()
+        )
+
+        # Without a trailer the container is incomplete
+        with self.assertRaises(ValueError):
+            container.read_index(buf[:-1])
+
+    def test_duplicate_member(self):
+        """Test that members may only be added once."""
+        path = os.path.join(self.tmpdir, 'a.csrun')
+        with container.ContainerWriter(path) as writer:
+            writer.add('a', b'1')
+            with self.assertRaises(ValueError):
+                writer.add('a', b'2')
+
+    def test_read(self):
+        """Test reading plain and encrypted containers at random."""
+        for key in [None, self.key]:
+            path = self._container('a.csrun', key=key)
+            archive = RunArchive(path, key=key)
+            self.assertEqual(len(archive.filemap), 6)
+            for i in reversed(range(5)):
+                obj = archive.read('facts_host{}.json'.format(i))
+                self.assertEqual(obj['data']['ansible_value'], i)
+            items = list(archive.iter_kvitems('facts_host3.json', 'data'))
+            self.assertEqual(items, [('ansible_value', 3)])
+            archive.close()
+
+    def test_digests_from_index(self):
+        """Test that digests need no reads and match read digests."""
+        path = self._container('a.csrun', key=self.key)
+        archive = RunArchive(path, key=self.key)
+        digest = archive.digest('facts_host0.json')
+        archive.read('facts_host0.json')
+        self.assertEqual(archive.digests['facts_host0.json'], digest)
+        archive.close()
+
+    def test_wrong_key(self):
+        """Test reading an encrypted container with the wrong key."""
+        path = self._container('a.csrun', key=self.key)
+        wrong = base64.b64encode(('b' * 32).encode('utf-8'))
+        archive = RunArchive(path, key=wrong)
+        with self.assertRaises(ArchiveObjectError):
+            archive.read('facts_host0.json')
+        archive.close()
+
+    def test_run(self):
+        """Test runs and peeking read containers."""
+        path = self._container('a.csrun', key=self.key)
+        run = Run(path, key=self.key)
+        self.assertEqual(run.environment_uuid, 'u1')
+        run.close()
+        self.assertEqual(
+            peek_run_data(path, key=self.key)['environment']['uuid'],
+            'u1'
+        )
+
+        # An unfinished container is not a valid run
+        unfinished = os.path.join(self.tmpdir, 'b.csrun')
+        writer = container.ContainerWriter(unfinished)
+        writer.add_json('run/run_data.json', RUN_DATA)
+        writer._file.flush()
+        with self.assertRaises(RunInvalidError):
+            Run(unfinished)
+        with self.assertRaises(RunInvalidError):
+            peek_run_data(unfinished)
+        writer._file.close()
+
+    def test_convert(self):
+        """Test converting a .tar.gz run into a container."""
+        tar = os.path.join(self.tmpdir, 'a.tar.gz')
+        write_archive(tar, RUN_DATA, key=self.key)
+        dest = container_path(tar)
+        self.assertEqual(dest, os.path.join(self.tmpdir, 'a.csrun'))
+        self.assertEqual(convert(tar, dest, key=self.key), 2)
+
+        legacy = RunArchive(tar, key=self.key)
+        converted = RunArchive(dest, key=self.key)
+        self.assertTrue(converted.encrypted)
+        for name in ['run_data.json', 'facts_host.json']:
+            self.assertEqual(converted.read(name), legacy.read(name))
+            self.assertEqual(converted.digest(name), legacy.digest(name))
+        legacy.close()
+        converted.close()
+
+        self.assertEqual(find_archives([self.tmpdir]), [dest, tar])
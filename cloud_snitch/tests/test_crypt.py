@@ -0,0 +1,90 @@
+import io
+import os
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from cloud_snitch import crypt
+from cloud_snitch.runs import CBCDecryptReader
+from cloud_snitch.runs import open_member
+
+from .test_runs import FakeTarFile
+
+
+class TestFramed(unittest.TestCase):
+
+    def setUp(self):
+        self.key = b'a' * 32
+        self.data = os.urandom(10 * 1000 + 7)
+
+    def _read(self, framed, **kwargs):
+        reader = crypt.FramedDecryptReader(
+            io.BytesIO(framed),
+            self.key,
+            **kwargs
+        )
+        return reader.read()
+
+    def _frames(self, framed):
+        """Split a framed member into its header and frames."""
+        header = framed[:crypt._HEADER.size]
+        frames = []
+        position = len(header)
+        while position < len(framed):
+            length, _ = crypt._FRAME.unpack_from(framed, position)
+            end = position + crypt._FRAME.size + crypt.NONCE_SIZE + \
+                crypt.TAG_SIZE + length
+            frames.append(framed[position:end])
+            position = end
+        return header, frames
+
+    def test_round_trip(self):
+        """Test serial and parallel decryption of many chunks."""
+        framed = crypt.encrypt(self.data, self.key, chunk_size=1000)
+        self.assertTrue(crypt.is_framed(framed))
+        self.assertEqual(len(self._frames(framed)[1]), 11)
+        self.assertEqual(self._read(framed), self.data)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(
+                self._read(framed, executor=executor),
+                self.data
+            )
+
+    def test_empty(self):
+        """Test that empty plaintext still has a final frame."""
+        framed = crypt.encrypt(b'', self.key)
+        self.assertEqual(len(self._frames(framed)[1]), 1)
+        self.assertEqual(self._read(framed), b'')
+
+    def test_tampering(self):
+        """Test that modified, reordered or dropped frames fail."""
+        framed = crypt.encrypt(self.data, self.key, chunk_size=1000)
+        header, frames = self._frames(framed)
+
+        flipped = bytearray(framed)
+        flipped[-1] ^= 1
+        reordered = header + frames[1] + frames[0] + b''.join(frames[2:])
+        truncated = header + b''.join(frames[:-1])
+        for bad in [bytes(flipped), reordered, truncated]:
+            with self.assertRaises(ValueError):
+                self._read(bad)
+
+        with self.assertRaises(ValueError):
+            crypt.FramedDecryptReader(
+                io.BytesIO(framed),
+                b'b' * 32
+            ).read()
+
+    def test_detection(self):
+        """Test framed and legacy CBC members are told apart."""
+        framed = crypt.encrypt(b'{"a": 1}', self.key)
+        reader = open_member(io.BytesIO(framed), key=self.key)
+        self.assertTrue(isinstance(reader, crypt.FramedDecryptReader))
+        self.assertEqual(reader.read(), b'{"a": 1}')
+
+        fake = FakeTarFile(key=None)
+        fake.key = self.key
+        legacy = fake.contents({'a': 1})
+        reader = open_member(io.BytesIO(legacy), key=self.key)
+        self.assertTrue(isinstance(reader, CBCDecryptReader))
+        self.assertEqual(reader.read(), b'{"a": 1}')
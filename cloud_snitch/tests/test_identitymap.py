@@ -0,0 +1,86 @@
+import mock
+import unittest
+
+from cloud_snitch.identitymap import IdentityMap
+from cloud_snitch.models import AptPackageEntity
+from cloud_snitch.models import HostEntity
+from cloud_snitch.models import UservarEntity
+
+
+class TestIdentityMap(unittest.TestCase):
+    """Test the run scoped identity map."""
+
+    def setUp(self):
+        self.entities = IdentityMap()
+        self.session = object()
+
+    @mock.patch.object(HostEntity, 'find')
+    def test_find_memoized(self, m_find):
+        """Test that a found entity is only fetched once."""
+        host = HostEntity(hostname='h', environment='e')
+        m_find.return_value = host
+        for _ in range(3):
+            found = self.entities.find(HostEntity, self.session, 'h-e')
+            self.assertTrue(found is host)
+        self.assertEqual(m_find.call_count, 1)
+        self.assertEqual(self.entities.hits, 2)
+        self.assertEqual(self.entities.misses, 1)
+
+    @mock.patch.object(HostEntity, 'find', return_value=None)
+    def test_find_miss_not_cached(self, m_find):
+        """Test that entities not found are looked up again."""
+        for _ in range(2):
+            found = self.entities.find(HostEntity, self.session, 'h-e')
+            self.assertTrue(found is None)
+        self.assertEqual(m_find.call_count, 2)
+
+    @mock.patch.object(AptPackageEntity, 'update_many')
+    def test_shared_upserted_once(self, m_update):
+        """Test that a package shared by hosts is only upserted once."""
+        for _ in range(5):
+            pkgs = [
+                AptPackageEntity(name='a', version='1'),
+                AptPackageEntity(name='b', version='1')
+            ]
+            self.entities.update_many(AptPackageEntity, self.session, pkgs, 10)
+        self.assertEqual(m_update.call_count, 1)
+
+        pkgs = [
+            AptPackageEntity(name='a', version='1'),
+            AptPackageEntity(name='c', version='1')
+        ]
+        self.entities.update_many(AptPackageEntity, self.session, pkgs, 10)
+        self.assertEqual(m_update.call_count, 2)
+        upserted = m_update.call_args[0][1]
+        self.assertEqual([p.identity for p in upserted], ['c-1'])
+
+    @mock.patch.object(UservarEntity, 'update_many')
+    def test_changed_properties_upserted(self, m_update):
+        """Test that an identity with new properties is upserted again."""
+        uservar = UservarEntity(environment='e', name='n', value='1')
+        self.entities.update_many(UservarEntity, self.session, [uservar], 10)
+        uservar = UservarEntity(environment='e', name='n', value='2')
+        self.entities.update_many(UservarEntity, self.session, [uservar], 10)
+        self.assertEqual(m_update.call_count, 2)
+
+    @mock.patch.object(HostEntity, 'find')
+    @mock.patch.object(HostEntity, 'update_many')
+    def test_upserted_found(self, m_update, m_find):
+        """Test that upserted entities satisfy later finds."""
+        host = HostEntity(hostname='h', environment='e')
+        self.entities.update_many(HostEntity, self.session, [host], 10)
+        found = self.entities.find(HostEntity, self.session, host.identity)
+        self.assertEqual(found.identity, host.identity)
+        self.assertEqual(found.hostname, 'h')
+        m_find.assert_not_called()
+
+    @mock.patch.object(AptPackageEntity, 'update_many')
+    def test_failed_upsert_not_recorded(self, m_update):
+        """Test that entities are not recorded when the upsert fails."""
+        m_update.side_effect = ValueError()
+        pkgs = [AptPackageEntity(name='a', version='1')]
+        with self.assertRaises(ValueError):
+            self.entities.update_many(AptPackageEntity, self.session, pkgs, 10)
+        m_update.side_effect = None
+        self.entities.update_many(AptPackageEntity, self.session, pkgs, 10)
+        self.assertEqual(m_update.call_count, 2)
@@ -0,0 +1,72 @@
+import mock
+import sys
+import unittest
+
+from io import StringIO
+
+from cloud_snitch.lastsync import parser
+from cloud_snitch.lastsync import verify
+
+
+class TestArgParser(unittest.TestCase):
+
+    def setUp(self):
+        self.old_stream = sys.stderr
+        self.stream = StringIO()
+        sys.stderr = self.stream
+
+    def tearDown(self):
+        sys.stderr = self.old_stream
+        self.stream.close()
+
+    def test_defaults(self):
+        """Test default arguments."""
+        args = parser.parse_args([])
+        self.assertTrue(args.uuid is None)
+        self.assertFalse(args.fix)
+
+    def test_non_defaults(self):
+        """Test non default arguments."""
+        args = parser.parse_args(['test_uuid', '--fix'])
+        self.assertEqual(args.uuid, 'test_uuid')
+        self.assertTrue(args.fix)
+
+
+class TestVerify(unittest.TestCase):
+
+    def _env(self, last_sync, last_update):
+        env = mock.Mock()
+        env.uuid = 'test_uuid'
+        env.last_sync_time.return_value = last_sync
+        env.last_update.return_value = last_update
+        return env
+
+    def test_match(self):
+        """Test that matching times are not repaired."""
+        env = self._env(5, 5)
+        self.assertTrue(verify(None, env, fix=True))
+        env.set_last_sync_time.assert_not_called()
+
+    def test_mismatch_report(self):
+        """Test that mismatches are only reported without fix."""
+        env = self._env(None, 5)
+        self.assertFalse(verify(None, env))
+        env.set_last_sync_time.assert_not_called()
+
+    def test_mismatch_fix(self):
+        """Test that mismatches are repaired with fix."""
+        env = self._env(3, 5)
+        self.assertFalse(verify('session', env, fix=True))
+        env.set_last_sync_time.assert_called_once_with('session', 5)
+
+    def test_ahead(self):
+        """Test that a last sync ahead of the last update is not repaired."""
+        env = self._env(7, 5)
+        self.assertTrue(verify('session', env, fix=True))
+        env.set_last_sync_time.assert_not_called()
+
+    def test_no_update(self):
+        """Test that environments without updates are not repaired."""
+        env = self._env(None, None)
+        self.assertTrue(verify('session', env, fix=True))
+        env.set_last_sync_time.assert_not_called()
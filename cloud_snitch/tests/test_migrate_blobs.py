@@ -0,0 +1,39 @@
+import unittest
+
+from cloud_snitch.migrate.blobs import migrate_property
+from cloud_snitch.models import BlobEntity
+
+from .models.base import FakeSession
+from .models.base import FakeTransaction
+
+
+class TestMigrateProperty(unittest.TestCase):
+    """Test moving inline values into blobs."""
+
+    def test_migrate_property(self):
+        records = [
+            {'id': 1, 'value': 'x = 1'},
+            {'id': 2, 'value': 'x = 1'},
+            {'id': 3, 'value': 'x = 2'}
+        ]
+        tx = FakeTransaction(results=[records[:2], [], [], records[2:]])
+        total = migrate_property(
+            FakeSession(tx),
+            'ConfigfileState',
+            'contents',
+            limit=2
+        )
+        self.assertEqual(total, 3)
+
+        # Find, merge blobs and update per chunk, then an empty find.
+        self.assertEqual(len(tx.queries), 7)
+        _, params = tx.queries[1]
+        self.assertEqual(params['blobs'], [
+            {'key': BlobEntity.key('x = 1'), 'value': 'x = 1'}
+        ])
+        cypher, params = tx.queries[2]
+        self.assertTrue('REMOVE s.contents' in cypher)
+        self.assertEqual(params['rows'], [
+            {'id': 1, 'key': BlobEntity.key('x = 1')},
+            {'id': 2, 'key': BlobEntity.key('x = 1')}
+        ])
@@ -7,6 +7,7 @@ from io import StringIO
 from cloud_snitch.remove import delete_until_zero
 from cloud_snitch.remove import parser
 from cloud_snitch.remove import prune
+from cloud_snitch.remove import prune_blobs
 
 
 class TestArgParser(unittest.TestCase):
@@ -150,3 +151,19 @@ class TestPrune(unittest.TestCase):
         self.assertEqual(m_delete.call_count, 2)
         self.assertEqual(stats['AptPackage'], 2)
         self.assertEqual(stats['AptPackageState'], 1)
+
+
+class TestPruneBlobs(unittest.TestCase):
+    """Test pruning blobs no state refers to."""
+
+    @mock.patch('cloud_snitch.remove.delete_until_zero', return_value=3)
+    def test_prune_blobs(self, m_delete):
+        stats = prune_blobs('session', {})
+        self.assertEqual(stats['Blob'], 3)
+        _, match = m_delete.call_args[0]
+        self.assertTrue(
+            'OPTIONAL MATCH (s0:ConfigfileState { contents_blob:n.key })'
+            in match
+        )
+        self.assertTrue(match.endswith('WHERE refs0 = 0'))
+        self.assertTrue(m_delete.call_args[1]['params']['grace'] > 0)
@@ -1,21 +1,43 @@
 import base64
 import datetime
+import hashlib
 import io
 import json
 import mock
 import os
 import pytz
 import struct
+import threading
 import unittest
 
 from cloud_snitch.exc import ArchiveObjectError
 from cloud_snitch.exc import InvalidKeyError
 from cloud_snitch.exc import RunInvalidError
+from cloud_snitch.runs import CBCDecryptReader
+from cloud_snitch.runs import HashingReader
 from cloud_snitch.runs import Run
 from cloud_snitch.runs import RunArchive
+from cloud_snitch.runs import load_json
 from Crypto.Cipher import AES
 
 
+class FakeTarInfo:
+
+    def __init__(self, name, type='file'):
+        """Init the fake member info.
+
+        :param name: Full name of the member
+        :type name: str
+        :param type: file or dir
+        :type type: str
+        """
+        self.name = name
+        self.type = type
+
+    def isfile(self):
+        return self.type == 'file'
+
+
 class FakeTarFile:
 
     def _pad(self, b):
@@ -69,6 +91,7 @@ class FakeTarFile:
         """Init the fake tar file."""
         self.member_names = []
         self.member_files = {}
+        self.extracted = []
         self.key = key
         if self.key:
             self.key = base64.b64decode(key)
@@ -86,14 +109,28 @@ class FakeTarFile:
         """
         return self.member_names
 
-    def extractfile(self, filename):
+    def __iter__(self):
+        """Iterate over member infos in archive order.
+
+        A directory member is included first to mimic real archives.
+
+        :yields: Fake member infos
+        :ytype: FakeTarInfo
+        """
+        yield FakeTarInfo('/some/path', type='dir')
+        for name in self.member_names:
+            yield FakeTarInfo(name)
+
+    def extractfile(self, member):
         """Get a file like object for matching file.
 
-        :param filename: Name of memeber file
-        :type filename: str
+        :param member: Member info or name of member file
+        :type member: FakeTarInfo|str
         :returns: File like object to read from
         :rtype: io.BytesIO
         """
+        filename = getattr(member, 'name', member)
+        self.extracted.append(filename)
         return io.BytesIO(self.member_files[filename])
 
     def close(self):
@@ -119,6 +156,31 @@ class TestRunArchive(unittest.TestCase):
             self.assertTrue(name in ra.filemap)
         self.assertEqual(len(ra.filemap), 10)
 
+    @mock.patch('cloud_snitch.runs.ThreadPoolExecutor')
+    @mock.patch('cloud_snitch.runs.tarfile.open')
+    def test_shared_executor(self, m_tarfile, m_executor):
+        """Test that concurrent readers share one executor."""
+        key = base64.b64encode(('a' * 32).encode('utf-8'))
+        m_tarfile.return_value = FakeTarFile(key=key)
+        ra = RunArchive('somefile', key=key, workers=2)
+        m_executor.side_effect = lambda **kwargs: mock.Mock()
+
+        executors = []
+        threads = [
+            threading.Thread(target=lambda: executors.append(ra.executor))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(m_executor.call_count, 1)
+        self.assertEqual(len(set(id(e) for e in executors)), 1)
+
+        executor = executors[0]
+        ra.close()
+        executor.shutdown.assert_called_once_with()
+
     @mock.patch('cloud_snitch.runs.tarfile.open')
     def test_read_unencrypted(self, m_tarfile):
         """Test that reading unencrypted archive works."""
@@ -138,6 +200,28 @@ class TestRunArchive(unittest.TestCase):
             obj = ra.read('file_{}'.format(i))
             self.assertEqual(obj.get('value'), i)
 
+    @mock.patch('cloud_snitch.runs.tarfile.open')
+    def test_single_pass(self, m_tarfile):
+        """Test that each member is extracted once no matter the reads."""
+        fake = FakeTarFile(key=None)
+        m_tarfile.return_value = fake
+        ra = RunArchive('somefile', key=None)
+        for _ in range(3):
+            for i in range(10):
+                obj = ra.read('file_{}'.format(i))
+                self.assertEqual(obj.get('value'), i)
+        self.assertEqual(m_tarfile.call_count, 1)
+        self.assertEqual(sorted(fake.extracted), sorted(fake.member_names))
+        ra.close()
+
+    @mock.patch('cloud_snitch.runs.tarfile.open')
+    def test_read_missing(self, m_tarfile):
+        """Test that reading a missing member raises KeyError."""
+        m_tarfile.return_value = FakeTarFile(key=None)
+        ra = RunArchive('somefile', key=None)
+        with self.assertRaises(KeyError):
+            ra.read('notamember')
+
     @mock.patch('cloud_snitch.runs.tarfile.open')
     def test_read_wrong_key(self, m_tarfile):
         """Test that reading encrypted archive with wrong key fails."""
@@ -148,6 +232,104 @@ class TestRunArchive(unittest.TestCase):
         with self.assertRaises(ArchiveObjectError):
             ra.read('file_0')
 
+    @mock.patch('cloud_snitch.runs.tarfile.open')
+    def test_iter_items(self, m_tarfile):
+        """Test incrementally reading list items from a member."""
+        key = base64.b64encode(('a' * 32).encode('utf-8'))
+        fake = FakeTarFile(key=key)
+        fake.add_file('/some/path/list', {'data': [{'a': 1}, {'b': 2.5}]})
+        m_tarfile.return_value = fake
+        ra = RunArchive('somefile', key=key)
+        items = ra.iter_items('list', 'data.item')
+        self.assertFalse('list' in ra.digests)
+        self.assertEqual(list(items), [{'a': 1}, {'b': 2.5}])
+
+        # Digest is only recorded after the member is exhausted
+        self.assertEqual(ra.digests['list'], ra.digest('list'))
+
+    @mock.patch('cloud_snitch.runs.tarfile.open')
+    def test_iter_kvitems(self, m_tarfile):
+        """Test incrementally reading key value pairs from a member."""
+        fake = FakeTarFile(key=None)
+        fake.add_file('/some/path/dict', {'data': {'x': [1], 'y': 'z'}})
+        m_tarfile.return_value = fake
+        ra = RunArchive('somefile', key=None)
+        pairs = list(ra.iter_kvitems('dict', 'data'))
+        self.assertEqual(pairs, [('x', [1]), ('y', 'z')])
+        self.assertEqual(list(ra.iter_kvitems('dict', 'missing')), [])
+
+    @mock.patch('cloud_snitch.runs.tarfile.open')
+    def test_iter_errors(self, m_tarfile):
+        """Test missing members and bad keys when iterating."""
+        right_key = base64.b64encode(('a' * 32).encode('utf-8'))
+        wrong_key = base64.b64encode(('b' * 32).encode('utf-8'))
+        m_tarfile.return_value = FakeTarFile(key=right_key)
+        ra = RunArchive('somefile', key=wrong_key)
+
+        # Missing members fail on open rather than on iteration
+        with self.assertRaises(KeyError):
+            ra.iter_items('notamember', 'data.item')
+
+        with self.assertRaises(ArchiveObjectError):
+            list(ra.iter_kvitems('file_0', 'data'))
+
+
+class TestStreams(unittest.TestCase):
+    """Test the chunked decrypt and incremental parse streams."""
+
+    def setUp(self):
+        self.key = ('a' * 32).encode('utf-8')
+        self.fake = FakeTarFile(key=base64.b64encode(self.key))
+
+    def _encrypt(self, data):
+        return self.fake.contents(data)
+
+    def _read_all(self, stream, size=7):
+        parts = []
+        while True:
+            part = stream.read(size)
+            if not part:
+                break
+            parts.append(part)
+        return b''.join(parts)
+
+    def test_chunked_decrypt(self):
+        """Test decrypting in chunks of varying size."""
+        for n in range(0, 80, 9):
+            data = {'value': 'x' * n}
+            expected = json.dumps(data).encode('utf-8')
+            for chunk_size in [16, 32, 50, 64 * 1024]:
+                reader = CBCDecryptReader(
+                    io.BytesIO(self._encrypt(data)),
+                    self.key,
+                    chunk_size=chunk_size
+                )
+                self.assertEqual(self._read_all(reader), expected)
+
+    def test_truncated(self):
+        """Test that truncated ciphertext is an error."""
+        raw = self._encrypt({'value': 'x' * 100})
+        reader = CBCDecryptReader(io.BytesIO(raw[:-5]), self.key)
+        with self.assertRaises(ValueError):
+            self._read_all(reader)
+        with self.assertRaises(ValueError):
+            CBCDecryptReader(io.BytesIO(raw[:10]), self.key)
+
+    def test_load_json(self):
+        """Test that numbers are parsed as floats not decimals."""
+        obj = load_json(io.BytesIO(b'{"a": 1.5, "b": [1, 2]}'))
+        self.assertEqual(obj, {'a': 1.5, 'b': [1, 2]})
+        self.assertTrue(isinstance(obj['a'], float))
+
+    def test_hashing_reader(self):
+        """Test that the digest covers the whole stream."""
+        reader = HashingReader(io.BytesIO(b'{"a": 1}   '))
+        load_json(reader)
+        self.assertEqual(
+            reader.hexdigest(),
+            hashlib.sha256(b'{"a": 1}   ').hexdigest()
+        )
+
 
 class TestRun(unittest.TestCase):
 
@@ -212,6 +394,33 @@ class TestRun(unittest.TestCase):
             obj = r.get_object('file_{}'.format(i))
             self.assertEqual(obj['value'], i)
 
+    @mock.patch('cloud_snitch.runs.tarfile.open')
+    def test_unchanged(self, m_tarfile):
+        """Test comparing plaintext digests to the previous sync."""
+        m_tarfile.return_value = self.fake_tarfile
+        r = Run('somepath', key=self.key)
+        self.assertEqual(r.digests(), {})
+        for filename in r.filenames:
+            r.mark_applied(filename)
+        digests = r.digests()
+        self.assertEqual(len(digests), 11)
+        self.assertFalse(r.unchanged('file_0'))
+
+        # Digests are of the plaintext so they survive re-encryption
+        self.fake_tarfile.add_file('/some/path/file_0', {'value': 0})
+        r = Run('somepath', key=self.key)
+        r.previous_digests = digests
+        self.assertTrue(r.unchanged('file_0'))
+
+        self.fake_tarfile.add_file('/some/path/file_0', {'value': 'new'})
+        r = Run('somepath', key=self.key)
+        r.previous_digests = digests
+        self.assertFalse(r.unchanged('file_0'))
+        self.assertTrue(r.unchanged('file_1'))
+
+        # Unchanged files carry over to the next ledger
+        self.assertEqual(sorted(r.digests()), ['file_1'])
+
     def test_non_existent_path(self):
         """Test that trying to open an archive that doesnt exist fails."""
         with self.assertRaises(RunInvalidError):
@@ -0,0 +1,143 @@
+import threading
+import time
+import unittest
+
+from cloud_snitch.exc import SnitcherDependencyError
+from cloud_snitch.snitchers.scheduler import SnitcherScheduler
+
+
+class FakeSnitcher(object):
+    """Snitcher that records when it starts and finishes."""
+
+    requires = ()
+    duration = 0.0
+    fail = False
+
+    def __init__(self, log, lock):
+        self.log = log
+        self.lock = lock
+
+    def snitch(self):
+        with self.lock:
+            self.log.append(('start', self.__class__.__name__))
+        time.sleep(self.duration)
+        if self.fail:
+            raise ValueError(self.__class__.__name__)
+        with self.lock:
+            self.log.append(('finish', self.__class__.__name__))
+
+
+class Root(FakeSnitcher):
+    duration = 0.01
+
+
+class Middle(FakeSnitcher):
+    requires = (Root,)
+    duration = 0.05
+
+
+class LeafA(FakeSnitcher):
+    requires = (Middle,)
+    duration = 0.05
+
+
+class LeafB(FakeSnitcher):
+    requires = (Middle,)
+    duration = 0.05
+
+
+class Side(FakeSnitcher):
+    requires = (Root,)
+
+
+class Failing(FakeSnitcher):
+    requires = (Root,)
+    fail = True
+
+
+class CycleA(FakeSnitcher):
+    pass
+
+
+class CycleB(FakeSnitcher):
+    requires = (CycleA,)
+
+
+CycleA.requires = (CycleB,)
+
+
+class TestSnitcherScheduler(unittest.TestCase):
+    """Test the dependency aware snitcher scheduler."""
+
+    def setUp(self):
+        self.log = []
+        self.lock = threading.Lock()
+
+    def _make(self, *classes):
+        return [c(self.log, self.lock) for c in classes]
+
+    def _index(self, event, name):
+        return self.log.index((event, name))
+
+    def test_requirements_honored(self):
+        """Test that snitchers start only after requirements finish."""
+        snitchers = self._make(LeafA, LeafB, Side, Middle, Root)
+        SnitcherScheduler(snitchers, workers=4).run()
+        self.assertEqual(len(self.log), 10)
+        self.assertTrue(
+            self._index('finish', 'Root') < self._index('start', 'Middle')
+        )
+        for leaf in ('LeafA', 'LeafB'):
+            self.assertTrue(
+                self._index('finish', 'Middle') < self._index('start', leaf)
+            )
+
+    def test_independent_run_concurrently(self):
+        """Test that independent snitchers overlap."""
+        snitchers = self._make(Root, Middle, LeafA, LeafB)
+        SnitcherScheduler(snitchers, workers=2).run()
+        self.assertTrue(
+            self._index('start', 'LeafB') < self._index('finish', 'LeafA')
+        )
+        self.assertTrue(
+            self._index('start', 'LeafA') < self._index('finish', 'LeafB')
+        )
+
+    def test_single_worker(self):
+        """Test that one worker runs everything serially."""
+        snitchers = self._make(Root, Middle, LeafA, LeafB)
+        SnitcherScheduler(snitchers, workers=1).run()
+        events = [e for e, _ in self.log]
+        self.assertEqual(events, ['start', 'finish'] * 4)
+
+    def test_missing_requirement(self):
+        """Test that a requirement that is not scheduled is an error."""
+        with self.assertRaises(SnitcherDependencyError):
+            SnitcherScheduler(self._make(Middle))
+
+    def test_cycle(self):
+        """Test that circular requirements are an error."""
+        with self.assertRaises(SnitcherDependencyError):
+            SnitcherScheduler(self._make(CycleA, CycleB))
+
+    def test_error_propagates(self):
+        """Test that errors are raised and dependents never start."""
+        snitchers = self._make(Root, Failing, Middle, LeafA)
+        with self.assertRaises(ValueError):
+            SnitcherScheduler(snitchers, workers=1).run()
+        self.assertFalse(('start', 'LeafA') in self.log)
+
+    def test_critical_path(self):
+        """Test the critical path is the longest chain of durations."""
+        snitchers = self._make(Root, Middle, LeafA, Side)
+        scheduler = SnitcherScheduler(snitchers)
+        root, middle, leaf, side = snitchers
+        scheduler.durations = {root: 1.0, middle: 2.0, leaf: 3.0, side: 4.5}
+        path, total = scheduler.critical_path()
+        self.assertEqual(path, [root, middle, leaf])
+        self.assertEqual(total, 6.0)
+
+        scheduler.durations[side] = 6.5
+        path, total = scheduler.critical_path()
+        self.assertEqual(path, [root, side])
+        self.assertEqual(total, 7.5)
@@ -0,0 +1,167 @@
+import datetime
+import mock
+import pytz
+import threading
+import time
+import unittest
+
+from cloud_snitch import settings
+from cloud_snitch.runs import Run
+from cloud_snitch.snitchers.apt import AptSnitcher
+from cloud_snitch.snitchers.base import BaseSnitcher
+
+from .test_runs import FakeTarFile
+
+
+class FakeSession:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+
+    def __init__(self):
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def session(self):
+        session = FakeSession()
+        with self.lock:
+            self.sessions.append(session)
+        return session
+
+
+class FakeRun:
+
+    completed = datetime.datetime(2018, 1, 1, tzinfo=pytz.utc)
+    path = 'somepath'
+
+    def __init__(self, hostnames, unchanged=None):
+        self.filenames = ['host_{}.json'.format(h) for h in hostnames]
+        self._unchanged = set(unchanged or [])
+
+    def unchanged(self, filename):
+        return filename in self._unchanged
+
+
+class HostSnitcher(BaseSnitcher):
+    """Records the hosts and sessions it is called with."""
+
+    file_pattern = '^host_(?P<hostname>.*).json$'
+
+    def __init__(self, driver, run, fail=None):
+        super(HostSnitcher, self).__init__(driver, run)
+        self.fail = fail or set()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _update_host(self, session, hostname, filename):
+        time.sleep(0.01)
+        with self.lock:
+            self.calls.append((session, hostname, filename))
+        if hostname in self.fail:
+            raise ValueError(hostname)
+
+
+class TestSnitchHosts(unittest.TestCase):
+    """Test per host fan out in the base snitcher."""
+
+    def setUp(self):
+        self.hostnames = ['host{}'.format(i) for i in range(8)]
+        self.driver = FakeDriver()
+        self.run = FakeRun(self.hostnames)
+        self.session = FakeSession()
+
+    @mock.patch.object(settings, 'HOST_WORKERS', 1)
+    def test_serial(self):
+        """Test that a single worker uses the snitcher session."""
+        snitcher = HostSnitcher(self.driver, self.run)
+        snitcher._snitch_hosts(self.session, snitcher.file_pattern)
+        self.assertEqual(
+            [c[1] for c in snitcher.calls],
+            self.hostnames
+        )
+        for session, _, _ in snitcher.calls:
+            self.assertTrue(session is self.session)
+        self.assertEqual(len(self.driver.sessions), 0)
+
+    @mock.patch.object(settings, 'HOST_WORKERS', 3)
+    def test_parallel(self):
+        """Test that workers get their own sessions which are closed."""
+        snitcher = HostSnitcher(self.driver, self.run)
+        snitcher._snitch_hosts(self.session, snitcher.file_pattern)
+        self.assertEqual(
+            sorted(c[1] for c in snitcher.calls),
+            self.hostnames
+        )
+        sessions = set(c[0] for c in snitcher.calls)
+        self.assertFalse(self.session in sessions)
+        self.assertTrue(len(self.driver.sessions) <= 3)
+        for session in self.driver.sessions:
+            self.assertTrue(session.closed)
+
+    @mock.patch.object(settings, 'HOST_WORKERS', 3)
+    def test_failure_isolation(self):
+        """Test that a failing host does not stop the others."""
+        snitcher = HostSnitcher(self.driver, self.run, fail=set(['host2']))
+        with self.assertRaises(ValueError):
+            snitcher._snitch_hosts(self.session, snitcher.file_pattern)
+        self.assertEqual(
+            sorted(c[1] for c in snitcher.calls),
+            self.hostnames
+        )
+        for session in self.driver.sessions:
+            self.assertTrue(session.closed)
+
+    @mock.patch.object(settings, 'HOST_WORKERS', 1)
+    def test_unchanged_skipped(self):
+        """Test that host files unchanged since the last sync are skipped."""
+        run = FakeRun(self.hostnames, unchanged=['host_host3.json'])
+        snitcher = HostSnitcher(self.driver, run)
+        snitcher._snitch_hosts(self.session, snitcher.file_pattern)
+        hostnames = [c[1] for c in snitcher.calls]
+        self.assertEqual(len(hostnames), 7)
+        self.assertFalse('host3' in hostnames)
+
+
+class TestAppliedDigests(unittest.TestCase):
+    """Test that only applied files are recorded in the digest ledger."""
+
+    def _run(self, m_tarfile, previous):
+        fake = FakeTarFile()
+        fake.add_file('run_data.json', {
+            'environment': {'uuid': 'test_uuid'},
+            'completed': '2018-01-01T00:00:00'
+        })
+        fake.add_file('dpkg_list_host1.json', {'data': []})
+        m_tarfile.return_value = fake
+        run = Run('somepath')
+        run.previous_digests = previous
+        run.entities = mock.Mock()
+        return run
+
+    @mock.patch.object(settings, 'HOST_WORKERS', 1)
+    @mock.patch('cloud_snitch.runs.tarfile.open')
+    def test_missing_host(self, m_tarfile):
+        """Test a host missing on one sync is applied on the next."""
+        run = self._run(m_tarfile, {})
+        run.entities.find.return_value = None
+        AptSnitcher(FakeDriver(), run)._snitch(FakeSession())
+        self.assertEqual(run.digests(), {})
+
+        run = self._run(m_tarfile, run.digests())
+        host = mock.Mock()
+        run.entities.find.return_value = host
+        AptSnitcher(FakeDriver(), run)._snitch(FakeSession())
+        host.aptpackages.update.assert_called_once()
+        self.assertEqual(list(run.digests()), ['dpkg_list_host1.json'])
+
+        # Unchanged on the third sync so it is skipped but kept
+        run = self._run(m_tarfile, run.digests())
+        AptSnitcher(FakeDriver(), run)._snitch(FakeSession())
+        run.entities.find.assert_not_called()
+        self.assertEqual(list(run.digests()), ['dpkg_list_host1.json'])
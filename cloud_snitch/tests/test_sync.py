@@ -0,0 +1,232 @@
+import base64
+import datetime
+import io
+import json
+import mock
+import os
+import pytz
+import shutil
+import struct
+import tarfile
+import tempfile
+import unittest
+
+from cloud_snitch import utils
+from cloud_snitch.exc import RunContainsOldDataError
+from cloud_snitch.exc import RunInvalidError
+from cloud_snitch.runs import peek_run_data
+from cloud_snitch.sync import check_run_time
+from cloud_snitch.sync import find_archives
+from cloud_snitch.sync import parser
+from cloud_snitch.sync import plan
+from cloud_snitch.sync import sync_many
+from cloud_snitch.sync import sync_run
+from Crypto.Cipher import AES
+
+
+def write_archive(path, run_data, key=None):
+    """Write a run archive containing run_data.json and a host file.
+
+    :param path: Path of the archive
+    :type path: str
+    :param run_data: Run data to write
+    :type run_data: dict
+    :param key: Optional base64 encoded AES key
+    :type key: str
+    """
+    def contents(data):
+        data = json.dumps(data).encode('utf-8')
+        if key:
+            iv = os.urandom(AES.block_size)
+            length = len(data)
+            data += b'\0' * (AES.block_size - (length % AES.block_size))
+            cipher = AES.new(base64.b64decode(key), AES.MODE_CBC, iv)
+            data = struct.pack('<Q', length) + iv + cipher.encrypt(data)
+        return data
+
+    with tarfile.open(path, 'w:gz') as tf:
+        for name, data in [
+            ('run/facts_host.json', {'data': {}}),
+            ('run/run_data.json', run_data)
+        ]:
+            raw = contents(data)
+            info = tarfile.TarInfo(name)
+            info.size = len(raw)
+            tf.addfile(info, io.BytesIO(raw))
+
+
+class FakeDriver:
+
+    def session(self):
+        return mock.MagicMock()
+
+
+class TestCheckRunTime(unittest.TestCase):
+
+    def setUp(self):
+        self.run = mock.Mock()
+        self.run.environment_uuid = 'test_uuid'
+        self.run.completed = datetime.datetime(2018, 1, 2, tzinfo=pytz.utc)
+        self.env = mock.Mock()
+
+    def _ms(self, *args):
+        return utils.milliseconds(datetime.datetime(*args, tzinfo=pytz.utc))
+
+    @mock.patch('cloud_snitch.sync.EnvironmentEntity.find')
+    def test_last_sync_used(self, m_find):
+        """Test that last sync is used without walking the subgraph."""
+        m_find.return_value = self.env
+        self.env.last_sync_time.return_value = self._ms(2018, 1, 1)
+        check_run_time(FakeDriver(), self.run)
+        self.env.last_update.assert_not_called()
+
+        self.env.last_sync_time.return_value = self._ms(2018, 1, 3)
+        with self.assertRaises(RunContainsOldDataError):
+            check_run_time(FakeDriver(), self.run)
+
+    @mock.patch('cloud_snitch.sync.EnvironmentEntity.find')
+    def test_fallback(self, m_find):
+        """Test that the subgraph is walked without a last sync."""
+        m_find.return_value = self.env
+        self.env.last_sync_time.return_value = None
+        self.env.last_update.return_value = self._ms(2018, 1, 3)
+        with self.assertRaises(RunContainsOldDataError):
+            check_run_time(FakeDriver(), self.run)
+        self.assertEqual(self.env.last_update.call_count, 1)
+
+    @mock.patch('cloud_snitch.sync.EnvironmentEntity.find')
+    def test_new_environment(self, m_find):
+        """Test that a new environment is never too new."""
+        m_find.return_value = None
+        check_run_time(FakeDriver(), self.run)
+
+
+class TestSyncRun(unittest.TestCase):
+
+    def setUp(self):
+        self.run = mock.Mock()
+        self.run.environment_uuid = 'test_uuid'
+        self.run.completed = datetime.datetime(2018, 1, 2, tzinfo=pytz.utc)
+
+    @mock.patch('cloud_snitch.sync.save_digests')
+    @mock.patch('cloud_snitch.sync.load_digests')
+    @mock.patch('cloud_snitch.sync.check_run_time')
+    @mock.patch('cloud_snitch.sync.consume')
+    @mock.patch('cloud_snitch.sync.EnvironmentEntity.set_last_sync_time')
+    def test_last_sync(self, m_set, m_consume, *args):
+        """Test last sync only moves forward once the run is consumed."""
+        m_consume.side_effect = ValueError()
+        with self.assertRaises(ValueError):
+            sync_run(FakeDriver(), self.run)
+        m_set.assert_not_called()
+
+        m_consume.side_effect = None
+        sync_run(FakeDriver(), self.run)
+        m_set.assert_called_once_with(
+            mock.ANY,
+            utils.milliseconds(self.run.completed)
+        )
+
+
+class TestArgParser(unittest.TestCase):
+
+    def test_paths(self):
+        """Test that many paths are accepted."""
+        args = parser.parse_args(['a', 'b', '--workers', '3', '--full'])
+        self.assertEqual(args.paths, ['a', 'b'])
+        self.assertEqual(args.workers, 3)
+        self.assertTrue(args.full)
+
+
+class TestMultiArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.key = base64.b64encode(('a' * 32).encode('utf-8'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _archive(self, name, uuid, completed, key=None):
+        path = os.path.join(self.tmpdir, name)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        run_data = {
+            'environment': {'uuid': uuid, 'name': 'n', 'account_number': 1},
+            'completed': completed,
+            'status': 'finished'
+        }
+        write_archive(path, run_data, key=key)
+        return path
+
+    def test_peek_run_data(self):
+        """Test reading only run data from plain and encrypted archives."""
+        path = self._archive('a.tar.gz', 'u1', '2018-01-01T00:00:00')
+        self.assertEqual(peek_run_data(path)['environment']['uuid'], 'u1')
+
+        path = self._archive(
+            'b.tar.gz',
+            'u2',
+            '2018-01-01T00:00:00',
+            key=self.key
+        )
+        run_data = peek_run_data(path, key=self.key)
+        self.assertEqual(run_data['environment']['uuid'], 'u2')
+
+        with self.assertRaises(RunInvalidError):
+            peek_run_data(os.path.join(self.tmpdir, 'missing.tar.gz'))
+
+    def test_find_archives(self):
+        """Test expanding files, directories and globs."""
+        a = self._archive('a.tar.gz', 'u1', '2018-01-01T00:00:00')
+        b = self._archive('sub/b.tar.gz', 'u1', '2018-01-02T00:00:00')
+        with open(os.path.join(self.tmpdir, 'notes.txt'), 'w') as f:
+            f.write('not an archive')
+
+        self.assertEqual(find_archives([self.tmpdir]), [a, b])
+        self.assertEqual(
+            find_archives([os.path.join(self.tmpdir, '*.tar.gz'), a]),
+            [a]
+        )
+
+    def test_plan(self):
+        """Test grouping by environment in completed order."""
+        late = self._archive('late.tar.gz', 'u1', '2018-01-03T00:00:00')
+        early = self._archive('early.tar.gz', 'u1', '2018-01-01T00:00:00')
+        dupe = self._archive('dupe.tar.gz', 'u1', '2018-01-01T00:00:00')
+        other = self._archive('other.tar.gz', 'u2', '2018-01-02T00:00:00')
+        bad = os.path.join(self.tmpdir, 'bad.tar.gz')
+        with open(bad, 'w') as f:
+            f.write('not an archive')
+
+        groups, duplicates, failed = plan([late, early, dupe, other, bad])
+        self.assertEqual(list(groups.keys()), ['u1', 'u2'])
+        self.assertEqual(groups['u1'][1], [early, late])
+        self.assertEqual(groups['u2'][0]['uuid'], 'u2')
+        self.assertEqual(duplicates, [dupe])
+        self.assertEqual([p for p, _ in failed], [bad])
+
+    @mock.patch('cloud_snitch.sync.sync_environment')
+    def test_sync_many(self, m_sync_env):
+        """Test the summary of syncing many environments."""
+        a = self._archive('a.tar.gz', 'u1', '2018-01-01T00:00:00')
+        b = self._archive('b.tar.gz', 'u1', '2018-01-02T00:00:00')
+        c = self._archive('c.tar.gz', 'u2', '2018-01-02T00:00:00')
+
+        def fake_sync(environment, paths, key=None, full=False):
+            if environment['uuid'] == 'u2':
+                raise ValueError('locked')
+            return {
+                'synced': [(paths[1], 1.0)],
+                'old': [paths[0]],
+                'duplicate': [],
+                'failed': []
+            }
+        m_sync_env.side_effect = fake_sync
+
+        summary = sync_many([self.tmpdir], workers=1)
+        self.assertEqual(summary['environments'], 2)
+        self.assertEqual(summary['synced'], [(b, 1.0)])
+        self.assertEqual(summary['old'], [a])
+        self.assertEqual([p for p, _ in summary['failed']], [c])
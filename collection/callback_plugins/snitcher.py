@@ -3,11 +3,14 @@ __metaclass__ = type
 
 import base64
 import datetime
+import hashlib
 import json
 import os
 import struct
 import uuid
 import yaml
+import zlib
+from collections import OrderedDict
 from Crypto.Cipher import AES
 
 try:
@@ -79,8 +82,28 @@ DOCUMENTATION = '''
 '''
 
 
-class File:
-    """Class for writing or reading optionally encrypted data.
+# Run container layout. Must match cloud_snitch.container.
+CONTAINER_MAGIC = b'CSNITCH1'
+CONTAINER_VERSION = 1
+CONTAINER_EXTENSION = '.csrun'
+_RECORD = struct.Struct('<IQ')
+_TRAILER = struct.Struct('<QQ{}s'.format(len(CONTAINER_MAGIC)))
+
+# Framed AES-GCM layout. Must match cloud_snitch.crypt.
+FRAMED_MAGIC = b'CSGCM\x00\x00\x01'
+FRAMED_CHUNK_SIZE = 64 * 1024
+_FRAMED_HEADER = struct.Struct('<{}sI'.format(len(FRAMED_MAGIC)))
+_FRAME = struct.Struct('<IB')
+_AAD = struct.Struct('<QB')
+
+
+class RunContainer:
+    """Class for appending optionally encrypted records to a run container.
+
+    Each record is compressed and, if enabled, encrypted as it is added
+    so results are written once as they arrive. The index and trailer
+    are written on close. Until then the container lives at a partial
+    path so it is never mistaken for a finished run.
 
     Encryption is configured via by the environment variables:
         CLOUD_SNITCH_CRYPT_ENABLED
@@ -90,25 +113,33 @@ class File:
     valid_enabled = ['true', '1', 'yes']
 
     def __init__(self, filename):
-        """Initialize the file object.
+        """Initialize the container object.
 
-        :param filename: Filename to read from or write to
+        :param filename: Filename of the finished container
         :type filename: str
         """
         self.filename = filename
+        self.partial = filename + '.part'
 
         # crypt_enabled is only true if environment var is some
-        crypt_enabled = settings.get('crypt_enabled')
+        crypt_enabled = settings.get('crypt_enabled') or ''
         crypt_enabled = crypt_enabled.lower()
         self.crypt_enabled = crypt_enabled in self.valid_enabled
 
         # Retrieve crypt key and base64 decode it.
         self.crypt_key = settings.get('crypt_key')
-        self.crypt_key = base64.b64decode(self.crypt_key)
+        if self.crypt_key:
+            self.crypt_key = base64.b64decode(self.crypt_key)
 
         if self.crypt_enabled and not self.crypt_key:
             raise Exception("Crypt is enabled but no key is configured.")
 
+        # Members by name. A repeated name replaces the earlier record.
+        self.members = OrderedDict()
+        self._file = open(self.partial, 'wb')
+        self._file.write(CONTAINER_MAGIC)
+        self._offset = len(CONTAINER_MAGIC)
+
     def _pad(self, b):
         """Pad the string s to be a multiple of AES.block_size.
 
@@ -122,69 +153,111 @@ class File:
         padded = b + ("\0" * pad_length).encode(self.encoding)
         return length, padded
 
-    def write(self, data):
-        """Write data to a file.
+    def _encrypt_framed(self, b):
+        """Encrypt bytes as independently authenticated AES-GCM chunks.
+
+        :param b: Bytes to encrypt
+        :type b: bytes
+        :returns: Framed ciphertext
+        :rtype: bytes
+        """
+        parts = [_FRAMED_HEADER.pack(FRAMED_MAGIC, FRAMED_CHUNK_SIZE)]
+        offsets = range(0, len(b), FRAMED_CHUNK_SIZE) or [0]
+        last = len(offsets) - 1
+        for index, offset in enumerate(offsets):
+            final = index == last
+            nonce = os.urandom(12)
+            cipher = AES.new(self.crypt_key, AES.MODE_GCM, nonce=nonce)
+            cipher.update(_AAD.pack(index, final))
+            ciphertext, tag = cipher.encrypt_and_digest(
+                b[offset:offset + FRAMED_CHUNK_SIZE]
+            )
+            parts.append(_FRAME.pack(len(ciphertext), final))
+            parts.extend([nonce, tag, ciphertext])
+        return b''.join(parts)
+
+    def _encrypt_cbc(self, b):
+        """Encrypt bytes as a single length prefixed AES-CBC blob.
+
+        Only used when the installed crypto library has no GCM mode.
+
+        :param b: Bytes to encrypt
+        :type b: bytes
+        :returns: Length, initialization vector and ciphertext
+        :rtype: bytes
+        """
+        iv = os.urandom(AES.block_size)
+        length, padded = self._pad(b)
+        cipher = AES.new(self.crypt_key, AES.MODE_CBC, iv)
+        return struct.pack('<Q', length) + iv + cipher.encrypt(padded)
 
-        Will convert to bytes and will encrypt if enabled.
+    def write(self, name, data):
+        """Append a record to the container.
 
+        Will convert to bytes, compress and will encrypt if enabled.
+
+        :param name: Name of the record
+        :type name: str
         :param data: String to write.
         :type data: str
         """
-        # Convert data string to bytes
+        # Convert data string to bytes and compress it.
         data = data.encode(self.encoding)
+        payload = zlib.compress(data)
 
-        # Create initialization vector and cipher text if crypt enabled.
+        # Encrypt in authenticated chunks if crypt enabled.
         if self.crypt_enabled:
-            iv = os.urandom(AES.block_size)
-            length, padded = self._pad(data)
-            cipher = AES.new(self.crypt_key, AES.MODE_CBC, iv)
-            data = struct.pack('<Q', length) + iv + cipher.encrypt(padded)
-
-        # Write to file.
-        with open(self.filename, 'wb') as f:
-            f.write(data)
-
-    def read(self):
-        """Read data from a file.
-
-        Will decrypt if enabled.
-        Will return string.
-
-        :returns: Data from file as string
-        :rtype: str
-        """
-        with open(self.filename, 'rb') as f:
-            if self.crypt_enabled:
-                # Read original bytes length first
-                length = struct.unpack('<Q', f.read(struct.calcsize('Q')))[0]
-
-                # Read initialization vector next
-                iv = f.read(AES.block_size)
-                cipher = AES.new(self.crypt_key, AES.MODE_CBC, iv)
-
-                # Read and decrypt rest of string.
-                decrypted = cipher.decrypt(f.read())
-
-                # Remove padding
-                data = decrypted[:length]
+            if hasattr(AES, 'MODE_GCM'):
+                payload = self._encrypt_framed(payload)
             else:
-                data = f.read()
+                payload = self._encrypt_cbc(payload)
+
+        # Append the record.
+        encoded_name = name.encode(self.encoding)
+        self._file.write(_RECORD.pack(len(encoded_name), len(payload)))
+        self._file.write(encoded_name)
+        self._file.write(payload)
+        self._offset += _RECORD.size + len(encoded_name)
+        self.members.pop(name, None)
+        self.members[name] = {
+            'name': name,
+            'offset': self._offset,
+            'length': len(payload),
+            'digest': hashlib.sha256(data).hexdigest()
+        }
+        self._offset += len(payload)
 
-            # Return decoded string.
-            return data.decode(self.encoding)
+    def close(self):
+        """Write the index and trailer and move the container into place."""
+        if self._file is None:
+            return
+        index = json.dumps({
+            'version': CONTAINER_VERSION,
+            'compression': 'zlib',
+            'encrypted': self.crypt_enabled,
+            'members': list(self.members.values())
+        }).encode(self.encoding)
+        self._file.write(index)
+        self._file.write(
+            _TRAILER.pack(self._offset, len(index), CONTAINER_MAGIC)
+        )
+        self._file.close()
+        self._file = None
+        os.rename(self.partial, self.filename)
 
 
 class FileHandler:
 
-    def __init__(self, writedir):
+    def __init__(self, container, prefix):
         """Init the file handler
 
-        :param writedir: Directory to write to
-        :type writedir: str
+        :param container: Run container to write to
+        :type container: RunContainer
+        :param prefix: Directory prefix of record names
+        :type prefix: str
         """
-        self.basedir = writedir
-        if self.basedir is None:
-            raise Exception("No data directory configured.")
+        self.container = container
+        self.prefix = prefix
 
         self._doc = {
             'environment': {
@@ -195,23 +268,18 @@ class FileHandler:
         }
 
     def _save(self):
-        """Save contents of _doc to file.
+        """Save contents of _doc to the container.
 
         Data is encoded as json.
         """
         data = json.dumps(self._doc)
-        f = File(self._outfile_name)
-        f.write(data)
+        self.container.write(self._outfile_name, data)
 
     def handle(self, doctype, host, result):
-        """Writes payload as json to file.
-
-        Stores md5 of json. Used to determine if change
-        has occurred.
-
-        Filenames will be:
-            <doctype>_<host>.json, <doctype>_<host>.json
+        """Writes payload as json to a record.
 
+        Record names will be:
+            <prefix>/<doctype>_<host>.json
 
         :param doctype: Type of the document.
         :type doctype: str
@@ -221,7 +289,7 @@ class FileHandler:
         :type result: dict
         """
         outfile_name = '{}_{}.json'.format(doctype, host)
-        self._outfile_name = os.path.join(self.basedir, outfile_name)
+        self._outfile_name = '/'.join([self.prefix, outfile_name])
         self._doc['host'] = host
         self._doc['data'] = result.get('payload', {})
         self._save()
@@ -237,8 +305,8 @@ class SingleFileHandler(FileHandler):
         Should only be called on one host. The execution will happen
         on the deployment host.
 
-        Stored files will be:
-            <filename_prefix>.json, <filename_prefix>.md5
+        Record names will be:
+            <prefix>/<filename_prefix>.json
 
         :param doctype: Type of document
         :type doctype: str
@@ -248,7 +316,7 @@ class SingleFileHandler(FileHandler):
         :type result: dict
         """
         outfile_name = '{}.json'.format(self.filename_prefix)
-        self._outfile_name = os.path.join(self.basedir, outfile_name)
+        self._outfile_name = '/'.join([self.prefix, outfile_name])
         self._doc['data'] = result.get('payload', {})
         self._save()
 
@@ -315,64 +383,38 @@ class CallbackModule(CallbackBase):
         if doctype not in TARGET_DOCTYPES:
             return
         handler = DOCTYPE_HANDLERS.get(doctype, FileHandler)
-        handler(self.dirpath).handle(doctype, host, result)
-
-    def _run_data_filename(self):
-        """Compute filename of run data.
-
-        :returns: Name of the file
-        :rtype: str
-        """
-        return os.path.join(self.dirpath, 'run_data.json')
-
-    def _write_run_data(self, data):
-        """Writes information about the run.
-
-        :param data: Data to save
-        :type data: dict
-        """
-        f = File(self._run_data_filename())
-        f.write(json.dumps(data))
-
-    def _read_run_data(self):
-        """Read information about the run
-
-        :returns: Loaded data
-        :rtype: dict
-        """
-        text = File(self._run_data_filename()).read()
-        return json.loads(text)
+        handler(self.container, self.run_id).handle(doctype, host, result)
 
     def playbook_on_start(self):
-        """Start new directory."""
-        # Name the new directory according to run id
-        now = datetime.datetime.utcnow()
-        run_id = settings.get('run_id') or str(uuid.uuid4())
-        self.dirpath = os.path.join(self.basedir, run_id)
-
-        # Create the new directory
-        if not os.path.exists(self.dirpath):
-            os.makedirs(self.dirpath)
-
-        # Saved some stats
-        self._write_run_data({
+        """Start a new run container."""
+        # Name the new container according to run id
+        self.run_id = settings.get('run_id') or str(uuid.uuid4())
+        self.run_data = {
             'status': 'running',
-            'started': now.isoformat(),
+            'started': datetime.datetime.utcnow().isoformat(),
             'environment': {
                 'account_number': settings.get('environment.account_number'),
                 'name': settings.get('environment.name'),
                 'uuid': settings.get('environment.uuid')
             }
-        })
+        }
 
-    def playbook_on_stats(self, stats):
-        """Used as a on_playbook_end."""
-        now = datetime.datetime.utcnow()
+        # Create the data directory
+        if not os.path.exists(self.basedir):
+            os.makedirs(self.basedir)
+
+        filename = self.run_id + CONTAINER_EXTENSION
+        self.container = RunContainer(os.path.join(self.basedir, filename))
 
-        # Get saved data
-        data = self._read_run_data()
+    def playbook_on_stats(self, stats):
+        """Used as a on_playbook_end.
 
-        # Update data and then save it
-        data['status'] = 'finished'
-        data['completed'] = now.isoformat()
-        self._write_run_data(data)
+        Saves information about the run and finalizes the container.
+        """
+        self.run_data['status'] = 'finished'
+        self.run_data['completed'] = datetime.datetime.utcnow().isoformat()
+        self.container.write(
+            '/'.join([self.run_id, 'run_data.json']),
+            json.dumps(self.run_data)
+        )
+        self.container.close()
@@ -29,6 +29,8 @@ entry_points = """
     cloud-snitch-constraints=cloud_snitch.constraints:main
     cloud-snitch-remove=cloud_snitch.remove:main
     cloud-snitch-terminate=cloud_snitch.terminate:main
+    cloud-snitch-last-sync=cloud_snitch.lastsync:main
+    cloud-snitch-convert=cloud_snitch.convert:main
 """
 
 setup(
@@ -44,5 +46,8 @@ setup(
     ],
     package_data={'cloud_snitch': ['cloud_snitch/*']},
     long_description=description,
+    install_requires=[
+        'ijson>=3.1'
+    ],
     entry_points=entry_points
 )
@@ -1,3 +1,4 @@
+import os
 import time
 from cloud_snitch.sync import sync_single
 
@@ -14,7 +15,8 @@ class ActionModule(ActionBase):
         """Run the action plugin.
 
         :param uuid: Uuid of a collection run. Should indicate a set of data
-            at path /path/to/data/dir/<uuid>.tar.gz
+            at path /path/to/data/dir/<uuid>.csrun or, for runs collected
+            before run containers, /path/to/data/dir/<uuid>.tar.gz
         :type uuid: str
         :param key: Base64 encode encryption key
         :type key: str
@@ -30,8 +32,11 @@ class ActionModule(ActionBase):
                 raise ValueError('Argument \'uuid\' is required.')
             if self._task.args.get('key') is None:
                 raise ValueError('Argument \'key\' is required.')
-            path = '/etc/cloud_snitch/data/{}.tar.gz'
+            path = '/etc/cloud_snitch/data/{}.csrun'
             path = path.format(self._task.args['uuid'])
+            if not os.path.exists(path):
+                path = '/etc/cloud_snitch/data/{}.tar.gz'
+                path = path.format(self._task.args['uuid'])
             sync_single(path, key=self._task.args['key'])
         except Exception as e:
             msg = 'Unable to sync run at path \'{}\': {}'.format(path, e)
@@ -1,22 +1,39 @@
+import collections
 import logging
+import time
 
-from django.core.cache import cache
 from django.conf import settings
 
+from . import singleflight
+from . import tasks
 from .cache import cache_key
 
 logger = logging.getLogger(__name__)
 
+# Cached value with the time after which it is stale
+Entry = collections.namedtuple('Entry', ['value', 'fresh_until'])
 
-def _cached_result(prefix='', timeout=None, index=0):
+
+def _cached_result(prefix='', timeout=None, index=0, stale=0):
     """Decorator called by the class and non class cached result.
 
+    Identical concurrent calls that miss the cache are coalesced so that
+    only one of them runs the decorated function.
+
+    Values older than timeout are stale. For another stale seconds the
+    stale value is returned immediately while a celery task computes a new
+    one. After that the value expires. Workers find the decorated function
+    by its module and qualified name, so it must be a module level function
+    or a method of a class that can be created without arguments.
+
     :param prefix: Prefix for cache
     :type prefix: str
     :param timeout: TTL in seconds
     :type timeout: integer
     :param index: Position of args to key from
     :type index: integer
+    :param stale: Seconds a stale value may be served
+    :type stale: integer
     :returns: decorator function.
     :rtype: function
     """
@@ -24,50 +41,114 @@ def _cached_result(prefix='', timeout=None, index=0):
         timeout = settings.DEFAULT_CACHE_TIMEOUT
 
     def wrapper(func):
+        path = '{}:{}'.format(func.__module__, func.__qualname__)
+
+        def _compute(args, kwargs):
+            return lambda: Entry(func(*args, **kwargs), time.time() + timeout)
+
         def _decorated(*args, **kwargs):
             key = cache_key(args, kwargs, prefix=prefix, index=index)
-            value = cache.get(key)
-
-            if value is None:
-                logger.debug("CACHE MISS")
-                value = func(*args, **kwargs)
-                cache.set(key, value, timeout)
-            else:
-                logger.debug("CACHE HIT")
-            return value
+            entry = singleflight.run(
+                key,
+                _compute(args, kwargs),
+                timeout + stale
+            )
+
+            # Values cached before entries were introduced
+            if not isinstance(entry, Entry):
+                return entry
+
+            if entry.fresh_until <= time.time():
+                logger.debug("CACHE STALE")
+                _schedule_refresh(key, path, args[index:], kwargs)
+            return entry.value
+
+        def _refresh(args, kwargs, token):
+            """Recompute a stale value under a lease taken for it.
+
+            :param args: Positional arguments of the call
+            :type args: tuple
+            :param kwargs: Keyword arguments of the call
+            :type kwargs: dict
+            :param token: Token of the lease on the key
+            :type token: str
+            """
+            key = cache_key(args, kwargs, prefix=prefix, index=index)
+            if not singleflight.renew(key, token):
+                logger.debug('Lease on {} expired before refresh'.format(key))
+                return
+            singleflight.compute(
+                key,
+                token,
+                _compute(args, kwargs),
+                timeout + stale
+            )
+
+        _decorated.refresh = _refresh
         return _decorated
     return wrapper
 
 
-def cls_cached_result(prefix='', timeout=None):
+def _schedule_refresh(key, path, args, kwargs):
+    """Schedule a refresh of a stale value unless one is pending.
+
+    The lease is taken here so that a burst of stale hits schedules one
+    task. It expires if no worker picks the task up.
+
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :param path: Module and qualified name of the decorated function
+    :type path: str
+    :param args: Positional arguments of the call without the instance
+    :type args: tuple
+    :param kwargs: Keyword arguments of the call
+    :type kwargs: dict
+    """
+    token = singleflight.acquire(key)
+    if token is None:
+        return
+    try:
+        tasks.refresh_cached_result.delay(path, list(args), kwargs, token)
+    except Exception:
+        logger.exception('Unable to schedule refresh of {}'.format(key))
+        singleflight.release(key, token)
+
+
+def cls_cached_result(prefix='', timeout=None, stale=0):
     """Caching decorator for class functions.
 
     :param prefix: Cache key prefix
     :type prefix: str
     :param timeout: TTL in seconds
     :type timeout: int
+    :param stale: Seconds a stale value may be served
+    :type stale: int
     :returns: decorator function.
     :rtype: function
     """
     return _cached_result(
         prefix=prefix,
         timeout=timeout,
-        index=1
+        index=1,
+        stale=stale
     )
 
 
-def cached_result(prefix='', timeout=None):
+def cached_result(prefix='', timeout=None, stale=0):
     """Caching decorator for non class functions.
 
     :param prefix: Cache key prefix
     :type prefix: str
     :param timeout: TTL in seconds
     :type timeout: int
+    :param stale: Seconds a stale value may be served
+    :type stale: int
     :returns: decorator function
     :rtype: function
     """
     return _cached_result(
         prefix=prefix,
         timeout=timeout,
-        index=0
+        index=0,
+        stale=stale
     )
@@ -1,12 +1,37 @@
+import json
 import logging
+import sys
+import threading
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from django.conf import settings
+from cloud_snitch.models import BlobEntity
 from cloud_snitch.models import registry
+from neo4jdriver.connection import get_connection
 from neo4jdriver.query import Query
 
 logger = logging.getLogger(__name__)
 var_to_model_map = {m.lower(): m for m in registry.models}
 
+# Distinct flag sets shared by all nodes
+_FLAG_SETS = {frozenset(): frozenset()}
+
+
+@lru_cache(maxsize=None)
+def _label_prop(select):
+    """Split a diff query select into an interned label and property.
+
+    :param select: Select of the form var.prop
+    :type select: str
+    :returns: Label and property
+    :rtype: tuple
+    """
+    label, prop = select.split('.', 1)
+    label = var_to_model_map.get(label, label)
+    return sys.intern(label), sys.intern(prop)
+
 
 class DiffQuery(Query):
 
@@ -64,29 +89,29 @@ class DiffQuery(Query):
         """
         skip = (page - 1) * self.pagesize
         q = '{} \nSKIP {}\nLIMIT {}'.format(str(self), skip, self.pagesize)
-        rows = []
-        for record in self._fetch(q):
-            row = OrderedDict()
-            for select in self.selects:
-                row[select] = record[select]
-            rows.append(row)
-        return rows
+        return [self._row(record) for record in self._fetch(q)]
+
+    def _row(self, record):
+        """Convert a record into a row of identities.
+
+        :param record: Record returned by neo4j
+        :type record: neo4j.Record
+        :returns: Identity of each node in the path keyed by select
+        :rtype: OrderedDict
+        """
+        row = OrderedDict()
+        for select in self.selects:
+            row[select] = record[select]
+        return row
 
     def fetch_all(self):
-        """Fetch all pages.
+        """Stream all results of a single execution of the query.
 
         :yields: One result per match.
         :ytype: OrderedDict
         """
-        page = 1
-        go = True
-        while go:
-            rows = self.fetch(page)
-            for row in rows:
-                yield row
-            if not rows:
-                go = False
-            page += 1
+        for record in self._stream(str(self)):
+            yield self._row(record)
 
 
 class DiffSideQuery(DiffQuery):
@@ -366,8 +391,264 @@ class DiffStateQuery(DiffQuery):
         ])
 
 
+class WindowQuery(DiffQuery):
+    """Base of queries that compare paths by their changed relationships.
+
+    A versioned relationship changed between the two times exactly when
+    it starts or ends inside (min(t1, t2), max(t1, t2)]. A path can only
+    differ between the two times if one of its relationships changed, so
+    each path is checked against that window instead of being collected
+    at one time and compared against every path at the other.
+
+    Experimental. Neo4j 3.x can not index relationship properties or scan
+    relationships by type, so these queries still match every path below
+    the identity and add a pattern comprehension per relationship of each
+    path. Work grows with the size of the environment, not with the number
+    of changed relationships, and no measurement shows them to be cheaper
+    than DiffSideQuery and DiffStateQuery. They are only used when
+    DIFF_ENGINE is 'window'.
+    """
+
+    def __init__(self, path, identity, times, pagesize=5000):
+        """Init the window query
+
+        :param path: Path to build a diff query around
+        :type path: list
+        :param identity: Starting node's identity
+        :type identity: str
+        :param times: Two times for comparison
+        :type times: tuple
+        :param pagesize: How many results to fetch at once
+        :type pagesize: int
+        """
+        super(WindowQuery, self).__init__(
+            path,
+            identity,
+            times,
+            pagesize=pagesize
+        )
+        self.params['lo'] = min(self.t1, self.t2)
+        self.params['hi'] = max(self.t1, self.t2)
+
+    def _path_match(self):
+        """Build the match of the full path as p.
+
+        :returns: Match clause
+        :rtype: str
+        """
+        cipher = 'MATCH p = '
+        for model, reltype in self.full_path:
+            cipher += '({}:{})-[:{}]->'.format(
+                self._var_from_label(model),
+                model,
+                reltype
+            )
+        cipher += '({}:{})'.format(self._var_from_label(self.end), self.end)
+        return cipher
+
+    def _pairs(self):
+        """List adjacent nodes of the full path.
+
+        :returns: List of (parent var, relationship type, child var)
+        :rtype: list
+        """
+        labels = [m for m, _ in self.full_path] + [self.end]
+        return [
+            (
+                self._var_from_label(labels[i]),
+                reltype,
+                self._var_from_label(labels[i + 1])
+            ) for i, (_, reltype) in enumerate(self.full_path)
+        ]
+
+    def _connected(self, parent, reltype, child, time):
+        """Build condition that two nodes are connected at a time.
+
+        Relationships are recreated when a child comes back so the pair
+        may be connected by a different relationship than the one in p.
+
+        :param parent: Variable of the parent node
+        :type parent: str
+        :param reltype: Type of the relationship
+        :type reltype: str
+        :param child: Variable of the child node
+        :type child: str
+        :param time: Name of the time parameter
+        :type time: str
+        :returns: Condition
+        :rtype: str
+        """
+        return (
+            'ANY (x IN [({})-[y:{}]->({}) | y] '
+            'WHERE x.from <= ${} < x.to)'
+        ).format(parent, reltype, child, time)
+
+    def _base_wheres(self):
+        """Conditions shared by window queries.
+
+        :returns: List of conditions
+        :rtype: list
+        """
+        return [
+            '{}.{} = $identity'.format(
+                self._var_from_label(self.path[0]),
+                registry.identity_property(self.path[0])
+            ),
+            'ALL (r IN RELATIONSHIPS(p) WHERE r.from <= $t1 < r.to)'
+        ]
+
+    def _return_clause(self):
+        """Create the return clause of the query.
+
+        :returns: Return clause of the query
+        :rtype: str
+        """
+        return 'RETURN ' + ','.join(self.selects)
+
+    def _orderby_clause(self):
+        """Create the orderby clause of the query
+
+        :returns: Orderby clause of the query.
+        :rtype: str
+        """
+        return 'ORDER BY ' + ','.join(self.selects)
+
+
+class WindowSideQuery(WindowQuery):
+    """Find paths present at t1 but not t2 from changed relationships.
+
+    A relationship of the path present at t1 is missing at t2 only if it
+    ended in (t1, t2] when t1 < t2 or started in (t2, t1] when t2 < t1.
+
+    Example:
+    If your path is Environment->Host and t1 < t2
+
+    MATCH p = (environment:Environment)-[:HAS_HOST]->(host:Host)
+    WHERE
+        environment.uuid = $identity AND
+        ALL (r IN RELATIONSHIPS(p) WHERE r.from <= $t1 < r.to) AND
+        ANY (r IN RELATIONSHIPS(p) WHERE $t1 < r.to <= $t2) AND
+        NOT (
+            ANY (x IN [(environment)-[y:HAS_HOST]->(host) | y]
+                WHERE x.from <= $t2 < x.to)
+        )
+    """
+
+    def _changed(self):
+        """Build condition that a relationship of p is gone at t2.
+
+        :returns: Condition
+        :rtype: str
+        """
+        if self.t1 < self.t2:
+            window = '$t1 < r.to <= $t2'
+        else:
+            window = '$t2 < r.from <= $t1'
+        return 'ANY (r IN RELATIONSHIPS(p) WHERE {})'.format(window)
+
+    def _where_clause(self):
+        """Build the where clause.
+
+        :returns: Where clause
+        :rtype: str
+        """
+        wheres = self._base_wheres()
+        wheres.append(self._changed())
+        connected = [
+            self._connected(parent, reltype, child, 't2')
+            for parent, reltype, child in self._pairs()
+        ]
+        wheres.append('NOT ({})'.format(' AND '.join(connected)))
+        return 'WHERE ' + ' AND '.join(wheres)
+
+    def __str__(self):
+        """Combine clauses into a single query.
+
+        :returns: Combined clauses
+        :rtype: str
+        """
+        return "\n".join([
+            self._path_match(),
+            self._where_clause(),
+            self._return_clause(),
+            self._orderby_clause()
+        ])
+
+
+class WindowStateQuery(WindowQuery):
+    """Find paths present at both times whose end changed state.
+
+    The end node changed state exactly when its state at the later time
+    started inside the window.
+
+    Example:
+    If the path is Environment->Host
+
+    MATCH p = (environment:Environment)-[:HAS_HOST]->(host:Host)
+    MATCH (host)-[r_state:HAS_STATE]->(:HostState)
+    WHERE
+        environment.uuid = $identity AND
+        ALL (r IN RELATIONSHIPS(p) WHERE r.from <= $t1 < r.to) AND
+        $lo < r_state.from <= $hi < r_state.to AND
+        ANY (x IN [(host)-[y:HAS_STATE]->() | y]
+            WHERE x.from <= $lo < x.to) AND
+        ANY (x IN [(environment)-[y:HAS_HOST]->(host) | y]
+            WHERE x.from <= $t2 < x.to)
+    """
+
+    def _match_clause(self):
+        """Build the match clause.
+
+        :returns: Match clause
+        :rtype: str
+        """
+        return self._path_match() + (
+            '\nMATCH ({})-[r_state:HAS_STATE]->(:{}State)'.format(
+                self._var_from_label(self.end),
+                self.end
+            )
+        )
+
+    def _where_clause(self):
+        """Build the where clause.
+
+        :returns: Where clause
+        :rtype: str
+        """
+        end = self._var_from_label(self.end)
+        wheres = self._base_wheres()
+        wheres.append('$lo < r_state.from <= $hi < r_state.to')
+        wheres.append(
+            'ANY (x IN [({})-[y:HAS_STATE]->() | y] '
+            'WHERE x.from <= $lo < x.to)'.format(end)
+        )
+        for parent, reltype, child in self._pairs():
+            wheres.append(self._connected(parent, reltype, child, 't2'))
+        return 'WHERE ' + ' AND '.join(wheres)
+
+    def __str__(self):
+        """Combine all clauses into a single query.
+
+        :returns: Combined clauses
+        :rtype: str
+        """
+        return "\n".join([
+            self._match_clause(),
+            self._where_clause(),
+            self._return_clause(),
+            self._orderby_clause()
+        ])
+
+
 class Identity:
-    """Models entire identity of a node."""
+    """Models entire identity of a node.
+
+    Diffs may hold hundreds of thousands of identities so instances have
+    no __dict__, labels and properties are interned and the hash key is
+    built once.
+    """
+    __slots__ = ('label', 'prop', 'value', 'hash_key')
+
     def __init__(self, label, prop, identity):
         """Init the identity
 
@@ -378,24 +659,23 @@ class Identity:
         :param identity: Value of the identity property of the node
         :type identity: str
         """
-        self.label = var_to_model_map.get(label, label)
-        self.prop = prop
+        self.label = sys.intern(var_to_model_map.get(label, label))
+        self.prop = sys.intern(prop)
         self.value = identity
 
-    @property
-    def hash_key(self):
-        """Returns a key to use for hashmaps.
+        # Key is a 3 tuple with literals for label, prop, and value
+        self.hash_key = (self.label, self.prop, self.value)
 
-        Key is a 3 tuple with literals for value, prop, and value
 
-        :returns: Hashable tuple
-        :rtype: tuple
-        """
-        return (self.label, self.prop, self.value)
+class Node:
+    """Models a node in the diff graph.
 
+    Children are kept in a dict keyed by identity so rows can be fed in
+    any order at constant cost. They are only ordered when the node is
+    serialized, which happens once per computed diff.
+    """
+    __slots__ = ('identity', 'children', '_flags')
 
-class Node:
-    """Models a node in the diff graph."""
     def __init__(self, identity, flags=None):
         """Init the node
 
@@ -412,7 +692,19 @@ class Node:
         """
         self.identity = identity
         self.children = {}
-        self.flags = set(flags or [])
+        self._flags = _FLAG_SETS[frozenset()]
+        self.flag(flags or [])
+
+    @property
+    def flags(self):
+        """Get the flags of the node.
+
+        Nodes share one frozenset per distinct combination of flags.
+
+        :returns: Set of flags
+        :rtype: set
+        """
+        return set(self._flags)
 
     def flag(self, flags):
         """Set additional flags for the node.
@@ -422,8 +714,8 @@ class Node:
         """
         if not isinstance(flags, list):
             flags = [flags]
-        for flag in flags:
-            self.flags.add(flag)
+        flags = self._flags.union(flags)
+        self._flags = _FLAG_SETS.setdefault(flags, flags)
 
     def add_child(self, child_node):
         """Add a relationship from this node to a child node.
@@ -445,15 +737,32 @@ class Node:
         return {
             'model': self.identity.label,
             'id': self.identity.value,
-            'flags': list(self.flags),
+            'flags': sorted(self._flags),
             'children': [
-                c.to_dict() for c in sorted(
-                    self.children.values(),
-                    key=lambda x: x.identity.hash_key
-                )
+                self.children[key].to_dict() for key in sorted(self.children)
             ]
         }
 
+    def iter_json(self):
+        """Encode this node and its descendants as json.
+
+        Produces the same document as json encoding to_dict() without
+        building the intermediate dictionaries.
+
+        :yields: Chunks of the json document
+        :ytype: str
+        """
+        yield '{{"model":{},"id":{},"flags":{},"children":['.format(
+            json.dumps(self.identity.label),
+            json.dumps(self.identity.value),
+            json.dumps(sorted(self._flags))
+        )
+        for i, key in enumerate(sorted(self.children)):
+            if i:
+                yield ','
+            yield from self.children[key].iter_json()
+        yield ']}'
+
 
 class Diff:
     """Models a graph that is a diff of two objects."""
@@ -492,13 +801,12 @@ class Diff:
         # Iterate over each part of the row
         for label_dot_prop, value in row.items():
             count += 1
-            label, prop = label_dot_prop.split('.', 1)
-            identity = Identity(label, prop, value)
+            label, prop = _label_prop(label_dot_prop)
 
             # Check for existing node - create node if not existing
-            node = current.children.get(identity.hash_key)
+            node = current.children.get((label, prop, value))
             if node is None:
-                node = Node(identity)
+                node = Node(Identity(label, prop, value))
                 current.add_child(node)
 
             # Add flags to end node
@@ -517,6 +825,20 @@ class Diff:
         else:
             return {}
 
+    def to_json(self):
+        """Encode the diff structure as a json document.
+
+        Same document as json encoding to_dict(), written straight from
+        the tree.
+
+        :returns: Json document
+        :rtype: str
+        """
+        for node in self.children.values():
+            return ''.join(node.iter_json())
+        else:
+            return '{}'
+
     def __init__(self, model, identity, t1, t2):
         """Init the diff
 
@@ -535,22 +857,46 @@ class Diff:
         self.t2 = t2
 
         self.children = {}
+        self._lock = threading.Lock()
 
-        # Get list of paths
+        # Pick the queries of the configured diff engine
+        if getattr(settings, 'DIFF_ENGINE', 'paths') == 'window':
+            logger.warning('Using the experimental window diff engine.')
+            side_query, state_query = WindowSideQuery, WindowStateQuery
+        else:
+            side_query, state_query = DiffSideQuery, DiffStateQuery
+
+        # Build the queries for each path
+        jobs = []
         paths = registry.forest.paths_from(self.model)
         for p in paths:
-            q = DiffSideQuery(p, identity, (t1, t2))
-            for row in q.fetch_all():
-                self.feed(row, 't1')
+            jobs.append((side_query(p, identity, (t1, t2)), 't1'))
+            jobs.append((side_query(p, identity, (t2, t1)), 't2'))
+            if registry.state_properties(p[-1]):
+                jobs.append(
+                    (state_query(p, identity, (t1, t2)), ['t1', 't2'])
+                )
 
-            q = DiffSideQuery(p, identity, (t2, t1))
-            for row in q.fetch_all():
-                self.feed(row, 't2')
+        # Run the queries concurrently, each in its own session
+        workers = getattr(settings, 'DIFF_WORKERS', 4)
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = [
+                executor.submit(self._run, q, flags) for q, flags in jobs
+            ]
+            for future in futures:
+                future.result()
 
-            if registry.state_properties(p[-1]):
-                q = DiffStateQuery(p, identity, (t1, t2))
-                for row in q.fetch_all():
-                    self.feed(row, ['t1', 't2'])
+    def _run(self, query, flags):
+        """Feed every row of a diff query to the diff structure.
+
+        :param query: Diff query to run
+        :type query: DiffQuery
+        :param flags: Flags for the rows of the query
+        :type flags: str|list
+        """
+        for row in query.fetch_all():
+            with self._lock:
+                self.feed(row, flags)
 
 
 class NodeDiff(Query):
@@ -576,13 +922,45 @@ class NodeDiff(Query):
         self.node_t1 = self.node_at_time(self.t1)
         self.node_t2 = self.node_at_time(self.t2)
 
-    def to_list(self):
+    def resolve_blobs(self):
+        """Replace blob keys on both sides with blob values.
+
+        Keys from both sides are resolved with a single query. Blobs are
+        shared so unchanged values are only fetched once.
+        """
+        props = registry.blob_properties(self.model) or []
+        stored = [(p, BlobEntity.stored_property(p)) for p in props]
+
+        keys = set()
+        for node in (self.node_t1, self.node_t2):
+            for prop, key_prop in stored:
+                keys.add(node.get(key_prop))
+        keys.discard(None)
+        if not keys:
+            return
+
+        with get_connection().session() as session:
+            values = BlobEntity.fetch_many(session, keys)
+
+        for node in (self.node_t1, self.node_t2):
+            for prop, key_prop in stored:
+                key = node.pop(key_prop, None)
+                if key is not None:
+                    node[prop] = values.get(key)
+
+    def to_list(self, blobs=True):
         """Create a list of serialized properties.
 
+        :param blobs: Whether or not to resolve blob values.
+            Unresolved blob properties are listed by key.
+        :type blobs: bool
         :returns: List of properties. Each property is an object with:
             name, t1, and t2 where t1 and t2 are values at t1 and t2.
         :rtype: list
         """
+        if blobs:
+            self.resolve_blobs()
+
         result_list = []
 
         # Gather list of all properties and then sort by property name
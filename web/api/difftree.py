@@ -0,0 +1,173 @@
+"""Browse a computed diff one level at a time.
+
+A diff frame is the json document produced by Diff.to_json. Each node has
+a model, an id, flags and children. A node flagged only t1 was removed,
+only t2 was added and both t1 and t2 was changed. Nodes without flags
+are unchanged parents of changed nodes.
+"""
+import json
+import logging
+import threading
+
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Number of parsed frames kept per process
+TREE_CACHE_SIZE = 2
+
+_TREES = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def _kind(flags):
+    """Get the kind of change described by node flags.
+
+    :param flags: Flags of a node
+    :type flags: list
+    :returns: One of added, removed, changed or None
+    :rtype: str|None
+    """
+    flags = set(flags)
+    if flags == {'t1', 't2'}:
+        return 'changed'
+    if flags == {'t1'}:
+        return 'removed'
+    if flags == {'t2'}:
+        return 'added'
+    return None
+
+
+def _step(model, identity):
+    """Key a child by model and id.
+
+    :param model: Model of the child
+    :type model: str
+    :param identity: Id of the child
+    :type identity: str|int
+    :returns: Key of the child in its parent's index
+    :rtype: tuple
+    """
+    return (model, str(identity))
+
+
+def annotate(node):
+    """Add counts of changed nodes and an index of children to every subtree.
+
+    :param node: Root of a diff frame
+    :type node: dict
+    :returns: Counts of the subtree rooted at node
+    :rtype: dict
+    """
+    counts = {'added': 0, 'removed': 0, 'changed': 0}
+    kind = _kind(node.get('flags', []))
+    if kind is not None:
+        counts[kind] += 1
+    index = {}
+    for child in node.get('children', []):
+        index[_step(child['model'], child['id'])] = child
+        for kind, count in annotate(child).items():
+            counts[kind] += count
+    node['counts'] = counts
+    node['index'] = index
+    return counts
+
+
+def get(key):
+    """Get a parsed frame if this process has one.
+
+    :param key: Cache key of the frame
+    :type key: str
+    :returns: Annotated root node or None
+    :rtype: dict|None
+    """
+    with _LOCK:
+        tree = _TREES.get(key)
+        if tree is not None:
+            _TREES.move_to_end(key)
+        return tree
+
+
+def load(key, frame):
+    """Parse and annotate a frame, reusing recent results.
+
+    Frames are immutable once computed so parsed frames are kept per
+    process by cache key.
+
+    :param key: Cache key of the frame
+    :type key: str
+    :param frame: Json document or dict of a computed diff
+    :type frame: str|dict
+    :returns: Annotated root node. Empty dict for empty diffs
+    :rtype: dict
+    """
+    tree = get(key)
+    if tree is not None:
+        return tree
+
+    if isinstance(frame, str):
+        tree = json.loads(frame)
+    else:
+        tree = frame
+    if tree:
+        annotate(tree)
+
+    with _LOCK:
+        _TREES[key] = tree
+        while len(_TREES) > TREE_CACHE_SIZE:
+            _TREES.popitem(last=False)
+    return tree
+
+
+def find(tree, path):
+    """Find the node at the end of a path.
+
+    :param tree: Annotated root node
+    :type tree: dict
+    :param path: List of {'model', 'id'} dicts from below the root
+    :type path: list
+    :returns: Node at the end of the path or None
+    :rtype: dict|None
+    """
+    if not tree:
+        return None
+    current = tree
+    for step in path:
+        current = current['index'].get(_step(step['model'], step['id']))
+        if current is None:
+            return None
+    return current
+
+
+def summary(node):
+    """Describe a node without its children.
+
+    :param node: Annotated node
+    :type node: dict
+    :returns: Summary of the node
+    :rtype: dict
+    """
+    return {
+        'model': node['model'],
+        'id': node['id'],
+        'flags': node['flags'],
+        'counts': node['counts'],
+        'child_count': len(node.get('children', []))
+    }
+
+
+def page(node, page=1, pagesize=100):
+    """Get one page of summaries of the children of a node.
+
+    :param node: Annotated node
+    :type node: dict
+    :param page: Page number starting at 1
+    :type page: int
+    :param pagesize: Children per page
+    :type pagesize: int
+    :returns: List of child summaries
+    :rtype: list
+    """
+    start = (page - 1) * pagesize
+    children = node.get('children', [])[start:start + pagesize]
+    return [summary(c) for c in children]
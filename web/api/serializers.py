@@ -4,6 +4,7 @@ from cloud_snitch.models import registry
 from common.serializers import FilterSerializer
 from common.serializers import OrderSerializer
 from rest_framework.serializers import BaseSerializer
+from rest_framework.serializers import BooleanField
 from rest_framework.serializers import Serializer
 from rest_framework.serializers import ChoiceField
 from rest_framework.serializers import CharField
@@ -85,6 +86,7 @@ class SearchSerializer(Serializer):
     page = IntegerField(min_value=0, required=False, default=1)
     pagesize = IntegerField(min_value=1, required=False, default=500)
     index = IntegerField(min_value=0, required=False)
+    blobs = BooleanField(required=False, default=False)
 
     def validate(self, data):
         model_set = set([t[0] for t in registry.path(data['model'])])
@@ -122,3 +124,22 @@ class DiffSerializer(Serializer):
     identity = CharField(max_length=256, required=True)
     left_time = IntegerField(min_value=0, required=True)
     right_time = IntegerField(min_value=0, required=True)
+    blobs = BooleanField(required=False, default=False)
+
+
+class DiffPathSerializer(Serializer):
+    """Serializer for one step of a path into a diff tree."""
+    model = ChoiceField([m.label for m in registry.models.values()])
+    id = CharField(max_length=256, required=True)
+
+
+class DiffTreeSerializer(DiffSerializer):
+    """Serializer for requesting one level of a diff tree."""
+    path = ListField(child=DiffPathSerializer(), required=False, default=[])
+    page = IntegerField(min_value=1, required=False, default=1)
+    pagesize = IntegerField(
+        min_value=1,
+        max_value=1000,
+        required=False,
+        default=100
+    )
@@ -0,0 +1,290 @@
+"""Coalesce identical concurrent computations.
+
+A caller that misses the cache takes a lease on the key with the atomic
+cache.add. Only the lease holder computes the value. Other callers poll
+the cache until the value appears or the lease goes away, in which case
+one of them takes over. Waiters never compute while the lease is held.
+
+Values too large to keep in the cache are handed to the callers waiting
+on the same lease through a result key named after the lease token. It
+expires shortly after the holder finishes, so callers arriving later
+compute again instead of reading it.
+
+Holders renew their lease while they compute so long computations keep
+it. Leases still expire when a holder dies so a crashed holder can not
+block a key forever. Leases carry a random token and are only renewed or
+released by the holder of that token. With django-redis both are a single
+compare-and-set script. Other backends fall back to a check and set under
+a process lock, which is enough for caches local to a process.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+from .exceptions import JobRunningError
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a lease expires unless renewed
+LEASE_TIMEOUT = 60
+
+# Seconds a caller waits on another holder before giving up
+WAIT_TIMEOUT = 30
+
+# Seconds between polls of the cache while waiting
+POLL_INTERVAL = 0.05
+
+# Seconds waiters have to pick up a value that is not kept
+HANDOFF_TIMEOUT = 5
+
+# Delete the lease if it still holds the token
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Extend the lease if it still holds the token
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_LOCK = threading.Lock()
+
+
+def lease_key(key):
+    """Get the cache key of the lease on a key.
+
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :returns: Cache key of the lease
+    :rtype: str
+    """
+    return 'lease-{}'.format(key)
+
+
+def result_key(key, token):
+    """Get the cache key a lease holder hands a value off with.
+
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :param token: Token of the lease
+    :type token: str
+    :returns: Cache key of the handed off value
+    :rtype: str
+    """
+    return 'result-{}-{}'.format(key, token)
+
+
+def _redis_client():
+    """Get the django-redis client of the cache if there is one.
+
+    :returns: django-redis client or None for other backends
+    :rtype: django_redis.client.DefaultClient|None
+    """
+    client = getattr(cache, 'client', None)
+    if client is None or not hasattr(client, 'get_client'):
+        return None
+    return client
+
+
+def _compare_and(script, key, token, *args):
+    """Run a script on the lease of a key if it holds a token.
+
+    :param script: Lua script taking the lease key and token
+    :type script: str
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :param token: Token returned by acquire
+    :type token: str
+    :returns: Result of the script
+    :rtype: int
+    """
+    client = _redis_client()
+    return client.get_client(write=True).eval(
+        script,
+        1,
+        client.make_key(lease_key(key)),
+        client.encode(token),
+        *args
+    )
+
+
+def acquire(key, timeout=LEASE_TIMEOUT):
+    """Try to take the lease on a key.
+
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :param timeout: Seconds before the lease expires
+    :type timeout: int
+    :returns: Lease token or None if the lease is held elsewhere
+    :rtype: str|None
+    """
+    token = uuid.uuid4().hex
+    if cache.add(lease_key(key), token, timeout):
+        return token
+    return None
+
+
+def renew(key, token, timeout=LEASE_TIMEOUT):
+    """Extend a lease if it is still held with token.
+
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :param token: Token returned by acquire
+    :type token: str
+    :param timeout: Seconds from now before the lease expires
+    :type timeout: int
+    :returns: Whether the lease is still held
+    :rtype: bool
+    """
+    if _redis_client() is not None:
+        return bool(_compare_and(RENEW_SCRIPT, key, token, int(timeout)))
+    with _LOCK:
+        if cache.get(lease_key(key)) != token:
+            return False
+        cache.set(lease_key(key), token, timeout)
+        return True
+
+
+def release(key, token):
+    """Release a lease if it is still held with token.
+
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :param token: Token returned by acquire
+    :type token: str
+    """
+    if _redis_client() is not None:
+        _compare_and(RELEASE_SCRIPT, key, token)
+        return
+    with _LOCK:
+        if cache.get(lease_key(key)) == token:
+            cache.delete(lease_key(key))
+
+
+def _heartbeat(key, token, timeout, stop):
+    """Renew a lease until stopped or lost.
+
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :param token: Token returned by acquire
+    :type token: str
+    :param timeout: Seconds before the lease expires
+    :type timeout: int
+    :param stop: Event set when the holder is done
+    :type stop: threading.Event
+    """
+    while not stop.wait(timeout / 3.0):
+        if not renew(key, token, timeout):
+            logger.warning('Lost lease on {}'.format(key))
+            return
+
+
+def compute(key, token, func, timeout, lease_timeout=LEASE_TIMEOUT,
+            keep=None):
+    """Compute and cache a value under a lease, then release the lease.
+
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :param token: Token returned by acquire
+    :type token: str
+    :param func: Callable computing the value
+    :type func: callable
+    :param timeout: TTL of the value in seconds
+    :type timeout: int
+    :param lease_timeout: Seconds before the lease expires unless renewed
+    :type lease_timeout: int
+    :param keep: Callable telling if a value may be cached. Values that
+        are not kept are only handed to callers waiting on this lease.
+    :type keep: callable|None
+    :returns: Computed value
+    :rtype: object
+    """
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=_heartbeat,
+        args=(key, token, lease_timeout, stop),
+        daemon=True
+    )
+    thread.start()
+    try:
+        value = func()
+        if keep is None or keep(value):
+            cache.set(key, value, timeout)
+        else:
+            cache.set(result_key(key, token), value, HANDOFF_TIMEOUT)
+        return value
+    finally:
+        stop.set()
+        release(key, token)
+
+
+def run(key, func, timeout, lease_timeout=LEASE_TIMEOUT, wait_timeout=None,
+        poll=POLL_INTERVAL, keep=None):
+    """Get a cached value, computing it at most once across callers.
+
+    Callers that find the lease held wait for the value, or for the value
+    handed off by that holder if it is not kept. If the lease goes away
+    without a value, because the holder failed or died, one of the waiters
+    takes over.
+
+    :param key: Cache key of the value
+    :type key: str|bytes
+    :param func: Callable computing the value
+    :type func: callable
+    :param timeout: TTL of the value in seconds
+    :type timeout: int
+    :param lease_timeout: Seconds before the lease expires unless renewed
+    :type lease_timeout: int
+    :param wait_timeout: Seconds to wait on another holder. None waits for
+        as long as the lease is held.
+    :type wait_timeout: float|None
+    :param poll: Seconds between polls while waiting
+    :type poll: float
+    :param keep: Callable telling if a value may be cached
+    :type keep: callable|None
+    :returns: Cached or computed value
+    :rtype: object
+    :raises: JobRunningError if wait_timeout passes while the lease is held
+    """
+    deadline = None
+    if wait_timeout is not None:
+        deadline = time.monotonic() + wait_timeout
+    holder = None
+    while True:
+        value = cache.get(key)
+        if value is not None:
+            logger.debug("CACHE HIT")
+            return value
+
+        if holder is not None:
+            value = cache.get(result_key(key, holder))
+            if value is not None:
+                logger.debug("HANDOFF HIT")
+                return value
+
+        token = acquire(key, lease_timeout)
+        if token is not None:
+            # The previous holder may have finished since the miss.
+            value = cache.get(key)
+            if value is not None:
+                release(key, token)
+                return value
+            logger.debug("CACHE MISS")
+            return compute(key, token, func, timeout, lease_timeout, keep)
+
+        # Remember the holder to pick up a value it does not keep.
+        holder = cache.get(lease_key(key)) or holder
+
+        if deadline is not None and time.monotonic() >= deadline:
+            logger.info('Still waiting on lease for {}'.format(key))
+            raise JobRunningError()
+        time.sleep(poll)
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, unicode_literals
 
+import importlib
 import logging
 
 from celery import shared_task
@@ -55,8 +56,8 @@ def _diffdict(model, identity, left_time, right_time):
     :type left_time: int
     :param right_time: Milliseconds since epoch on right side
     :type right_time: int
-    :returns: Result of diff operation
-    :rtype: dict
+    :returns: Result of diff operation as a json document
+    :rtype: str
     """
     # Mark the diff as running to prevent multiple requests from sechduling
     # the same job.
@@ -65,7 +66,7 @@ def _diffdict(model, identity, left_time, right_time):
     # Compute the diff.
     try:
         d = Diff(model, identity, left_time, right_time)
-        r = d.to_dict()
+        r = d.to_json()
         cache.set(key, r, TIMEOUT)
         return r
     except Exception as e:
@@ -84,21 +85,24 @@ def objectdiff(model, identity, left_time, right_time):
     :type left_time: int
     :param right_time: Milliseconds since epoch on right side
     :type right_time: int
-    :returns: Result of cached diff operation
-    :rtype: dict
+    :returns: Result of cached diff operation. Either a json document
+        or, for results cached by earlier versions, a dict.
+    :rtype: str|dict
     """
     # Try to get from cache first
     key = _diff_cache_key(model, identity, left_time, right_time)
     logger.debug("Looking up cache with key: {}".format(key))
     cached = cache.get(key)
 
+    # Mark the job as running. Only the caller that sets the mark
+    # schedules the task.
+    if cached is None and not cache.add(key, STATUS_RUNNING, TIMEOUT):
+        cached = cache.get(key) or STATUS_RUNNING
+
     # If cached is none - Schedule the task
     if cached is None:
         logger.debug("CACHE MISS")
         try:
-            # Set the key to prevent multiple same jobs.
-            cache.set(key, STATUS_RUNNING, TIMEOUT)
-
             # Schedule the task
             task = _diffdict.delay(model, identity, left_time, right_time)
 
@@ -123,3 +127,31 @@ def objectdiff(model, identity, left_time, right_time):
     else:
         logger.debug("CACHE HIT")
         return cached
+
+
+@shared_task
+def refresh_cached_result(path, args, kwargs, token):
+    """Asynchronous task recomputing a stale cached result.
+
+    :param path: Module and qualified name of a function decorated with
+        cached_result or cls_cached_result
+    :type path: str
+    :param args: Positional arguments of the call without the instance
+    :type args: list
+    :param kwargs: Keyword arguments of the call
+    :type kwargs: dict
+    :param token: Token of the lease taken on the cache key
+    :type token: str
+    """
+    module_name, qualname = path.split(':')
+    owner = importlib.import_module(module_name)
+    names = qualname.split('.')
+    for name in names[:-1]:
+        owner = getattr(owner, name)
+    func = getattr(owner, names[-1])
+
+    # Methods are called on a fresh instance of their class.
+    args = tuple(args)
+    if isinstance(owner, type):
+        args = (owner(),) + args
+    func.refresh(args, kwargs, token)
@@ -6,15 +6,33 @@ from django.core.cache.backends.locmem import LocMemCache
 from django.test import tag, TestCase
 
 from api.cache import cache_key
-from api import decorators
+from api import singleflight
+from api import tasks
 from api.decorators import cached_result
 from api.decorators import cls_cached_result
 
+import mock
 from mock import patch
 
 
 logging.getLogger('api.decorators').setLevel(logging.ERROR)
 
+# Calls of the stale functions. Refresh tasks find them by name.
+STALE_CALLS = []
+
+
+@cached_result(prefix='stale', timeout=1, stale=60)
+def stale_func(arg):
+    STALE_CALLS.append(arg)
+    return len(STALE_CALLS)
+
+
+class StaleObject:
+    @cls_cached_result(prefix='stale_method', timeout=1, stale=60)
+    def stale_method(self, arg):
+        STALE_CALLS.append(arg)
+        return len(STALE_CALLS)
+
 
 class TestCacheKey(TestCase):
 
@@ -44,7 +62,7 @@ class BaseCacheCase(TestCase):
     def setUp(self):
         self.locmem_cache = LocMemCache('default', {})
         self.locmem_cache.clear()
-        self.patch = patch.object(decorators, 'cache', self.locmem_cache)
+        self.patch = patch.object(singleflight, 'cache', self.locmem_cache)
         self.patch.start()
 
     def tearDown(self):
@@ -115,3 +133,74 @@ class TestClsCachedResult(BaseCacheCase):
         time.sleep(2)
         v2 = obj.test_func('arg1', 'arg2')
         self.assertNotEquals(v1, v2)
+
+
+class TestStaleCachedResult(BaseCacheCase):
+    def setUp(self):
+        super(TestStaleCachedResult, self).setUp()
+        STALE_CALLS.clear()
+        self.delay = patch.object(
+            tasks.refresh_cached_result,
+            'delay',
+            side_effect=tasks.refresh_cached_result
+        )
+        self.m_delay = self.delay.start()
+
+    def tearDown(self):
+        self.delay.stop()
+        super(TestStaleCachedResult, self).tearDown()
+
+    @tag('unit')
+    def test_stale(self):
+        """Test stale values are served while a task refreshes them."""
+        self.assertEquals(stale_func('a'), 1)
+        time.sleep(1.1)
+        self.assertEquals(stale_func('a'), 1)
+        self.m_delay.assert_called_once_with(
+            'api.tests.test_cache:stale_func',
+            ['a'],
+            {},
+            mock.ANY
+        )
+        self.assertEquals(stale_func('a'), 2)
+        self.assertEquals(len(STALE_CALLS), 2)
+        key = cache_key(('a',), {}, prefix='stale')
+        self.assertIsNone(
+            self.locmem_cache.get(singleflight.lease_key(key))
+        )
+
+    @tag('unit')
+    def test_stale_method(self):
+        """Test stale method values are refreshed on a new instance."""
+        obj = StaleObject()
+        self.assertEquals(obj.stale_method('a'), 1)
+        time.sleep(1.1)
+        self.assertEquals(obj.stale_method('a'), 1)
+        self.assertEquals(obj.stale_method('a'), 2)
+
+    @tag('unit')
+    def test_pending_refresh(self):
+        """Test stale hits schedule nothing while a refresh is pending."""
+        self.assertEquals(stale_func('b'), 1)
+        time.sleep(1.1)
+        key = cache_key(('b',), {}, prefix='stale')
+        singleflight.acquire(key)
+        self.assertEquals(stale_func('b'), 1)
+        self.assertFalse(self.m_delay.called)
+
+    @tag('unit')
+    def test_expired_lease(self):
+        """Test refreshes whose lease expired before they ran do nothing."""
+        self.assertEquals(stale_func('c'), 1)
+        stale_func.refresh(('c',), {}, 'expired')
+        self.assertEquals(len(STALE_CALLS), 1)
+
+    @tag('unit')
+    def test_legacy(self):
+        """Test values cached without an entry are returned as is."""
+        @cached_result(prefix='legacy')
+        def test_func():
+            return 'computed'
+        key = cache_key((), {}, prefix='legacy')
+        self.locmem_cache.set(key, 'cached', 60)
+        self.assertEquals(test_func(), 'cached')
@@ -1,6 +1,8 @@
+import json
 import mock
 
 from django.test import TestCase
+from django.test import override_settings
 from django.test import tag
 
 from cloud_snitch.models import registry
@@ -13,6 +15,8 @@ from api.diff import DiffStateQuery
 from api.diff import Identity
 from api.diff import Node
 from api.diff import NodeDiff
+from api.diff import WindowSideQuery
+from api.diff import WindowStateQuery
 
 
 class TestIdentity(TestCase):
@@ -95,6 +99,38 @@ class TestNode(TestCase):
         self.assertEqual(c['id'], 'some_host')
         self.assertEqual(len(c['flags']), 0)
 
+    @tag('unit')
+    def test_compact(self):
+        """Test nodes and identities are compact."""
+        i = Identity('environment', 'uuid', 'someid')
+        n = Node(i, flags=['t1'])
+        self.assertFalse(hasattr(i, '__dict__'))
+        self.assertFalse(hasattr(n, '__dict__'))
+        self.assertEqual(i.hash_key, ('Environment', 'uuid', 'someid'))
+        self.assertTrue(i.hash_key is i.hash_key)
+
+        # Equal flag sets are shared
+        other = Node(Identity('host', 'hostname', 'h'), flags=['t1'])
+        self.assertTrue(n._flags is other._flags)
+
+    @tag('unit')
+    def test_iter_json(self):
+        """Test streamed json matches json of the dict representation."""
+        root = Node(Identity('environment', 'uuid', 'e\u00e9'))
+        for i, flags in enumerate([['t2'], ['t1', 't2'], []]):
+            child = Node(Identity('host', 'hostname', 'h{}'.format(2 - i)))
+            child.flag(flags)
+            child.add_child(Node(Identity('apt', 'name', i), flags=['t1']))
+            root.add_child(child)
+        self.assertEqual(
+            json.loads(''.join(root.iter_json())),
+            root.to_dict()
+        )
+        self.assertEqual(
+            [c['id'] for c in root.to_dict()['children']],
+            ['h0', 'h1', 'h2']
+        )
+
 
 class TestDiffQuery(TestCase):
     @tag('unit')
@@ -118,17 +154,22 @@ class TestDiffQuery(TestCase):
         self.assertEqual(q.selects[2], 'aptpackage.name_version')
 
     @tag('unit')
-    @mock.patch('api.diff.DiffQuery.fetch', side_effect=[[1], [2, 3], []])
-    def test_fetch_all(self, m_fetch):
-        """Test that looping stops on empty results."""
-        results = []
-        p = ['Environment', 'Host', 'AptPackage']
-        q = DiffQuery(p, 'someid', (0, 1))
-        for result in q.fetch_all():
-            results.append(result)
-        self.assertEqual(results[0], 1)
-        self.assertEqual(results[1], 2)
-        self.assertEqual(results[2], 3)
+    @mock.patch('api.diff.DiffQuery._stream')
+    def test_fetch_all(self, m_stream):
+        """Test that all results stream from a single query."""
+        p = ['Environment', 'Host']
+        m_stream.return_value = iter([
+            {'environment.uuid': 'e', 'host.hostname_environment': 'h1'},
+            {'environment.uuid': 'e', 'host.hostname_environment': 'h2'}
+        ])
+        q = DiffSideQuery(p, 'someid', (0, 1))
+        results = list(q.fetch_all())
+        m_stream.assert_called_once_with(str(q))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(
+            list(results[1].items()),
+            [('environment.uuid', 'e'), ('host.hostname_environment', 'h2')]
+        )
 
 
 class TestDiffSideQuery(TestCase):
@@ -218,6 +259,58 @@ class TestDiffStateQuery(TestCase):
         self.assertEqual(q.params['identity'], 'syncuuidtest')
 
 
+class TestWindowSideQuery(TestCase):
+    """Tests the change window side query class."""
+
+    @tag('unit')
+    def test_query_generation(self):
+        q = WindowSideQuery(['Environment', 'Host'], 'syncuuidtest', (5, 1))
+        expected = (
+            "MATCH p = (environment:Environment)-[:HAS_HOST]->(host:Host)"
+            "\nWHERE environment.uuid = $identity AND "
+            "ALL (r IN RELATIONSHIPS(p) WHERE r.from <= $t1 < r.to) AND "
+            "ANY (r IN RELATIONSHIPS(p) WHERE $t2 < r.from <= $t1) AND "
+            "NOT (ANY (x IN [(environment)-[y:HAS_HOST]->(host) | y] "
+            "WHERE x.from <= $t2 < x.to))"
+            "\nRETURN environment.uuid,host.hostname_environment"
+            "\nORDER BY environment.uuid,host.hostname_environment"
+        )
+        self.assertEqual(str(q), expected)
+        self.assertEqual(q.params['lo'], 1)
+        self.assertEqual(q.params['hi'], 5)
+
+    @tag('unit')
+    def test_changed_forward(self):
+        """Test paths gone at a later t2 look for ended relationships."""
+        q = WindowSideQuery(['Environment', 'Host'], 'syncuuidtest', (1, 5))
+        self.assertEqual(
+            q._changed(),
+            'ANY (r IN RELATIONSHIPS(p) WHERE $t1 < r.to <= $t2)'
+        )
+
+
+class TestWindowStateQuery(TestCase):
+    """Tests the change window state query class."""
+
+    @tag('unit')
+    def test_query_generation(self):
+        q = WindowStateQuery(['Environment', 'Host'], 'syncuuidtest', (0, 1))
+        expected = (
+            "MATCH p = (environment:Environment)-[:HAS_HOST]->(host:Host)"
+            "\nMATCH (host)-[r_state:HAS_STATE]->(:HostState)"
+            "\nWHERE environment.uuid = $identity AND "
+            "ALL (r IN RELATIONSHIPS(p) WHERE r.from <= $t1 < r.to) AND "
+            "$lo < r_state.from <= $hi < r_state.to AND "
+            "ANY (x IN [(host)-[y:HAS_STATE]->() | y] "
+            "WHERE x.from <= $lo < x.to) AND "
+            "ANY (x IN [(environment)-[y:HAS_HOST]->(host) | y] "
+            "WHERE x.from <= $t2 < x.to)"
+            "\nRETURN environment.uuid,host.hostname_environment"
+            "\nORDER BY environment.uuid,host.hostname_environment"
+        )
+        self.assertEqual(str(q), expected)
+
+
 class TestDiff(TestCase):
     """Test the diff class."""
 
@@ -254,6 +347,83 @@ class TestDiff(TestCase):
             path = call[0][0]
             self.assertFalse(path[-1] in stateless)
 
+    @tag('unit')
+    @override_settings(DIFF_ENGINE='window')
+    @mock.patch('api.diff.WindowSideQuery')
+    @mock.patch('api.diff.WindowStateQuery')
+    @mock.patch('api.diff.DiffSideQuery')
+    @mock.patch('api.diff.DiffStateQuery')
+    def test_window_engine(self, m_state, m_side, m_wstate, m_wside):
+        """Test the window engine queries are used when configured."""
+        Diff('Environment', 'someid', 0, 1)
+        self.assertFalse(m_side.called)
+        self.assertFalse(m_state.called)
+        self.assertTrue(m_wside.called)
+        self.assertTrue(m_wstate.called)
+
+    @tag('unit')
+    def test_engines_build_same_tree(self):
+        """Test both engines build the same tree from the same results.
+
+        Each job of one engine is answered with the rows its counterpart
+        in the other engine would match.
+        """
+        def rows(query):
+            kind = 'state' if 'HAS_STATE' in str(query) else 'side'
+            if query.path != ['Environment', 'Host']:
+                return iter([])
+            row = OrderedDict()
+            row['environment.uuid'] = query.identity
+            row['host.hostname_environment'] = '{}{}'.format(
+                kind,
+                query.t1
+            )
+            return iter([row])
+
+        trees = {}
+        for engine in ('paths', 'window'):
+            with override_settings(DIFF_ENGINE=engine), \
+                    mock.patch.object(DiffQuery, 'fetch_all', rows):
+                d = Diff('Environment', 'someid', 0, 1)
+            trees[engine] = d.to_dict()
+        self.assertEqual(trees['paths'], trees['window'])
+
+        hosts = {
+            c['id']: c['flags'] for c in trees['window']['children']
+        }
+        self.assertEqual(hosts, {
+            'side0': ['t1'],
+            'side1': ['t2'],
+            'state0': ['t1', 't2']
+        })
+
+    @tag('unit')
+    @override_settings(DIFF_WORKERS=3)
+    @mock.patch('api.diff.DiffSideQuery')
+    @mock.patch('api.diff.DiffStateQuery')
+    def test_concurrent_feed(self, m_state, m_side):
+        """Test rows from concurrent queries are merged into one tree."""
+        def rows(path, identity, times):
+            q = mock.Mock()
+            if path != ['Environment', 'Host']:
+                q.fetch_all.return_value = iter([])
+                return q
+            row = OrderedDict()
+            row['environment.uuid'] = identity
+            row['host.hostname_environment'] = 'h{}'.format(times[0])
+            q.fetch_all.return_value = iter([row])
+            return q
+
+        m_side.side_effect = rows
+        m_state.side_effect = rows
+        d = Diff('Environment', 'someid', 0, 1)
+
+        env = d.children[('Environment', 'uuid', 'someid')]
+        h0 = env.children[('Host', 'hostname_environment', 'h0')]
+        h1 = env.children[('Host', 'hostname_environment', 'h1')]
+        self.assertEqual(h0.flags, set(['t1', 't2']))
+        self.assertEqual(h1.flags, set(['t2']))
+
     @tag('unit')
     @mock.patch('api.diff.DiffSideQuery')
     @mock.patch('api.diff.DiffStateQuery')
@@ -287,6 +457,7 @@ class TestDiff(TestCase):
         row['aptpackage.name_version'] = 'a_name'
 
         d.feed(row, ['t1'])
+        self.assertEqual(json.loads(d.to_json()), d.to_dict())
         current = d.children[('Environment', 'uuid', 'e_uuid')]
         self.assertEqual(current.identity.label, 'Environment')
         self.assertEqual(current.identity.prop, 'uuid')
@@ -398,3 +569,26 @@ class TestNodeDiff(TestCase):
             "n.hostname_environment = $identity RETURN n,ns LIMIT 1"
         )
         self.assertEqual(expected, m_fetch.call_args_list[0][0][0])
+
+    @tag('unit')
+    @mock.patch('api.diff.get_connection')
+    @mock.patch('api.diff.BlobEntity.fetch_many')
+    @mock.patch('api.diff.NodeDiff.node_at_time')
+    def test_to_list_blobs(self, m_node_at_time, m_fetch_many, m_conn):
+        """Test blob keys of both sides are resolved in one fetch."""
+        m_node_at_time.side_effect = [
+            {'name': 'a', 'contents_blob': 'k1'},
+            {'name': 'a', 'contents_blob': 'k2'}
+        ]
+        m_fetch_many.return_value = {'k1': 'one', 'k2': 'two'}
+        d = NodeDiff('Configfile', 'someid', 0, 1)
+        d_list = d.to_list()
+        self.assertEqual(m_fetch_many.call_count, 1)
+        self.assertEqual(
+            set(m_fetch_many.call_args[0][1]),
+            set(['k1', 'k2'])
+        )
+        self.assertEqual(d_list[0]['name'], 'contents')
+        self.assertEqual(d_list[0]['t1'], 'one')
+        self.assertEqual(d_list[0]['t2'], 'two')
+        self.assertEqual(len(d_list), 2)
@@ -0,0 +1,87 @@
+import json
+
+from django.test import tag, TestCase
+
+from api import difftree
+
+
+def _node(model, id, flags=None, children=None):
+    return {
+        'model': model,
+        'id': id,
+        'flags': flags or [],
+        'children': children or []
+    }
+
+
+FRAME = _node('Environment', 'env', children=[
+    _node('Host', 'a', children=[
+        _node('AptPackage', 'p1', ['t1']),
+        _node('AptPackage', 'p2', ['t2']),
+        _node('AptPackage', 'p3', ['t1', 't2'])
+    ]),
+    _node('Host', 'b', ['t2'])
+])
+
+
+class TestDiffTree(TestCase):
+
+    def setUp(self):
+        difftree._TREES.clear()
+        self.tree = difftree.load('key', json.dumps(FRAME))
+
+    @tag('unit')
+    def test_counts(self):
+        """Test subtree counts include the node itself."""
+        self.assertEqual(
+            self.tree['counts'],
+            {'added': 2, 'removed': 1, 'changed': 1}
+        )
+        host = difftree.find(self.tree, [{'model': 'Host', 'id': 'b'}])
+        self.assertEqual(
+            host['counts'],
+            {'added': 1, 'removed': 0, 'changed': 0}
+        )
+
+    @tag('unit')
+    def test_load_cached(self):
+        """Test parsed frames are reused and bounded."""
+        self.assertTrue(difftree.load('key', '{}') is self.tree)
+        self.assertEqual(difftree.load('other', {}), {})
+        difftree.load('third', '{}')
+        self.assertEqual(len(difftree._TREES), difftree.TREE_CACHE_SIZE)
+        self.assertFalse('key' in difftree._TREES)
+
+    @tag('unit')
+    def test_find(self):
+        self.assertTrue(difftree.find(self.tree, []) is self.tree)
+        node = difftree.find(self.tree, [
+            {'model': 'Host', 'id': 'a'},
+            {'model': 'AptPackage', 'id': 'p3'}
+        ])
+        self.assertEqual(node['id'], 'p3')
+        self.assertIsNone(
+            difftree.find(self.tree, [{'model': 'Host', 'id': 'c'}])
+        )
+        self.assertIsNone(difftree.find({}, []))
+
+    @tag('unit')
+    def test_index(self):
+        """Test children are indexed by model and id."""
+        self.assertEqual(
+            sorted(self.tree['index']),
+            [('Host', 'a'), ('Host', 'b')]
+        )
+        self.assertFalse('index' in difftree.summary(self.tree))
+        self.assertIsNone(difftree.get('missing'))
+        self.assertTrue(difftree.get('key') is self.tree)
+
+    @tag('unit')
+    def test_page(self):
+        host = difftree.find(self.tree, [{'model': 'Host', 'id': 'a'}])
+        self.assertEqual(difftree.summary(host)['child_count'], 3)
+        children = difftree.page(host, page=2, pagesize=2)
+        self.assertEqual(len(children), 1)
+        self.assertEqual(children[0]['id'], 'p3')
+        self.assertFalse('children' in children[0])
+        self.assertEqual(difftree.page(host, page=3, pagesize=2), [])
@@ -0,0 +1,192 @@
+import logging
+import threading
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import tag, TestCase
+
+from api import singleflight
+from api.exceptions import JobRunningError
+
+import mock
+from mock import patch
+
+
+logging.getLogger('api.singleflight').setLevel(logging.ERROR)
+
+
+class TestSingleFlight(TestCase):
+
+    def setUp(self):
+        self.locmem_cache = LocMemCache('default', {})
+        self.locmem_cache.clear()
+        self.patch = patch.object(singleflight, 'cache', self.locmem_cache)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+
+    @tag('unit')
+    def test_lease(self):
+        """Test leases are exclusive and released only by their holder."""
+        token = singleflight.acquire('key')
+        self.assertIsNotNone(token)
+        self.assertIsNone(singleflight.acquire('key'))
+        singleflight.release('key', 'other')
+        self.assertIsNone(singleflight.acquire('key'))
+        singleflight.release('key', token)
+        self.assertIsNotNone(singleflight.acquire('key'))
+
+    @tag('unit')
+    def test_coalesced(self):
+        """Test concurrent callers compute once and share the value."""
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+
+        def call():
+            results.append(singleflight.run('key', compute, 60, poll=0.01))
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    @tag('unit')
+    def test_failed_holder(self):
+        """Test the lease is released when the holder fails."""
+        def fail():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            singleflight.run('key', fail, 60)
+        self.assertEqual(singleflight.run('key', lambda: 'value', 60), 'value')
+
+    @tag('unit')
+    def test_wait_timeout(self):
+        """Test waiters give up without computing while a lease is held."""
+        singleflight.acquire('key')
+        compute = mock.Mock(return_value='value')
+        with self.assertRaises(JobRunningError):
+            singleflight.run(
+                'key',
+                compute,
+                60,
+                wait_timeout=0.05,
+                poll=0.01
+            )
+        self.assertFalse(compute.called)
+
+    @tag('unit')
+    def test_take_over(self):
+        """Test a waiter computes once the lease goes away."""
+        token = singleflight.acquire('key')
+        timer = threading.Timer(
+            0.05,
+            singleflight.release,
+            args=('key', token)
+        )
+        timer.start()
+        value = singleflight.run('key', lambda: 'value', 60, poll=0.01)
+        timer.join()
+        self.assertEqual(value, 'value')
+
+    @tag('unit')
+    def test_renew(self):
+        """Test holders keep their lease past its timeout."""
+        def compute():
+            time.sleep(0.5)
+            self.assertIsNone(singleflight.acquire('key'))
+            return 'value'
+
+        value = singleflight.run('key', compute, 60, lease_timeout=0.2)
+        self.assertEqual(value, 'value')
+        self.assertFalse(singleflight.renew('key', 'other'))
+
+    @tag('unit')
+    def test_keep(self):
+        """Test values that are not kept are not cached."""
+        value = singleflight.run('key', lambda: 'value', 60, keep=bool)
+        self.assertEqual(self.locmem_cache.get('key'), 'value')
+        value = singleflight.run('other', lambda: 'big', 60, keep=lambda v: 0)
+        self.assertEqual(value, 'big')
+        self.assertIsNone(self.locmem_cache.get('other'))
+        self.assertIsNone(
+            self.locmem_cache.get(singleflight.lease_key('other'))
+        )
+
+    @tag('unit')
+    def test_handoff(self):
+        """Test waiters get values that are not kept from their holder."""
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'big'
+
+        results = []
+
+        def call():
+            results.append(singleflight.run(
+                'key',
+                compute,
+                60,
+                poll=0.01,
+                keep=lambda v: False
+            ))
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['big'] * 5)
+        self.assertIsNone(self.locmem_cache.get('key'))
+
+        # Later callers do not see the handed off value.
+        singleflight.run('key', compute, 60, keep=lambda v: False)
+        self.assertEqual(len(calls), 2)
+
+    @tag('unit')
+    def test_redis_scripts(self):
+        """Test django-redis leases are renewed and released by script."""
+        client = mock.Mock()
+        client.make_key.return_value = 'made'
+        client.encode.return_value = b'token'
+        redis = client.get_client.return_value
+        redis.eval.return_value = 1
+        with patch.object(singleflight, '_redis_client', return_value=client):
+            self.assertTrue(singleflight.renew('key', 'token', 30))
+            redis.eval.assert_called_with(
+                singleflight.RENEW_SCRIPT,
+                1,
+                'made',
+                b'token',
+                30
+            )
+            singleflight.release('key', 'token')
+            redis.eval.assert_called_with(
+                singleflight.RELEASE_SCRIPT,
+                1,
+                'made',
+                b'token'
+            )
+        client.make_key.assert_called_with(singleflight.lease_key('key'))
@@ -1,3 +1,4 @@
+import json
 import logging
 import mock
 
@@ -7,6 +8,7 @@ from django.test import tag
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from api import difftree
 from api.exceptions import JobError
 from api.exceptions import JobRunningError
 
@@ -259,7 +261,7 @@ class TestObjectDiffViewSetDetails(BaseApiTestCase):
     @mock.patch('api.views.NodeDiff')
     def test_not_found(self, m_node_diff):
         class FakeNodeDiff:
-            def to_list(self):
+            def to_list(self, blobs=False):
                 return []
         m_node_diff.return_value = FakeNodeDiff()
         self.client.login(**self.credentials)
@@ -269,14 +271,20 @@ class TestObjectDiffViewSetDetails(BaseApiTestCase):
     @tag('unit')
     @mock.patch('api.views.NodeDiff')
     def test_nodes(self, m_node_diff):
+        calls = []
+
         class FakeNodeDiff:
-            def to_list(self):
+            def to_list(self, blobs=False):
+                calls.append(blobs)
                 return ['test_prop']
         m_node_diff.return_value = FakeNodeDiff()
         self.client.login(**self.credentials)
         resp = self.client.post(self.baseurl, self.body)
         self.assertEquals(resp.status_code, status.HTTP_200_OK)
 
+        # Blobs are only resolved when asked for
+        self.assertEqual(calls, [False])
+
         data = resp.json()
         self.assertTrue(isinstance(data['data'], dict))
         self.assertTrue(isinstance(data['properties'], list))
@@ -348,6 +356,95 @@ class TestObjectDiffViewSetStructure(BaseApiTestCase):
         resp = self.client.post(self.baseurl, self.body)
         self.assertEquals(resp.status_code, status.HTTP_200_OK)
 
-        data = resp.json()
+        data = json.loads(b''.join(resp.streaming_content).decode('utf-8'))
         self.assertTrue(isinstance(data['data'], dict))
         self.assertEqual(data['frame']['it'], 'worked')
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.fetch', side_effect=[[1], [1]])
+    @mock.patch('api.views.objectdiff', return_value='{"it":"worked"}')
+    def test_json_frame(self, m_diff, m_fetch):
+        """Test that json frames are spliced into the response."""
+        self.client.login(**self.credentials)
+        resp = self.client.post(self.baseurl, self.body)
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(resp['Content-Type'], 'application/json')
+        data = json.loads(b''.join(resp.streaming_content).decode('utf-8'))
+        self.assertEqual(data['data']['identity'], 'someid')
+        self.assertEqual(data['frame']['it'], 'worked')
+
+
+class TestObjectDiffViewSetTree(BaseApiTestCase):
+
+    baseurl = '/api/objectdiffs/tree/'
+
+    frame = (
+        '{"model":"Environment","id":"someid","flags":[],"children":['
+        '{"model":"Host","id":"a","flags":["t2"],"children":[]},'
+        '{"model":"Host","id":"b","flags":["t1","t2"],"children":[]}]}'
+    )
+
+    def setUp(self):
+        super(TestObjectDiffViewSetTree, self).setUp()
+        difftree._TREES.clear()
+        self.body = {
+            'model': 'Environment',
+            'identity': 'someid',
+            'left_time': 1,
+            'right_time': 2
+        }
+
+    @tag('unit')
+    def test_invalid_req(self):
+        self.client.login(**self.credentials)
+        self.body['pagesize'] = 0
+        resp = self.client.post(self.baseurl, self.body, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.fetch', side_effect=[[1], [1]])
+    @mock.patch('api.views.objectdiff', side_effect=JobRunningError())
+    def test_job_running(self, m_diff, m_fetch):
+        self.client.login(**self.credentials)
+        resp = self.client.post(self.baseurl, self.body, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_202_ACCEPTED)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.fetch', side_effect=[[1], [1]])
+    @mock.patch('api.views.objectdiff')
+    def test_root(self, m_diff, m_fetch):
+        m_diff.return_value = self.frame
+        self.client.login(**self.credentials)
+        self.body['pagesize'] = 1
+        resp = self.client.post(self.baseurl, self.body, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+
+        data = resp.json()
+        self.assertEqual(data['node']['child_count'], 2)
+        self.assertEqual(data['node']['counts']['changed'], 1)
+        self.assertEqual(len(data['children']), 1)
+        self.assertEqual(data['children'][0]['id'], 'a')
+        self.assertEqual(data['children'][0]['counts']['added'], 1)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.fetch', return_value=[1])
+    @mock.patch('api.views.objectdiff')
+    def test_parsed_tree(self, m_diff, m_fetch):
+        """Test parsed trees are used without fetching the frame."""
+        m_diff.return_value = self.frame
+        self.client.login(**self.credentials)
+        for _ in range(2):
+            resp = self.client.post(self.baseurl, self.body, format='json')
+            self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(m_diff.call_count, 1)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.fetch', side_effect=[[1], [1]])
+    @mock.patch('api.views.objectdiff')
+    def test_path(self, m_diff, m_fetch):
+        m_diff.return_value = self.frame
+        self.client.login(**self.credentials)
+        self.body['path'] = [{'model': 'Host', 'id': 'c'}]
+        resp = self.client.post(self.baseurl, self.body, format='json')
+        self.assertEquals(resp.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,14 +1,18 @@
+import json
 import logging
 
 from cloud_snitch.models import registry
 from django.http import Http404
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
 from rest_framework import status
 from rest_framework.decorators import list_route
 from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from neo4jdriver.query import Query
 
+from . import difftree
 from .diff import NodeDiff
 
 from .decorators import cls_cached_result
@@ -17,6 +21,7 @@ from .exceptions import JobError
 from .exceptions import JobRunningError
 
 from .serializers import DiffSerializer
+from .serializers import DiffTreeSerializer
 from .serializers import GenericSerializer
 from .serializers import ModelSerializer
 from .serializers import PropertySerializer
@@ -25,6 +30,7 @@ from .serializers import TimesChangedSerializer
 
 from .query import TimesQuery
 from .status import combined as combined_status
+from .tasks import _diff_cache_key
 from .tasks import objectdiff
 
 logger = logging.getLogger(__name__)
@@ -96,7 +102,7 @@ class PropertyViewSet(viewsets.ViewSet):
 class ObjectViewSet(viewsets.ViewSet):
     """View set for searching, viewing objects."""
 
-    @cls_cached_result(prefix="times", timeout=3600)
+    @cls_cached_result(prefix="times", timeout=3600, stale=3600)
     def _times(self, model, identity):
         """Get times a specific instance of a model has changed.
 
@@ -160,7 +166,8 @@ class ObjectViewSet(viewsets.ViewSet):
         vd = search.validated_data
         query = Query(vd.get('model')) \
             .identity(vd.get('identity')) \
-            .time(vd.get('time'))
+            .time(vd.get('time')) \
+            .blobs(vd.get('blobs', False))
 
         for f in vd.get('filters', []):
             query.filter(
@@ -272,6 +279,27 @@ class ObjectDiffViewSet(viewsets.ViewSet):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+    def _structure_chunks(self, data, frame):
+        """Encode a structure response around a computed frame.
+
+        Cached frames are already json so they are streamed as is instead
+        of being parsed and encoded again.
+
+        :param data: Validated request data
+        :type data: dict
+        :param frame: Json document or dict of a computed diff
+        :type frame: str|dict
+        :yields: Chunks of the json document
+        :ytype: bytes
+        """
+        if not isinstance(frame, str):
+            frame = json.dumps(frame)
+        yield b'{"data":'
+        yield JSONRenderer().render(data)
+        yield b',"frame":'
+        yield frame.encode('utf-8')
+        yield b'}'
+
     @list_route(methods=['post'])
     def structure(self, request):
         """Get diff structure."""
@@ -282,7 +310,7 @@ class ObjectDiffViewSet(viewsets.ViewSet):
         self._check_sides(data)
 
         try:
-            diffdict = objectdiff(
+            frame = objectdiff(
                 data['model'],
                 data['identity'],
                 data['left_time'],
@@ -293,10 +321,53 @@ class ObjectDiffViewSet(viewsets.ViewSet):
         except JobError:
             return self._job_error_response()
 
-        # Return the response
+        return StreamingHttpResponse(
+            self._structure_chunks(data, frame),
+            content_type='application/json'
+        )
+
+    @list_route(methods=['post'])
+    def tree(self, request):
+        """Get one level of the diff structure.
+
+        The node at the end of the requested path is returned with a page
+        of its children. Each carries counts of added, removed and changed
+        nodes beneath it so clients can expand the tree lazily.
+        """
+        # Validate the data
+        data = self._data(request, DiffTreeSerializer)
+
+        # Make sure both sides are kosher
+        self._check_sides(data)
+
+        args = (
+            data['model'],
+            data['identity'],
+            data['left_time'],
+            data['right_time']
+        )
+        # Parsed frames are reused without fetching them from the cache
+        key = _diff_cache_key(*args)
+        tree = difftree.get(key)
+        if tree is None:
+            try:
+                frame = objectdiff(*args)
+            except JobRunningError:
+                return self._job_running_response()
+            except JobError:
+                return self._job_error_response()
+            tree = difftree.load(key, frame)
+
+        node = difftree.find(tree, data['path'])
+        if node is None:
+            raise Http404("Node not found.")
+
         results = GenericSerializer({
             'data': data,
-            'frame': diffdict
+            'node': difftree.summary(node),
+            'children': difftree.page(node, data['page'], data['pagesize']),
+            'page': data['page'],
+            'pagesize': data['pagesize']
         })
         return Response(results.data)
 
@@ -313,7 +384,7 @@ class ObjectDiffViewSet(viewsets.ViewSet):
             data['right_time']
         )
 
-        props = diff.to_list()
+        props = diff.to_list(blobs=data.get('blobs', False))
         if not props:
             raise Http404("Node node found.")
 
@@ -1,4 +1,5 @@
 import logging
+import threading
 import time
 
 from neo4j.v1 import GraphDatabase
@@ -6,6 +7,7 @@ from django.conf import settings
 
 logger = logging.getLogger(__name__)
 _CONNECTION = None
+_LOCK = threading.Lock()
 
 
 class Connection:
@@ -56,9 +58,10 @@ class Connection:
 
 def get_connection():
     global _CONNECTION
-    if _CONNECTION is None or not _CONNECTION.isvalid():
-        if _CONNECTION is not None:
-            _CONNECTION.close()
-            _CONNECTION = None
-        _CONNECTION = Connection()
-    return _CONNECTION.driver
+    with _LOCK:
+        if _CONNECTION is None or not _CONNECTION.isvalid():
+            if _CONNECTION is not None:
+                _CONNECTION.close()
+                _CONNECTION = None
+            _CONNECTION = Connection()
+        return _CONNECTION.driver
@@ -1,5 +1,6 @@
 import logging
 
+from cloud_snitch.models import BlobEntity
 from cloud_snitch.models import registry
 from cloud_snitch.models.utils import prep_val
 from cloud_snitch import utils
@@ -18,6 +19,37 @@ def _model_state(model_name):
     return '{}_state'.format(model_name)
 
 
+def _after(keys):
+    """Create a condition matching rows sorted after a cursor.
+
+    The cursor is the list parameter $cursor holding the sort key values
+    of the last row of the previous page. Nulls sort last when ascending
+    and first when descending, as they do in ORDER BY.
+
+    :param keys: List of (expression, direction) sort keys
+    :type keys: list
+    :returns: Cypher condition
+    :rtype: str
+    """
+    terms = []
+    equals = []
+    for i, (expr, direction) in enumerate(keys):
+        cursor = '$cursor[{}]'.format(i)
+        if direction.upper() == 'DESC':
+            after = '({} IS NOT NULL AND ({} < {} OR {} IS NULL))'.format(
+                expr, expr, cursor, cursor
+            )
+        else:
+            after = '({} IS NOT NULL AND ({} IS NULL OR {} > {}))'.format(
+                cursor, expr, expr, cursor
+            )
+        terms.append('(' + ' AND '.join(equals + [after]) + ')')
+        equals.append('({} = {} OR ({} IS NULL AND {} IS NULL))'.format(
+            expr, cursor, expr, cursor
+        ))
+    return ' OR '.join(terms)
+
+
 class Query:
 
     def __init__(self, label):
@@ -40,6 +72,11 @@ class Query:
         self.filter_count = 0
         self.filter_wheres = []
 
+        # Blob joins and conditions on blob values
+        self.blob_joins = []
+        self.blob_wheres = []
+        self._resolve_blobs = False
+
         self.matches = []
         self.rels = []
         self.state_matches = []
@@ -55,6 +92,10 @@ class Query:
         self._skip = None
         self._limit = None
 
+        # Keyset pagination state
+        self._keyset = False
+        self._cursor = None
+
     def time(self, timestamp):
         """Update the time parameter
 
@@ -141,16 +182,24 @@ class Query:
         # Attempt a conversion for more accurate results.
         prepped = prep_val(label, prop, value, raise_for_error=False)
 
-        if prop in registry.state_properties(label):
-            label = '{}_state'.format(label)
+        if prop in registry.blob_properties(label):
+            condition = '{} {} {}'.format(
+                self._blob_value(label, prop),
+                operator,
+                '$filterval{}'.format(self.filter_count)
+            )
+            self.blob_wheres.append(condition)
+        else:
+            if prop in registry.state_properties(label):
+                label = '{}_state'.format(label)
 
-        condition = '{}.{} {} {}'.format(
-            label.lower(),
-            prop,
-            operator,
-            '$filterval{}'.format(self.filter_count)
-        )
-        self.filter_wheres.append(condition)
+            condition = '{}.{} {} {}'.format(
+                label.lower(),
+                prop,
+                operator,
+                '$filterval{}'.format(self.filter_count)
+            )
+            self.filter_wheres.append(condition)
 
         self.params['filterval{}'.format(self.filter_count)] = prepped
         self.filter_count += 1
@@ -205,6 +254,13 @@ class Query:
         if prop not in registry.properties(label):
             raise InvalidPropertyError(label, prop)
 
+        # Blob values are ordered by expression
+        if prop in registry.blob_properties(label):
+            self._orderby.append(
+                (self._blob_value(label, prop), None, direction)
+            )
+            return
+
         # Check if property is part of the state of the model
         if prop in registry.state_properties(label):
             varname = '{}_state'.format(label.lower())
@@ -213,6 +269,42 @@ class Query:
 
         self._orderby.append((varname, prop, direction))
 
+    def blobs(self, resolve=True):
+        """Set whether or not fetch resolves blob properties.
+
+        Blob properties are stored as keys on the state nodes. Resolving
+        them costs one more query per fetch so it is left to callers
+        that actually need the values.
+
+        :param resolve: True to resolve blob values, False otherwise
+        :type resolve: bool
+        :returns: Modified self
+        :rtype: Query
+        """
+        self._resolve_blobs = resolve
+        return self
+
+    def _blob_value(self, label, prop):
+        """Get an expression for the value of a blob property.
+
+        Joins the blob node holding the value of the property. States
+        written before the property was stored as a blob hold the value
+        inline so the expression falls back to it.
+
+        :param label: Label with the property
+        :type label: str
+        :param prop: Name of the blob property
+        :type prop: str
+        :returns: Cypher expression
+        :rtype: str
+        """
+        state = _model_state(label.lower())
+        var = '{}_{}'.format(label.lower(), prop)
+        join = (var, state, BlobEntity.stored_property(prop))
+        if join not in self.blob_joins:
+            self.blob_joins.append(join)
+        return 'coalesce({}.value, {}.{})'.format(var, state, prop)
+
     def skip(self, n):
         """Set number of records to skip.
 
@@ -285,6 +377,25 @@ class Query:
         cypher += ' AND '.join(conditions)
         return cypher
 
+    def _blob_clause(self):
+        """Create optional matches for blob values.
+
+        :returns: OPTIONAL MATCH clause(s) and conditions on blob values
+        :rtype: str
+        """
+        cypher = ''
+        for var, state, key_prop in self.blob_joins:
+            cypher += ' \nOPTIONAL MATCH ({}:{} {{ {}: {}.{} }})'.format(
+                var,
+                BlobEntity.label,
+                BlobEntity.identity_property,
+                state,
+                key_prop
+            )
+        if self.blob_wheres:
+            cypher += ' \nWITH * WHERE ' + ' AND '.join(self.blob_wheres)
+        return cypher
+
     def _return_clause(self):
         """Create return clause of query.
 
@@ -302,27 +413,66 @@ class Query:
         cypher += ', '.join(r for r in returns)
         return cypher
 
-    def _orderby_clause(self):
-        """Create order by clause.
+    def _sort_keys(self):
+        """Get the expressions and directions the query is sorted by.
 
-        :returns: ORDER BY clause
-        :rtype: str
-        """
-        cypher = ' \nORDER BY '
+        When paging by cursor, the internal ids of the matched nodes are
+        added so that the sort order is total and stable.
 
+        :returns: List of (expression, direction) tuples
+        :rtype: list
+        """
         # Default to ordering by identity property
-        ob = []
         if not self._orderby:
             self.orderby(
                 registry.identity_property(self.label),
                 'ASC',
                 label=self.label
             )
+        keys = []
         for ob_varname, ob_prop, ob_dir in self._orderby:
-            ob.append('{}.{} {}'.format(ob_varname, ob_prop, ob_dir))
+            if ob_prop is None:
+                keys.append((ob_varname, ob_dir))
+            else:
+                keys.append(('{}.{}'.format(ob_varname, ob_prop), ob_dir))
+
+        if self._keyset:
+            for _, label, _ in self.matches:
+                keys.append(('id({})'.format(label.lower()), 'ASC'))
+        return keys
+
+    def _orderby_clause(self):
+        """Create order by clause.
+
+        :returns: ORDER BY clause
+        :rtype: str
+        """
+        cypher = ' \nORDER BY '
+        ob = ['{} {}'.format(expr, d) for expr, d in self._sort_keys()]
         cypher += ', '.join(ob)
         return cypher
 
+    def _cursor_clause(self):
+        """Create condition skipping rows up to the cursor.
+
+        :returns: WITH clause filtering on the cursor or empty string
+        :rtype: str
+        """
+        if not self._keyset or self._cursor is None:
+            return ''
+        return ' \nWITH * WHERE ' + _after(self._sort_keys())
+
+    def _cursor_return(self):
+        """Create extra return of the sort key values of each row.
+
+        :returns: Additional return item or empty string
+        :rtype: str
+        """
+        if not self._keyset:
+            return ''
+        exprs = [expr for expr, _ in self._sort_keys()]
+        return ', [{}] AS `_cursor`'.format(', '.join(exprs))
+
     def _skip_clause(self):
         """Create the skip clause
 
@@ -359,6 +509,7 @@ class Query:
         query_str = \
             self._match_clause() + \
             self._where_clause() + \
+            self._blob_clause() + \
             ' \nRETURN DISTINCT count(*) as total'
         resp = self._fetch(query_str)
         record = resp.single()
@@ -374,7 +525,10 @@ class Query:
         return \
             self._match_clause() + \
             self._where_clause() + \
+            self._blob_clause() + \
+            self._cursor_clause() + \
             self._return_clause() + \
+            self._cursor_return() + \
             self._orderby_clause() + \
             self._skip_clause() + \
             self._limit_clause()
@@ -391,10 +545,69 @@ class Query:
                 resp = tx.run(query_str, **self.params)
                 return resp
 
-    def fetch(self):
-        resp = self._fetch(str(self))
+    def _stream(self, query_str=None):
+        """Run a query and yield records as they are received.
+
+        Unlike _fetch, the session stays open until the records are
+        consumed or the generator is closed, so the records are never
+        buffered all at once.
+
+        :param query_str: Optional query string. Defaults to str(self)
+        :type query_str: str
+        :yields: Records returned by neo4j
+        :ytype: neo4j.Record
+        """
+        if query_str is None:
+            query_str = str(self)
+
+        logger.debug("Streaming query:")
+        logger.debug(query_str)
+
+        with get_connection().session() as session:
+            with session.begin_transaction() as tx:
+                for record in tx.run(query_str, **self.params):
+                    yield record
+
+    def _resolve(self, rows):
+        """Replace blob keys in fetched rows with blob values.
+
+        All keys in the rows are resolved with a single query.
+
+        :param rows: Rows from fetch
+        :type rows: list
+        """
+        wanted = []
+        for label in self.return_labels:
+            for prop in registry.blob_properties(label):
+                wanted.append((label, prop, BlobEntity.stored_property(prop)))
+
+        keys = set()
+        for row in rows:
+            for label, prop, key_prop in wanted:
+                keys.add(row[label].get(key_prop))
+        keys.discard(None)
+        if not keys:
+            return
+
+        with get_connection().session() as session:
+            values = BlobEntity.fetch_many(session, keys)
+
+        for row in rows:
+            for label, prop, key_prop in wanted:
+                key = row[label].get(key_prop)
+                if key is not None:
+                    row[label][prop] = values.get(key)
+
+    def _rows(self, records):
+        """Convert records into rows of objects keyed by label.
+
+        :param records: Records returned by neo4j
+        :type records: iterable
+        :returns: List of rows
+        :rtype: list
+        """
         rows = []
-        for record in resp:
+        for record in records:
             row = {}
             for label in self.return_labels:
                 obj = {}
@@ -406,8 +619,13 @@ class Query:
                         obj[key] = value
                 row[label] = obj
             rows.append(row)
+        if self._resolve_blobs:
+            self._resolve(rows)
         return rows
 
+    def fetch(self):
+        return self._rows(self._fetch(str(self)))
+
     def page(self, page=1, pagesize=100, index=None):
         if index is not None:
             skip = max(index - 1, 0)
@@ -417,6 +635,50 @@ class Query:
         self.limit(pagesize)
         return self.fetch()
 
+    def fetch_pages(self, pagesize=1000):
+        """Fetch all results a page at a time using keyset pagination.
+
+        Instead of skipping the rows of previous pages, each page is
+        filtered to rows sorted after the last row of the previous page.
+        Every page costs the same no matter how deep into the results.
+
+        :param pagesize: Number of rows per page
+        :type pagesize: int
+        :yields: List of rows per page
+        :ytype: list
+        """
+        self._keyset = True
+        self._cursor = None
+        self.skip(None)
+        self.limit(pagesize)
+        try:
+            while True:
+                records = list(self._fetch(str(self)))
+                if not records:
+                    break
+                yield self._rows(records)
+                if len(records) < pagesize:
+                    break
+                self._cursor = records[-1]['_cursor']
+                self.params['cursor'] = self._cursor
+        finally:
+            self._keyset = False
+            self._cursor = None
+            self.params.pop('cursor', None)
+            self.limit(None)
+
+    def iter_rows(self, pagesize=1000):
+        """Iterate over all result rows using keyset pagination.
+
+        :param pagesize: Number of rows to fetch at once
+        :type pagesize: int
+        :yields: Result rows
+        :ytype: dict
+        """
+        for rows in self.fetch_pages(pagesize=pagesize):
+            for row in rows:
+                yield row
+
 
 class ColumnQuery(Query):
     """Query for returning individual properties instead of objects."""
@@ -451,13 +713,16 @@ class ColumnQuery(Query):
             raise InvalidPropertyError(prop, model)
 
         key = '{}.{}'.format(model, prop)
+        if name is not None:
+            key = name
+
+        if prop in registry.blob_properties(model):
+            self._columns[key] = self._blob_value(model, prop)
+            return self
 
         if prop in registry.state_properties(model):
             model = _model_state(model)
 
-        if name is not None:
-            key = name
-
         self._columns[key] = '{}.{}'.format(model.lower(), prop)
         return self
 
@@ -478,14 +743,16 @@ class ColumnQuery(Query):
         cypher += ', '.join(parts)
         return cypher
 
-    def fetch(self):
-        """Execute query and return results.
+    def _rows(self, records):
+        """Convert records into rows of columns.
 
+        :param records: Records returned by neo4j
+        :type records: iterable
         :returns: List of record rows
         :rtype: list
         """
         res = []
-        for record in self._fetch(str(self)):
+        for record in records:
             r = OrderedDict()
             for k in self._columns:
                 r[k] = record[k]
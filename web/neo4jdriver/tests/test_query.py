@@ -323,6 +323,121 @@ class TestQuery(TestCase):
         expected = "LIMIT 500"
         self.assertTrue(expected in str(q))
 
+    @tag('unit')
+    def test_filter_blob(self):
+        """Test filtering on a property stored as a blob."""
+        q = Query('Configfile')
+        q.filter('contents', 'CONTAINS', 'volume_driver')
+        q.orderby('contents', 'DESC')
+        expected = (
+            " \nOPTIONAL MATCH (configfile_contents:Blob "
+            "{ key: configfile_state.contents_blob }) "
+            "\nWITH * WHERE coalesce(configfile_contents.value, "
+            "configfile_state.contents) CONTAINS $filterval0"
+        )
+        self.assertTrue(expected in str(q))
+        self.assertTrue(str(q).endswith(
+            'ORDER BY coalesce(configfile_contents.value, '
+            'configfile_state.contents) DESC'
+        ))
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_fetch_blobs(self, m_connection):
+        """Test blob keys are only resolved when asked for."""
+        def record(name, key):
+            return {
+                'environment': {'account_number_name': 'a'},
+                'environment_state': {},
+                'host': {'hostname_environment': 'h'},
+                'host_state': {},
+                'configfile': {'path_host': name},
+                'configfile_state': {'contents_blob': key}
+            }
+
+        rows = FakeRecords([record('a', 'k1'), record('b', 'k1')])
+        blobs = FakeRecords([{'key': 'k1', 'value': 'contents'}])
+
+        m_connection.return_value = FakeConnection([rows])
+        fetched = Query('Configfile').fetch()
+        self.assertFalse('contents' in fetched[0]['Configfile'])
+        self.assertEqual(
+            fetched[0]['Configfile']['contents_blob'],
+            'k1'
+        )
+
+        m_connection.return_value = FakeConnection([rows, blobs])
+        fetched = Query('Configfile').blobs().fetch()
+        for row in fetched:
+            self.assertEqual(row['Configfile']['contents'], 'contents')
+
+    @tag('unit')
+    def test_keyset_query(self):
+        """Test the query generated for keyset pagination."""
+        q = Query('Host')
+        q.orderby('kernel', 'desc')
+        q._keyset = True
+        self.assertTrue(str(q).endswith(
+            ", [host_state.kernel, id(environment), id(host)] AS `_cursor` "
+            "\nORDER BY host_state.kernel desc, id(environment) ASC, "
+            "id(host) ASC"
+        ))
+        self.assertFalse('WITH *' in str(q))
+
+        q._cursor = ['k', 1, 2]
+        expected = (
+            " \nWITH * WHERE "
+            "((host_state.kernel IS NOT NULL AND "
+            "(host_state.kernel < $cursor[0] OR $cursor[0] IS NULL))) OR "
+            "((host_state.kernel = $cursor[0] OR "
+            "(host_state.kernel IS NULL AND $cursor[0] IS NULL)) AND "
+            "($cursor[1] IS NOT NULL AND (id(environment) IS NULL OR "
+            "id(environment) > $cursor[1])))"
+        )
+        self.assertTrue(expected in str(q))
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_fetch_pages(self, m_connection):
+        """Test pages continue from the cursor of the last row."""
+        def record(i):
+            return {
+                'environment': {'account_number_name': str(i)},
+                'environment_state': {},
+                '_cursor': [str(i), i]
+            }
+
+        pages = [
+            FakeRecords([record(1), record(2)]),
+            FakeRecords([record(3), record(4)]),
+            FakeRecords([])
+        ]
+        m_connection.return_value = FakeConnection(pages)
+        q = Query('Environment')
+
+        cursors = []
+        results = []
+        for rows in q.fetch_pages(pagesize=2):
+            cursors.append(q.params.get('cursor'))
+            results += rows
+        self.assertEqual(cursors, [None, ['2', 2]])
+        self.assertEqual(
+            [r['Environment']['account_number_name'] for r in results],
+            ['1', '2', '3', '4']
+        )
+
+        # Paging state is cleared afterwards
+        self.assertFalse('cursor' in q.params)
+        self.assertFalse('_cursor' in str(q))
+        self.assertFalse('LIMIT' in str(q))
+
+        m_connection.return_value = FakeConnection([
+            FakeRecords([record(1), record(2)]),
+            FakeRecords([record(3)])
+        ])
+        rows = list(Query('Environment').iter_rows(pagesize=2))
+        self.assertEqual(len(rows), 3)
+
 
 class TestColumnQuery(TestCase):
     """Test the column query."""
@@ -375,3 +490,16 @@ class TestColumnQuery(TestCase):
             "\nORDER BY host.hostname_environment ASC"
         )
         self.assertEquals(expected, str(q))
+
+    @tag('unit')
+    def test_blob_column(self):
+        """Test that blob columns return the blob value."""
+        q = ColumnQuery('Configfile')
+        q.add_column('Configfile', 'contents')
+        q.add_column('Configfile', 'contents', name='again')
+        self.assertEqual(len(q.blob_joins), 1)
+        self.assertTrue(
+            "\nRETURN coalesce(configfile_contents.value, "
+            "configfile_state.contents) AS `Configfile.contents`"
+            in str(q)
+        )
@@ -52,7 +52,17 @@ class BaseReport:
         :returns: List of rows
         :rtype: list
         """
-        return []
+        return list(self.iter_rows())
+
+    def iter_rows(self):
+        """Do the report one row at a time.
+
+        Used to stream report results without holding every row.
+
+        :yields: Report rows
+        :ytype: dict
+        """
+        return iter([])
 
     def columns(self):
         """Compute list of columns for the report.
@@ -150,24 +150,16 @@ class CinderVolumeDriverReport(BaseReport):
             q.filter(f['prop'], f['operator'], f['value'], label=f['model'])
         return q
 
-    def run(self):
+    def iter_rows(self):
         """Run the report.
 
-        :returns: List of report rows
-        :rtype: List of ordereddicts
+        :yields: Report rows
+        :ytype: OrderedDict
         """
         q = self.build_query()
-        records = []
-        pagesize = 500
-        page = 1
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
-            for row in page_rows:
-                for s, d in parse_contents(row['Configfile.contents']):
-                    records.append(self._record_from_row(row, s, d))
-            page += 1
-            page_rows = q.page(page, pagesize)
-        return records
+        for row in q.iter_rows(pagesize=500):
+            for s, d in parse_contents(row['Configfile.contents']):
+                yield self._record_from_row(row, s, d)
 
     def columns(self):
         """Gets columns for this report. useful for csv serialization.
@@ -152,23 +152,14 @@ class GenericReport(BaseReport):
             q.filter(f['prop'], f['operator'], f['value'], label=f['model'])
         return q
 
-    def run(self):
-        """Run the report and return results.
+    def iter_rows(self):
+        """Run the report and yield results.
 
-        :returns: The report data
-        :rtype: list
+        :yields: Report rows
+        :ytype: OrderedDict
         """
         q = self.build_query()
-        rows = []
-        pagesize = 5000
-        page = 1
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
-            rows += page_rows
-            page += 1
-            page_rows = q.page(page, pagesize)
-
-        return rows
+        return q.iter_rows(pagesize=5000)
 
     def columns(self):
         """Gets columns for this report. useful for csv serialization.
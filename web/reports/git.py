@@ -54,17 +54,7 @@ class GitSerializer(Serializer):
         q = ColumnQuery('GitUrl')
         q.add_column('GitUrl', 'url', 'url')
         q.orderby('url', 'ASC', label='GitUrl')
-        urls = []
-
-        page = 1
-        pagesize = 1000
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
-            for row in page_rows:
-                urls.append(row['url'])
-            page += 1
-            page_rows = q.page(page, pagesize)
-        return urls
+        return [row['url'] for row in q.iter_rows(pagesize=1000)]
 
     def validate(self, data):
         """Custom validation.
@@ -155,19 +145,14 @@ class GitReport(BaseReport):
             q.filter(f['prop'], f['operator'], f['value'], label=f['model'])
         return q
 
-    def run(self):
-        """Run the report."""
+    def iter_rows(self):
+        """Run the report.
+
+        :yields: Report rows
+        :ytype: OrderedDict
+        """
         q = self.build_query()
-        rows = []
-        pagesize = 5000
-        page = 1
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
-            rows += page_rows
-            page += 1
-            page_rows = q.page(page, pagesize)
-
-        return rows
+        return q.iter_rows(pagesize=5000)
 
     def columns(self):
         """Gets columns for this report. useful for csv serialization.
@@ -36,6 +36,10 @@ class MTUQuery(Query):
         self._skip = None
         self._limit = None
         self._count = None
+        self.blob_joins = []
+        self.blob_wheres = []
+        self._keyset = False
+        self._cursor = None
 
     def _match_clause(self):
         """Create the match clause of the query.
@@ -97,29 +101,34 @@ class MTUQuery(Query):
         )
         return cipher
 
-    def _orderby_clause(self):
-        """Create the order by clause of the query.
+    def _sort_keys(self):
+        """Get the expressions and directions the query is sorted by.
 
-        :returns: Cipher string containing the orderby clause.
-        :rtype: str
+        :returns: List of (expression, direction) tuples
+        :rtype: list
         """
-        cipher = (
-            "\nORDER BY"
-            "\n\t`Account Name` ASC,"
-            "\n\t`Account Number` ASC,"
-            "\n\t`Hostname` ASC,"
-            "\n\t`Device` ASC"
-        )
-        return cipher
+        keys = [
+            ('e.name', 'ASC'),
+            ('e.account_number', 'ASC'),
+            ('h.hostname', 'ASC'),
+            ('i.device', 'ASC')
+        ]
+        if self._keyset:
+            keys += [
+                ('id({})'.format(var), 'ASC') for var in ['e', 'h', 'i', 'ci']
+            ]
+        return keys
 
-    def fetch(self):
-        """Execute query and return results.
+    def _rows(self, records):
+        """Convert records into rows of columns.
 
+        :param records: Records returned by neo4j
+        :type records: iterable
         :returns: List of record rows
         :rtype: list
         """
         res = []
-        for record in self._fetch(str(self)):
+        for record in records:
             r = OrderedDict()
             for k in self.columns:
                 r[k] = record[k]
@@ -188,19 +197,15 @@ class MTUReport(BaseReport):
                 row[col] = False
         return row
 
-    def run(self):
-        """Build the query and run the report."""
+    def iter_rows(self):
+        """Build the query and run the report.
+
+        :yields: Cleaned report rows
+        :ytype: OrderedDict
+        """
         q = MTUQuery(self.data['time'], default=1500)
-        rows = []
-        pagesize = 5000
-        page = 1
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
-            for row in page_rows:
-                rows.append(self.clean_row(row))
-            page += 1
-            page_rows = q.page(page, pagesize)
-        return rows
+        for row in q.iter_rows(pagesize=5000):
+            yield self.clean_row(row)
 
     def columns(self):
         """Get columns for this report.
@@ -51,3 +51,4 @@ class ReportNameSerializer(Serializer):
     """Serializer for validating report selection."""
 
     report_name = ChoiceField([r.name for r in REGISTRY.list()], required=True)
+    stream = ChoiceField(['csv', 'ndjson'], required=False)
@@ -0,0 +1,62 @@
+"""Encoders for streaming report rows."""
+import csv
+
+from rest_framework.utils.encoders import JSONEncoder
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+class _Echo:
+    """File like object that returns what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    """Encode rows as csv lines.
+
+    :param header: Column names in order
+    :type header: list
+    :param rows: Report rows keyed by column name
+    :type rows: iterable
+    :yields: Header line followed by one line per row
+    :ytype: str
+    """
+    writer = csv.DictWriter(_Echo(), header, extrasaction='ignore')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    """Encode rows as newline delimited json.
+
+    :param rows: Report rows
+    :type rows: iterable
+    :yields: One json document per row
+    :ytype: str
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def encode(stream, header, rows):
+    """Encode rows in the requested streaming format.
+
+    :param stream: Name of the format, csv or ndjson
+    :type stream: str
+    :param header: Column names in order
+    :type header: list
+    :param rows: Report rows
+    :type rows: iterable
+    :returns: Iterable of encoded chunks
+    :rtype: iterable
+    """
+    if stream == 'csv':
+        return csv_lines(header, rows)
+    return ndjson_lines(rows)
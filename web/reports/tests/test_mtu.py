@@ -2,6 +2,7 @@ from django.test import tag
 from django.test import SimpleTestCase
 
 from reports.mtu import MTUSerializer
+from reports.mtu import MTUQuery
 from reports.mtu import MTUReport
 
 from common.tests.base import SerializerCase
@@ -87,3 +88,19 @@ class TestMTUReport(SimpleTestCase):
         r = MTUReport({'time': 1})
         for i, col in enumerate(r.columns()):
             self.assertEquals(expected[i], col)
+
+    def test_query(self):
+        """Test the query string builds without blob joins."""
+        q = MTUQuery(1)
+        self.assertTrue(str(q).startswith('MATCH'))
+        self.assertFalse('OPTIONAL MATCH' in str(q))
+
+    def test_keyset_query(self):
+        """Test the query sorts by node ids when paging by cursor."""
+        q = MTUQuery(1)
+        self.assertTrue(str(q).endswith('ORDER BY e.name ASC, '
+                                        'e.account_number ASC, '
+                                        'h.hostname ASC, i.device ASC'))
+        q._keyset = True
+        self.assertTrue(str(q).endswith('id(i) ASC, id(ci) ASC'))
+        self.assertTrue('AS `_cursor`' in str(q))
@@ -1,10 +1,15 @@
 import mock
 
 from collections import OrderedDict
+from django.core.cache.backends.locmem import LocMemCache
 from django.test import tag
 from rest_framework import status
 
+from api import singleflight
+from api.cache import cache_key
+from api.exceptions import JobRunningError
 from reports.views import ReportViewSet
+from reports.views import RUN_MAX_ROWS
 
 from .base import APITestCase
 
@@ -13,8 +18,8 @@ class FakeReport:
     """Fake report to return some dummy data."""
 
     def __init__(self, data):
-        """Does nothing."""
-        pass
+        """Validates nothing."""
+        self.data = {}
 
     def run(self):
         """Run some dummy data."""
@@ -23,6 +28,10 @@ class FakeReport:
         d['keyb'] = 'value2'
         return [d]
 
+    def iter_rows(self):
+        """Yield the dummy data."""
+        return iter(self.run())
+
     def columns(self):
         """Return dummy data columns."""
         return ['keya', 'keyb']
@@ -104,6 +113,65 @@ class TestReportsViewSet(APITestCase):
         self.assertEquals(result[0]['keya'], 'value1')
         self.assertEquals(result[0]['keyb'], 'value2')
 
+    @tag('unit')
+    @mock.patch('reports.views.singleflight.run', side_effect=JobRunningError)
+    @mock.patch('reports.views.report_registry.find', return_value=FakeReport)
+    def test_reports_run_running(self, m_registry, m_run):
+        """Test identical runs that take too long are reported as running."""
+        self.client.login(**self.credentials)
+        data = {'report_name': 'Generic'}
+        resp = self.client.post('/api/reports/run/', data=data)
+        self.assertEquals(resp.status_code, status.HTTP_202_ACCEPTED)
+        kwargs = m_run.call_args[1]
+        self.assertTrue(kwargs['keep']([{}]))
+        self.assertFalse(kwargs['keep']([{}] * (RUN_MAX_ROWS + 1)))
+
+    @tag('unit')
+    @mock.patch('reports.views.singleflight.WAIT_TIMEOUT', 0)
+    @mock.patch('reports.views.report_registry.find', return_value=FakeReport)
+    def test_reports_run_held(self, m_registry):
+        """Test a run held by another caller past the wait is accepted."""
+        locmem_cache = LocMemCache('reports', {})
+        key = cache_key(('Generic',), {}, prefix='report')
+        with mock.patch.object(singleflight, 'cache', locmem_cache):
+            token = singleflight.acquire(key)
+            self.client.login(**self.credentials)
+            data = {'report_name': 'Generic'}
+            resp = self.client.post('/api/reports/run/', data=data)
+            self.assertEquals(resp.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEquals(
+                resp.json(),
+                {'status': 'Report is running. Try later.'}
+            )
+
+            singleflight.release(key, token)
+            resp = self.client.post('/api/reports/run/', data=data)
+            self.assertEquals(resp.status_code, status.HTTP_200_OK)
+            self.assertEquals(resp.json()[0]['keya'], 'value1')
+
+    @tag('unit')
+    @mock.patch('reports.views.report_registry.find', return_value=FakeReport)
+    def test_reports_run_stream(self, m_registry):
+        """Test streaming report rows as csv and ndjson."""
+        self.client.login(**self.credentials)
+        data = {'report_name': 'Generic', 'stream': 'csv'}
+        resp = self.client.post('/api/reports/run/', data=data)
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        self.assertEquals(resp['Content-Type'], 'text/csv')
+        content = b''.join(resp.streaming_content).decode('utf-8')
+        self.assertEquals(content, 'keya,keyb\r\nvalue1,value2\r\n')
+
+        data['stream'] = 'ndjson'
+        resp = self.client.post('/api/reports/run/', data=data)
+        self.assertEquals(resp['Content-Type'], 'application/x-ndjson')
+        content = b''.join(resp.streaming_content).decode('utf-8')
+        self.assertEquals(content, '{"keya":"value1","keyb":"value2"}\n')
+
+        data['stream'] = 'xml'
+        resp = self.client.post('/api/reports/run/', data=data)
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_get_renderer_context(self):
         """Test that get_renderer_context can detect columns."""
         v = ReportViewSet()
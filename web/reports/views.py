@@ -1,19 +1,33 @@
 import logging
 
 from django.http import Http404
+from django.http import StreamingHttpResponse
+from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import list_route
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
+from api import singleflight
+from api.cache import cache_key
+from api.exceptions import JobRunningError
+
 from .registry import REGISTRY as report_registry
 from .registry import ReportNameSerializer
 
 from .serializers import ReportDataSerializer
 from .serializers import ReportSerializer
+from . import streaming
 
 logger = logging.getLogger(__name__)
 
+# Seconds identical report runs share a result
+RUN_TIMEOUT = 10
+
+# Largest result in rows kept in the cache. Larger results are only
+# handed to the identical runs waiting on them.
+RUN_MAX_ROWS = 1000
+
 
 class ReportViewSet(viewsets.ViewSet):
 
@@ -51,8 +65,31 @@ class ReportViewSet(viewsets.ViewSet):
         # Save columns for renderer context
         self.columns = report.columns()
 
-        # Run report and serialize the result
-        s = ReportDataSerializer(report.run())
+        # Stream rows as they are produced if asked to
+        stream = s.validated_data.get('stream')
+        if stream:
+            return StreamingHttpResponse(
+                streaming.encode(stream, self.columns, report.iter_rows()),
+                content_type=streaming.CONTENT_TYPES[stream]
+            )
+
+        # Run report and serialize the result. Identical concurrent runs
+        # share one computation.
+        key = cache_key((report_name,), dict(report.data), prefix='report')
+        try:
+            rows = singleflight.run(
+                key,
+                report.run,
+                RUN_TIMEOUT,
+                wait_timeout=singleflight.WAIT_TIMEOUT,
+                keep=lambda rows: len(rows) <= RUN_MAX_ROWS
+            )
+        except JobRunningError:
+            return Response(
+                {'status': 'Report is running. Try later.'},
+                status=status.HTTP_202_ACCEPTED
+            )
+        s = ReportDataSerializer(rows)
         return Response(s.data)
 
     def get_renderer_context(self):
@@ -920,7 +920,8 @@ function DetailsFrameController(timeService, typesService, messagingService, clo
                     self.obj = self.record[self.type];
                     self.properties = objKeys();
                 }
-            }
+            },
+            true
         ).then(function() {
             self.objectBusy = false;
         }, function(resp) {
@@ -55,11 +55,14 @@ angular.module("cloudSnitch").config(["$httpProvider", function($httpProvider) {
 }]);
 
 
-angular.module("cloudSnitch").factory("cloudSnitchApi", ["$http", "$q", "timeService", "csrfService", function($http, $q, timeService, csrfService) {
+angular.module("cloudSnitch").factory("cloudSnitchApi", ["$http", "$q", "$timeout", "timeService", "csrfService", function($http, $q, $timeout, timeService, csrfService) {
 
     var typesDeferred = $q.defer();
     var service = {};
 
+    // Milliseconds to wait before asking for a report that is still running
+    var reportRetryInterval = 2000;
+
     function convertTime(str) {
         var t = timeService.fromstr(str);
         t = timeService.milliseconds(t);
@@ -119,6 +122,7 @@ angular.module("cloudSnitch").factory("cloudSnitchApi", ["$http", "$q", "timeSer
         case "csv":
             headers["Accept"] = "text/csv";
             responseType = "blob";
+            req.stream = "csv";
             break;
         case "json":
             headers["Accept"] = "application/json";
@@ -131,20 +135,28 @@ angular.module("cloudSnitch").factory("cloudSnitchApi", ["$http", "$q", "timeSer
             break;
         }
 
-        return $http({
-            method: "POST",
-            url: "/api/reports/run/",
-            headers: headers,
-            data: req,
-            responseType: responseType
-        }).then(function(resp) {
-            defer.resolve(resp.data);
-            return defer.promise;
-        }, function(resp) {
-            // Error
-            defer.reject(resp);
-            return defer.promise;
-        });
+        function run() {
+            return $http({
+                method: "POST",
+                url: "/api/reports/run/",
+                headers: headers,
+                data: req,
+                responseType: responseType
+            }).then(function(resp) {
+                // An identical run is still going. Ask again later.
+                if (resp.status === 202) {
+                    return $timeout(run, reportRetryInterval);
+                }
+                defer.resolve(resp.data);
+                return defer.promise;
+            }, function(resp) {
+                // Error
+                defer.reject(resp);
+                return defer.promise;
+            });
+        }
+
+        return run();
     };
 
     service.paths = function() {
@@ -270,7 +282,7 @@ angular.module("cloudSnitch").factory("cloudSnitchApi", ["$http", "$q", "timeSer
         });
     };
 
-    service.searchAll = function(model, identity, time, filters, sink) {
+    service.searchAll = function(model, identity, time, filters, sink, blobs) {
 
         var defer = $q.defer();
         var req = {
@@ -279,6 +291,11 @@ angular.module("cloudSnitch").factory("cloudSnitchApi", ["$http", "$q", "timeSer
             pagesize: 500
         };
 
+        // Large values such as config file contents are only sent when asked for.
+        if (blobs) {
+            req.blobs = true;
+        }
+
         if (identity !== undefined && identity != "") {
             req.identity = identity;
         }
@@ -359,7 +376,8 @@ angular.module("cloudSnitch").factory("cloudSnitchApi", ["$http", "$q", "timeSer
             model: model,
             identity:identity,
             left_time: convertTime(leftTime),
-            right_time: convertTime(rightTime)
+            right_time: convertTime(rightTime),
+            blobs: true
         };
         var defer = $q.defer();
         return $http({